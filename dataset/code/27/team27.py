@@ -0,0 +1,222 @@
+"""
+Team 27's analysis (27.py) as an importable Python 3 module.
+
+Three Poisson models of red cards, each centred on one moderator:
+
+* q1:  rating x (games, goals, yellowCards, meanIAT, meanExp)
+* q2a: meanIAT x (rating, games, goals, yellowCards, meanExp)
+* q2b: meanExp x (rating, games, goals, yellowCards, meanIAT)
+
+where rating = rater1 + rater2 and meanIAT/meanExp are scaled by 100, as in
+27.py. The three formulas share most of their terms, so the design is built
+once: the union of all main effects and pairwise products (19 columns) as
+one NumPy array. Each question takes a column slice of it, in the order
+and with the names patsy gives for its formula. Rows with a missing value
+in a question's variables are excluded with a boolean mask, as patsy's
+default NA handling does, so the data frame is never copied per question.
+
+Rater reliability (normality tests, Spearman's rho, Cohen's kappa and
+intraclass correlations) works on the two rating columns as arrays.
+
+    python team27.py --data ./data/crowdstorming.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from scipy import stats
+
+COLUMNS = ['playerShort', 'refNum', 'games', 'goals', 'yellowCards', 'redCards',
+           'meanIAT', 'meanExp', 'rater1', 'rater2']
+
+VARIABLES = ['rating', 'games', 'goals', 'yellowCards', 'meanIAT', 'meanExp']
+
+# Moderator of each question and the variables it is crossed with, in
+# formula order
+QUESTIONS = {
+    'q1': ('rating', ['games', 'goals', 'yellowCards', 'meanIAT', 'meanExp']),
+    'q2a': ('meanIAT', ['rating', 'games', 'goals', 'yellowCards', 'meanExp']),
+    'q2b': ('meanExp', ['rating', 'games', 'goals', 'yellowCards', 'meanIAT']),
+}
+
+# Ratings are on a 0-1 grid in steps of 0.25
+RATING_LEVELS = np.array([0.0, 0.25, 0.5, 0.75, 1.0])
+
+
+def load(filepath):
+    """Read the columns 27.py uses and derive ``rating``."""
+    df = pd.read_csv(filepath, usecols=COLUMNS)
+    df = df[df['rater1'].notna() & df['rater2'].notna()]
+    df = df.assign(rating=df['rater1'] + df['rater2'],
+                   meanIAT=df['meanIAT'] * 100, meanExp=df['meanExp'] * 100)
+    return df.reset_index(drop=True)
+
+
+def cohen_kappa(a, b, levels=RATING_LEVELS, weights=None):
+    """
+    Cohen's kappa of two raters' ratings on ``levels``.
+
+    ``weights`` is None (unweighted), 'linear' or 'quadratic'.
+    """
+    k = len(levels)
+    i = np.searchsorted(levels, a)
+    j = np.searchsorted(levels, b)
+    observed = np.bincount(i * k + j, minlength=k * k).reshape(k, k) / len(a)
+    expected = np.outer(observed.sum(axis=1), observed.sum(axis=0))
+    distance = np.abs(np.subtract.outer(np.arange(k), np.arange(k)))
+    if weights is None:
+        w = (distance > 0).astype(float)
+    elif weights == 'linear':
+        w = distance / (k - 1)
+    elif weights == 'quadratic':
+        w = (distance / (k - 1)) ** 2
+    else:
+        raise ValueError(f"Unknown kappa weights: {weights!r}")
+    return 1 - np.sum(w * observed) / np.sum(w * expected)
+
+
+def icc(ratings):
+    """
+    Intraclass correlations of an (items x raters) array.
+
+    Returns ICC(2,1), two-way random effects with absolute agreement, and
+    ICC(3,1), two-way mixed effects with consistency (Shrout and Fleiss),
+    from the two-way ANOVA mean squares.
+    """
+    n, k = ratings.shape
+    grand = ratings.mean()
+    ss_rows = k * np.sum((ratings.mean(axis=1) - grand) ** 2)
+    ss_cols = n * np.sum((ratings.mean(axis=0) - grand) ** 2)
+    ss_error = np.sum((ratings - grand) ** 2) - ss_rows - ss_cols
+    ms_rows = ss_rows / (n - 1)
+    ms_cols = ss_cols / (k - 1)
+    ms_error = ss_error / ((n - 1) * (k - 1))
+    return {
+        'icc2_1': (ms_rows - ms_error)
+                  / (ms_rows + (k - 1) * ms_error + k * (ms_cols - ms_error) / n),
+        'icc3_1': (ms_rows - ms_error) / (ms_rows + (k - 1) * ms_error),
+    }
+
+
+def rater_reliability(rater1, rater2):
+    """
+    Agreement of the two skin tone raters over the rows rated by both.
+
+    27.py's test_ratings: D'Agostino-Pearson normality test of each rater
+    and Spearman's rho, plus Cohen's kappa (unweighted and linearly
+    weighted) and the ICCs.
+    """
+    rater1 = np.asarray(rater1, dtype=float)
+    rater2 = np.asarray(rater2, dtype=float)
+    both = ~(np.isnan(rater1) | np.isnan(rater2))
+    a, b = rater1[both], rater2[both]
+    rho, rho_p = stats.spearmanr(a, b)
+    return {
+        'n': int(both.sum()),
+        'normaltest_rater1': stats.normaltest(a),
+        'normaltest_rater2': stats.normaltest(b),
+        'spearman_rho': rho,
+        'spearman_p': rho_p,
+        'kappa': cohen_kappa(a, b),
+        'kappa_linear': cohen_kappa(a, b, weights='linear'),
+        **icc(np.column_stack([a, b])),
+    }
+
+
+def _term(*variables):
+    return frozenset(variables)
+
+
+def build_design(df):
+    """
+    The union design of all three questions.
+
+    Returns a dict with ``y``, the (rows x terms) array ``X`` (intercept,
+    main effects, then every product a question uses), ``terms`` (the
+    frozenset of variables behind each column) and ``valid``, the per-row
+    mask of non-missing values of each variable.
+    """
+    base = {v: df[v].to_numpy(dtype=float) for v in VARIABLES}
+    terms = [_term()] + [_term(v) for v in VARIABLES]
+    for moderator, others in QUESTIONS.values():
+        for other in others:
+            if _term(moderator, other) not in terms:
+                terms.append(_term(moderator, other))
+
+    X = np.empty((len(df), len(terms)))
+    for j, term in enumerate(terms):
+        column = X[:, j]
+        column[:] = 1.0
+        for variable in term:
+            column *= base[variable]
+    valid = {v: ~np.isnan(values) for v, values in base.items()}
+    valid['redCards'] = df['redCards'].notna().to_numpy()
+    return {'y': df['redCards'].to_numpy(dtype=float), 'X': X, 'terms': terms,
+            'valid': valid}
+
+
+def question_columns(question):
+    """``(names, terms)`` of a question's design, in patsy's order."""
+    moderator, others = QUESTIONS[question]
+    names, terms = ['Intercept', moderator], [_term(), _term(moderator)]
+    for other in others:
+        names += [other, f'{moderator}:{other}']
+        terms += [_term(other), _term(moderator, other)]
+    return names, terms
+
+
+def question_design(design, question):
+    """
+    ``(y, X, mask)`` of one question: the rows complete in its variables and
+    its columns of the union design, as DataFrames named like patsy's.
+    """
+    names, terms = question_columns(question)
+    moderator, others = QUESTIONS[question]
+    mask = design['valid']['redCards'].copy()
+    for variable in [moderator] + others:
+        mask &= design['valid'][variable]
+    columns = [design['terms'].index(term) for term in terms]
+    X = pd.DataFrame(design['X'][np.ix_(mask, columns)], columns=names)
+    y = pd.Series(design['y'][mask], name='redCards')
+    return y, X, mask
+
+
+def fit_questions(df, questions=QUESTIONS, **fit_kwargs):
+    """Fit the Poisson model of each question; returns results by question."""
+    design = build_design(df)
+    results = {}
+    for question in questions:
+        y, X, _ = question_design(design, question)
+        results[question] = sm.Poisson(y, X).fit(**fit_kwargs)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--data', default='./data/crowdstorming.csv')
+    parser.add_argument('--reliability', action='store_true',
+                        help="also report rater agreement (27.py's test_ratings)")
+    args = parser.parse_args()
+
+    df = load(args.data)
+    if args.reliability:
+        for name, value in rater_reliability(df['rater1'], df['rater2']).items():
+            print(f"{name}: {value}")
+
+    print("variance: ", df['redCards'].var())
+    print("mean: ", df['redCards'].mean())
+
+    design = build_design(df)
+    for question in QUESTIONS:
+        print(f"QUESTION {question[1:]}")
+        y, X, mask = question_design(design, question)
+        if question != 'q1':
+            print("len pre-drop: ", len(df))
+            print("len post-drop: ", int(mask.sum()))
+        print(sm.Poisson(y, X).fit().summary())
+
+
+if __name__ == '__main__':
+    main()
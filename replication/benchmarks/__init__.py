@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for the replication scripts on synthetic data.
+
+    python -m benchmarks.run --scales 1 10
+"""
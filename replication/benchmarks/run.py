@@ -0,0 +1,335 @@
+"""
+Benchmark the team-30 stages and the team 27 model fits on synthetic data.
+
+    cd replication
+    python -m benchmarks.run --scales 1 10 100 --output bench.jsonl
+    python -m benchmarks.run --compare old.jsonl bench.jsonl
+
+Synthetic CSVs (see synthetic.py) are written once per scale and seed to
+``--data-dir`` and reused by later runs. Each scale is benchmarked in a
+fresh subprocess, so peak RSS is measured per scale. Every stage is one JSON
+Lines record (see team30/profiling.py) tagged with the scale, the git
+commit and the library versions: wall and CPU time, rows per second,
+tracemalloc peak and RSS.
+
+Team-30 stages are those of team-30.py's main(). The load is timed cold (CSV
+parse plus cache write) and warm (cache read), and the crossed random-effects
+model (team30/glmm.py) and the group index (team30/groupindex.py) are timed
+as their own stages. Team 27 is timed as the data preparation and the three
+Poisson fits of dataset/code/27/27.py, cold as 27.py runs them, then through
+team30/modelstore.py: each fit warm-started from the ones before it, and
+once more as store hits. The vectorized port, dataset/code/27/team27.py, is
+timed the same way: load, shared design, three fits.
+
+The count-model stages compare team30/glmsolver.py with statsmodels on the
+dyads (redCards ~ skinTone with log(games) exposure) for Poisson, NB2 and
+zero-inflated Poisson, and on a batch of ``--fits`` frequency-weight
+vectors over the covariate patterns (statsmodels fits the first
+STATSMODELS_BATCH of them one by one). Their ``rows`` are dyads, or fits
+for the batch stages, so ``rows_per_s`` of the two batch stages is fits
+per second.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import warnings
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPLICATION = os.path.dirname(HERE)
+sys.path.insert(0, REPLICATION)
+
+from benchmarks import synthetic  # noqa: E402
+from team30 import compressed, glmm, glmsolver, groupindex, modelstore, profiling  # noqa: E402
+
+# Formulas and NA handling of dataset/code/27/27.py
+TEAM27_COLUMNS = ['playerShort', 'refNum', 'games', 'goals', 'yellowCards', 'redCards',
+                  'meanIAT', 'meanExp', 'rater1', 'rater2']
+TEAM27_MODELS = {
+    'q1': (None, 'redCards ~ rating + rating*games + rating*goals + rating*yellowCards'
+                 ' + rating*meanIAT + rating*meanExp'),
+    'q2a': ('meanIAT', 'redCards ~ meanIAT + meanIAT*rating + meanIAT*games + meanIAT*goals'
+                       ' + meanIAT*yellowCards + meanIAT*meanExp'),
+    'q2b': ('meanExp', 'redCards ~ meanExp + meanExp*rating + meanExp*games + meanExp*goals'
+                       ' + meanExp*yellowCards + meanExp*meanIAT'),
+}
+
+# Weight vectors of the batch stage that statsmodels fits one at a time
+STATSMODELS_BATCH = 20
+
+
+TEAM27_PORT = os.path.join(os.path.dirname(REPLICATION), 'dataset', 'code', '27', 'team27.py')
+
+
+def load_module(name, path):
+    """Import the file ``path`` as module ``name``."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_pipeline():
+    """Import replication/team-30.py as a module."""
+    return load_module('team_30', os.path.join(REPLICATION, 'team-30.py'))
+
+
+def dataset(scale, seed, data_dir):
+    """Path of the synthetic CSV for ``scale``, generating it if needed."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'synthetic-x{scale:g}-seed{seed}.csv')
+    if not os.path.exists(path):
+        tmp = path + '.tmp'
+        synthetic.write_csv(tmp, scale=scale, seed=seed)
+        os.replace(tmp, path)
+    return path
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPLICATION,
+                             capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def context(scale, seed):
+    import numpy
+    import scipy
+    import statsmodels
+    return {'scale': scale, 'seed': seed, 'commit': git_commit(),
+            'python': platform.python_version(), 'numpy': numpy.__version__,
+            'pandas': pd.__version__, 'scipy': scipy.__version__,
+            'statsmodels': statsmodels.__version__, 'cpus': os.cpu_count()}
+
+
+def bench_team30(profiler, path, n_boot, n_perm, n_jobs):
+    """Time each stage of the team-30 pipeline on ``path``."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    pipeline = load_pipeline()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+            tempfile.TemporaryDirectory() as cache_dir:
+        with profiler.stage('team30_load_csv') as record:
+            df = pipeline.load_and_clean_data(path, columns=pipeline.ANALYSIS_COLUMNS,
+                                              cache_dir=cache_dir)
+            record['rows'] = len(df)
+        del df
+        with profiler.stage('team30_load_cache') as record:
+            df = pipeline.load_and_clean_data(path, columns=pipeline.ANALYSIS_COLUMNS,
+                                              cache_dir=cache_dir)
+            record['rows'] = len(df)
+        with profiler.stage('team30_streaming_scan') as record:
+            scanned, _ = pipeline.scan_data(path, cache_dir=None)
+            record['rows'] = scanned.n
+
+        with profiler.stage('team30_eda', rows=len(df)):
+            summary = pipeline.summarize(df)
+            pipeline.exploratory_analysis(summary)
+        with profiler.stage('team30_tests', rows=len(df)):
+            poisson_model, nb_model, robust = pipeline.statistical_tests(
+                df, summary, mode='compressed', n_boot=n_boot, n_perm=n_perm,
+                n_jobs=n_jobs, profiler=profiler, mixed=False)
+        with profiler.stage('team30_glmm', rows=len(df)) as record:
+            design = glmm.build_design(df)
+            mixed = glmm.fit(design)
+            record.update(nobs=mixed['nobs'], iterations=mixed['iterations'],
+                          sweeps=mixed['sweeps'], converged=mixed['converged'])
+        del design
+        with profiler.stage('team30_group_index', rows=len(df)):
+            index = groupindex.GroupIndex(df)
+            for dimension in index.dimensions:
+                index.table(dimension)
+            index.compare({'darkSkin': 1})
+        del index
+        # The figure is saved to the working directory; keep it out of the tree
+        with profiler.stage('team30_plots', rows=len(df)), contextlib.chdir(cache_dir):
+            fig = pipeline.create_visualizations(summary)
+            plt.close(fig)
+        with profiler.stage('team30_report', rows=len(df)):
+            pipeline.generate_report(summary, poisson_model, nb_model, robust)
+
+
+def bench_count_models(profiler, path, n_fits, seed=0):
+    """Time glmsolver against statsmodels on the count models of ``path``."""
+    import numpy as np
+    import statsmodels.api as sm
+    from statsmodels.discrete.count_model import ZeroInflatedPoisson
+    from statsmodels.tools.sm_exceptions import ConvergenceWarning, HessianInversionWarning
+
+    from team30.weighted import WeightedNegativeBinomial
+
+    df = pd.read_csv(path, usecols=['redCards', 'games', 'rater1', 'rater2'])
+    df['skinTone'] = df[['rater1', 'rater2']].mean(axis=1, skipna=False)
+    df = df.dropna(subset=['skinTone'])
+    y = df['redCards'].to_numpy(dtype=float)
+    X = sm.add_constant(df[['skinTone']].to_numpy(dtype=float))
+    games = df['games'].to_numpy(dtype=float)
+
+    statsmodels_fits = {
+        'poisson': lambda: sm.Poisson(y, X, exposure=games).fit(disp=False),
+        'negbin': lambda: sm.NegativeBinomial(y, X, exposure=games).fit(disp=False,
+                                                                        maxiter=200),
+        'zip': lambda: ZeroInflatedPoisson(y, X, exposure=games).fit(disp=False,
+                                                                     maxiter=500),
+    }
+    for family, fit in statsmodels_fits.items():
+        # Convergence is recorded in the stage instead
+        with profiler.stage(f'glm_{family}_statsmodels', rows=len(y)) as record, \
+                warnings.catch_warnings():
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            warnings.simplefilter('ignore', HessianInversionWarning)
+            record.update(profiling.fit_info(fit()))
+        for dtype in ('float64', 'float32'):
+            suffix = '' if dtype == 'float64' else '_float32'
+            with profiler.stage(f'glm_{family}_solver{suffix}', rows=len(y)) as record:
+                result = glmsolver.fit(family, y, X.astype(dtype), exposure=games)
+                record.update(nobs=float(result.nobs), iterations=int(result.iterations),
+                              converged=bool(result.converged))
+
+    # Bootstrap-like frequency weights on the (redCards, skinTone, games) patterns
+    py, pX, counts = compressed.compress_arrays(y, np.column_stack([X, games]))
+    weights = np.random.default_rng(seed).poisson(1.0, (n_fits, len(py))) * counts
+    n_statsmodels = min(n_fits, STATSMODELS_BATCH)
+    with profiler.stage('glm_negbin_batch_statsmodels', rows=n_statsmodels), \
+            warnings.catch_warnings():
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        warnings.simplefilter('ignore', HessianInversionWarning)
+        for w in weights[:n_statsmodels]:
+            WeightedNegativeBinomial(py, pX[:, :-1], w, exposure=pX[:, -1]).fit(
+                disp=False, maxiter=200)
+    with profiler.stage('glm_negbin_batch_solver', rows=n_fits) as record:
+        result = glmsolver.fit('negbin', py, pX[:, :-1], exposure=pX[:, -1], weights=weights)
+        record['converged'] = int(result.converged.sum())
+
+
+def bench_team27(profiler, path):
+    """Time team 27's preparation and its three Poisson fits on ``path``."""
+    import statsmodels.api as sm
+    from patsy import dmatrices
+
+    with profiler.stage('team27_prepare') as record:
+        df = pd.read_csv(path, usecols=TEAM27_COLUMNS)
+        df = df.dropna(subset=['rater1', 'rater2'])
+        df['rating'] = df['rater1'] + df['rater2']
+        df['meanIAT'] = df['meanIAT'] * 100
+        df['meanExp'] = df['meanExp'] * 100
+        record['rows'] = len(df)
+
+    for name, (dropna, formula) in TEAM27_MODELS.items():
+        with profiler.stage(f'team27_{name}') as record:
+            frame = df if dropna is None else df.dropna(subset=[dropna])
+            y, X = dmatrices(formula, data=frame, return_type='dataframe')
+            result = sm.Poisson(y, X).fit(disp=False)
+            record['rows'] = len(y)
+            record.update(profiling.fit_info(result))
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        store = modelstore.ModelStore(model_dir)
+        for run in ('warm', 'cached'):
+            fitted = []
+            for name, (dropna, formula) in TEAM27_MODELS.items():
+                with profiler.stage(f'team27_{name}_{run}') as record:
+                    frame = df if dropna is None else df.dropna(subset=[dropna])
+                    y, X = dmatrices(formula, data=frame, return_type='dataframe')
+                    result = modelstore.fit_cached('poisson', y, X, store=store,
+                                                   warm_from=fitted[::-1])
+                    record['rows'] = len(y)
+                    record['cached'] = getattr(result, 'cached', False)
+                    record.update(profiling.fit_info(result))
+                fitted.append(result)
+
+    team27 = load_module('team27', TEAM27_PORT)
+    with profiler.stage('team27_port_load') as record:
+        df = team27.load(path)
+        record['rows'] = len(df)
+    with profiler.stage('team27_port_design', rows=len(df)):
+        design = team27.build_design(df)
+    for question in team27.QUESTIONS:
+        with profiler.stage(f'team27_port_{question}') as record:
+            y, X, _ = team27.question_design(design, question)
+            result = sm.Poisson(y, X).fit(disp=False)
+            record['rows'] = len(y)
+            record.update(profiling.fit_info(result))
+
+
+def run_scale(args, scale):
+    """Benchmark one scale in this process."""
+    path = dataset(scale, args.seed, args.data_dir)
+    profiler = profiling.Profiler(args.output, trace_memory=not args.no_tracemalloc,
+                                  context=context(scale, args.seed))
+    bench_team30(profiler, path, args.boot, args.perm, args.jobs)
+    bench_count_models(profiler, path, args.fits, args.seed)
+    bench_team27(profiler, path)
+    table = profiler.table()
+    table = table[table['parent'].isna()].set_index('stage')
+    print(f"scale {scale:g}:")
+    print(table[['wall_s', 'cpu_s', 'rows_per_s', 'max_rss_mb']].round(3).to_string())
+
+
+def compare(old_path, new_path):
+    """Wall time of the last run in ``new_path`` relative to ``old_path``."""
+    def last_run(path):
+        runs = pd.read_json(path, lines=True)
+        runs = runs[runs['run_id'].isin(runs.groupby('scale')['run_id'].last())]
+        return runs[runs['parent'].isna()].set_index(['scale', 'stage'])['wall_s']
+
+    old, new = last_run(old_path), last_run(new_path)
+    table = pd.DataFrame({'old_s': old, 'new_s': new})
+    table['ratio'] = table['new_s'] / table['old_s']
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark-results.jsonl')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(),
+                                                           'team30-benchmarks'))
+    parser.add_argument('--boot', type=int, default=10000,
+                        help="bootstrap replicates in the tests stage")
+    parser.add_argument('--perm', type=int, default=10000,
+                        help="permutations in the tests stage")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes for the bootstrap and permutations")
+    parser.add_argument('--fits', type=int, default=200,
+                        help="weight vectors in the batched count-model stages")
+    parser.add_argument('--no-tracemalloc', action='store_true',
+                        help="skip tracemalloc peaks (they slow some stages down)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="compare the wall times of two result files and exit")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        print(compare(*args.compare).round(3).to_string())
+        return
+    if args.single:
+        run_scale(args, args.scales[0])
+        return
+    # One subprocess per scale so that peak RSS is not carried over
+    for scale in args.scales:
+        command = [sys.executable, '-m', 'benchmarks.run', '--single',
+                   '--scales', str(scale), '--seed', str(args.seed),
+                   '--output', os.path.abspath(args.output),
+                   '--data-dir', args.data_dir, '--boot', str(args.boot),
+                   '--perm', str(args.perm), '--jobs', str(args.jobs),
+                   '--fits', str(args.fits)]
+        if args.no_tracemalloc:
+            command.append('--no-tracemalloc')
+        subprocess.run(command, cwd=REPLICATION, check=True)
+
+
+if __name__ == '__main__':
+    main()
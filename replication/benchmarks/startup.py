@@ -0,0 +1,110 @@
+"""
+Import time of team-30.py per stage selection, from ``python -X importtime``.
+
+    cd replication
+    python -m benchmarks.startup --scale 0.2 --repeat 3
+
+Every run is a fresh interpreter started with ``-X importtime``, which logs
+the time spent importing each module to stderr. The import time of a run is
+the sum of those self times; it is reported with the number of modules
+imported, the process wall time and which of the heavy libraries
+(scipy.stats, statsmodels, matplotlib, seaborn) were loaded.
+
+``eager`` imports what team-30.py imported at module load before its
+imports moved into the stages, as a reference. The other rows run the
+script with ``--stages``, resampling and the mixed model switched off and
+no model cache, on a synthetic dataset (see synthetic.py), so the time left
+beyond the imports is the load (a warm cache read after the first run) and
+the selected stages. Each row is the fastest of ``--repeat`` runs.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPLICATION = os.path.dirname(HERE)
+sys.path.insert(0, REPLICATION)
+
+from benchmarks.run import dataset  # noqa: E402
+
+SCRIPT = os.path.join(REPLICATION, 'team-30.py')
+
+HEAVY = ['scipy.stats', 'statsmodels', 'matplotlib', 'seaborn']
+
+# Module-level imports of team-30.py before the stages imported their own
+EAGER = ("import pandas, numpy, matplotlib.pyplot, seaborn, scipy.stats, statsmodels.api; "
+         "from statsmodels.tools import add_constant; "
+         "from team30 import (bootstrap, compressed, data, glmm, incremental, modelstore, "
+         "permutation, profiling, streaming); from team30.summary import summarize")
+
+STAGE_RUNS = {
+    'load': ['load'],
+    'eda': ['eda'],
+    'tests': ['tests'],
+    'plots': ['plots'],
+    'all': ['eda', 'tests', 'plots', 'report'],
+}
+
+
+def parse_importtime(stderr):
+    """``{module: self microseconds}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(self_us)
+    return modules
+
+
+def measure(command, cwd):
+    """Import time, module count, heavy modules and wall time of one run."""
+    env = dict(os.environ, PYTHONPATH=REPLICATION, MPLBACKEND='Agg')
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-X', 'importtime', *command], cwd=cwd, env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - start
+    if out.returncode:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{out.stderr[-2000:]}")
+    modules = parse_importtime(out.stderr)
+    return {'import_s': sum(modules.values()) / 1e6, 'modules': len(modules),
+            'wall_s': wall, 'heavy': ' '.join(m for m in HEAVY if m in modules) or '-'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(),
+                                                           'team30-benchmarks'))
+    parser.add_argument('--output', default=None, help="also write the table as CSV")
+    args = parser.parse_args()
+
+    path = dataset(args.scale, args.seed, args.data_dir)
+    commands = {'eager': ['-c', EAGER]}
+    for name, stages in STAGE_RUNS.items():
+        commands[name] = [SCRIPT, '--data', path, '--stages', *stages, '--boot', '0',
+                          '--perm', '0', '--no-mixed', '--no-model-cache', '--metrics',
+                          os.devnull]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, command in commands.items():
+            runs = [measure(command, cwd) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r['wall_s'])
+            rows.append(dict(best, run=name, import_s=min(r['import_s'] for r in runs)))
+    table = pd.DataFrame(rows).set_index('run')
+    print(table.round(3).to_string())
+    if args.output:
+        table.to_csv(args.output)
+
+
+if __name__ == '__main__':
+    main()
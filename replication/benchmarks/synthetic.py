@@ -0,0 +1,160 @@
+"""
+Synthetic player-referee dyads with the schema of CrowdstormingDataJuly1st.csv.
+
+The generator reproduces the features the pipelines are sensitive to rather
+than the real data itself:
+
+* cardinalities: 2,053 players, 3,147 referees in 161 countries and 146,028
+  dyads at ``scale=1``. Players, referees and dyads all grow with ``scale``,
+  so a dyad keeps roughly the same number of neighbours at any size;
+* skin tone: rater1/rater2 on the 0-1 grid in steps of 0.25, with the raters
+  mostly agreeing and about a fifth of the players unrated;
+* games: skewed, with a mean near 3 per dyad. Red cards are rare (about 0.013
+  per dyad), overdispersed through a gamma-distributed player and referee
+  propensity, and slightly higher for darker-rated players;
+* meanIAT/meanExp per referee country, with a few countries missing.
+
+Dyads are drawn in chunks, each from its own SeedSequence child, and written
+to the CSV as they are made. Output for a given ``scale`` and ``seed`` is
+reproducible, and memory stays bounded at any scale.
+"""
+
+import numpy as np
+import pandas as pd
+
+BASE = {'players': 2053, 'referees': 3147, 'dyads': 146028}
+
+N_REF_COUNTRIES = 161
+
+COLUMNS = ['playerShort', 'player', 'club', 'leagueCountry', 'birthday', 'height',
+           'weight', 'position', 'games', 'victories', 'ties', 'defeats', 'goals',
+           'yellowCards', 'yellowReds', 'redCards', 'photoID', 'rater1', 'rater2',
+           'refNum', 'refCountry', 'Alpha_3', 'meanIAT', 'nIAT', 'seIAT', 'meanExp',
+           'nExp', 'seExp']
+
+RATINGS = np.array([0.0, 0.25, 0.5, 0.75, 1.0])
+RATING_PROBS = [0.30, 0.36, 0.12, 0.11, 0.11]
+
+LEAGUES = ['England', 'France', 'Germany', 'Spain']
+POSITIONS = ['Goalkeeper', 'Center Back', 'Left Fullback', 'Right Fullback',
+             'Defensive Midfielder', 'Center Midfielder', 'Left Midfielder',
+             'Right Midfielder', 'Attacking Midfielder', 'Left Winger',
+             'Right Winger', 'Center Forward']
+
+DEFAULT_CHUNK_ROWS = 250_000
+
+
+def sizes(scale):
+    """Numbers of players, referees and dyads at ``scale``."""
+    return {k: max(1, int(round(v * scale))) for k, v in BASE.items()}
+
+
+def make_players(n, rng):
+    """One row per player: identity, club, position and skin tone ratings."""
+    rater1 = rng.choice(RATINGS, n, p=RATING_PROBS)
+    # The second rater agrees about 70% of the time, otherwise one step off
+    rater2 = np.clip(rater1 + rng.choice([-0.25, 0.0, 0.25], n, p=[0.15, 0.7, 0.15]),
+                     0, 1)
+    unrated = rng.random(n) < 0.22
+    rater1[unrated] = np.nan
+    rater2[unrated] = np.nan
+    ids = np.arange(n)
+    position = np.array(POSITIONS, dtype=object)[rng.integers(0, len(POSITIONS), n)]
+    position[rng.random(n) < 0.08] = np.nan
+    skin = np.nan_to_num((rater1 + rater2) / 2, nan=0.3)
+    return pd.DataFrame({
+        'playerShort': np.char.add('player-', ids.astype(str)),
+        'player': np.char.add('Player ', ids.astype(str)),
+        'club': np.char.add('Club ', (ids % max(1, n // 20)).astype(str)),
+        'leagueCountry': np.array(LEAGUES)[ids % len(LEAGUES)],
+        'birthday': [f'{d:02d}.{m:02d}.{y}' for d, m, y in zip(
+            rng.integers(1, 29, n), rng.integers(1, 13, n), rng.integers(1975, 1995, n))],
+        'height': np.round(rng.normal(182, 6.5, n)),
+        'weight': np.round(rng.normal(76, 7, n)),
+        'position': position,
+        'photoID': np.char.add(ids.astype(str), '.jpg'),
+        'rater1': rater1,
+        'rater2': rater2,
+        # Per-player propensities: dyad volume, goals, cards
+        'activity': rng.lognormal(0, 0.9, n),
+        'goal_rate': rng.gamma(1.0, 0.12, n) * (position != 'Goalkeeper'),
+        'card_rate': rng.gamma(2.0, 0.5, n) * np.exp(0.3 * (skin - 0.3)),
+    })
+
+
+def make_referees(n, rng):
+    """One row per referee, with the IAT/explicit bias scores of its country."""
+    countries = pd.DataFrame({
+        'refCountry': np.arange(1, N_REF_COUNTRIES + 1),
+        'Alpha_3': [f'C{i:02X}' for i in range(N_REF_COUNTRIES)],
+        'meanIAT': rng.normal(0.346, 0.032, N_REF_COUNTRIES),
+        'nIAT': np.round(rng.lognormal(7.5, 1.5, N_REF_COUNTRIES)),
+        'seIAT': rng.gamma(2, 0.0005, N_REF_COUNTRIES),
+        'meanExp': rng.normal(0.496, 0.2, N_REF_COUNTRIES),
+        'nExp': np.round(rng.lognormal(7.5, 1.5, N_REF_COUNTRIES)),
+        'seExp': rng.gamma(2, 0.003, N_REF_COUNTRIES),
+    })
+    missing = rng.random(N_REF_COUNTRIES) < 0.01
+    countries.loc[missing, ['meanIAT', 'nIAT', 'seIAT', 'meanExp', 'nExp', 'seExp']] = np.nan
+    # A few large countries supply most referees
+    weights = rng.lognormal(0, 1.5, N_REF_COUNTRIES)
+    country = rng.choice(N_REF_COUNTRIES, n, p=weights / weights.sum())
+    refs = countries.iloc[country].reset_index(drop=True)
+    refs.insert(0, 'refNum', np.arange(1, n + 1))
+    refs['activity'] = rng.lognormal(0, 0.7, n)
+    refs['strictness'] = rng.gamma(3.0, 1 / 3.0, n)
+    return refs
+
+
+def make_dyads(players, refs, n, rng):
+    """``n`` player-referee dyads with game and card counts."""
+    p_w = players['activity'].to_numpy()
+    r_w = refs['activity'].to_numpy()
+    p = rng.choice(len(players), n, p=p_w / p_w.sum())
+    r = rng.choice(len(refs), n, p=r_w / r_w.sum())
+
+    games = 1 + rng.negative_binomial(0.9, 0.9 / (0.9 + 1.9), n)
+    victories = rng.binomial(games, 0.45)
+    ties = rng.binomial(games - victories, 0.45)
+    lam_red = (games * 0.0043 * players['card_rate'].to_numpy()[p]
+               * refs['strictness'].to_numpy()[r])
+    out = {
+        'games': games,
+        'victories': victories,
+        'ties': ties,
+        'defeats': games - victories - ties,
+        'goals': rng.poisson(games * players['goal_rate'].to_numpy()[p]),
+        'yellowCards': rng.poisson(lam_red * 30),
+        'yellowReds': rng.poisson(lam_red),
+        'redCards': rng.poisson(lam_red),
+    }
+    frame = pd.DataFrame(out)
+    pl = players.iloc[p].reset_index(drop=True)
+    rf = refs.iloc[r].reset_index(drop=True)
+    for col in COLUMNS:
+        if col not in frame:
+            frame[col] = pl[col] if col in pl else rf[col]
+    return frame[COLUMNS]
+
+
+def generate(scale=1.0, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield the synthetic dataset at ``scale`` as DataFrame chunks."""
+    n = sizes(scale)
+    entity_seed, *chunk_seeds = np.random.SeedSequence(seed).spawn(
+        1 + -(-n['dyads'] // chunk_rows))
+    rng = np.random.default_rng(entity_seed)
+    players = make_players(n['players'], rng)
+    refs = make_referees(n['referees'], rng)
+    for i, chunk_seed in enumerate(chunk_seeds):
+        rows = min(chunk_rows, n['dyads'] - i * chunk_rows)
+        yield make_dyads(players, refs, rows, np.random.default_rng(chunk_seed))
+
+
+def write_csv(path, scale=1.0, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write the synthetic dataset at ``scale`` to ``path``; returns its row count."""
+    rows = 0
+    with open(path, 'w', newline='') as f:
+        for i, chunk in enumerate(generate(scale, seed, chunk_rows)):
+            chunk.to_csv(f, header=(i == 0), index=False, na_rep='NA')
+            rows += len(chunk)
+    return rows
@@ -0,0 +1,180 @@
+"""
+Worker memory with the data pickled to each worker against shared columns.
+
+    cd replication
+    python -m benchmarks.workers --workers 1 2 4 8 --scale 10
+
+For each worker count, starts that many processes with the cleaned columns of
+a synthetic dataset (see synthetic.py) either as a pickled DataFrame
+argument, as a process pool initializer receives it, or as the spec of a
+colstore.SharedColumns. Each worker reads every column once and reports its
+private memory (pages no other process maps) and proportional set size
+(shared pages split between the processes mapping them) from
+/proc/self/smaps_rollup, so this runs on Linux only. Start-up is the time
+until the last worker has reported.
+
+With pickling, every worker holds a private copy of the data and the total
+grows by the data size per worker; with shared columns a worker's private
+memory is only the interpreter and its imports, and the data is counted
+once in the total however many workers there are. Workers are started with
+``spawn`` by default (as on macOS and Windows, and like ``forkserver``,
+the default on Linux from Python 3.14); under ``fork`` they inherit the
+parent's pages either way.
+
+A third set of workers starts without data, and its private memory is the
+baseline the other two are compared against. The run fails (exit status 1)
+unless every shared-column worker stays within SHARED_FRACTION of the data
+size plus SLACK_MB above that baseline, and every pickling worker grows by
+at least PICKLED_FRACTION of it (so the measurement can see a copy at all).
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks.run import dataset  # noqa: E402
+from team30 import colstore, data  # noqa: E402
+
+# Largest private memory a worker attached to the shared columns may add over
+# a worker without data: this fraction of the column data, plus SLACK_MB of
+# measurement noise
+SHARED_FRACTION = 0.1
+SLACK_MB = 2.0
+
+# Smallest growth, as a fraction of the column data, expected from pickling
+PICKLED_FRACTION = 0.5
+
+MODES = ('baseline', 'pickled', 'shared')
+
+
+def memory_mb():
+    """``(private, pss)`` of this process in MB, from /proc/self/smaps_rollup."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    private = fields['Private_Clean'] + fields['Private_Dirty']
+    return private / 1024, fields['Pss'] / 1024
+
+
+def _worker(source, results, done):
+    df = colstore.attach(source) if isinstance(source, dict) else source
+    columns = [] if df is None else df.columns
+    for column in columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.cat.codes
+        np.asarray(values).sum()
+    results.put(memory_mb())
+    # Stay alive (and mapped) until every worker has reported
+    done.wait()
+
+
+def measure(source, n_workers, context):
+    """Per-worker memory of ``n_workers`` processes started with ``source``."""
+    results, done = context.Queue(), context.Event()
+    start = time.perf_counter()
+    workers = [context.Process(target=_worker, args=(source, results, done))
+               for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    memory = []
+    while len(memory) < n_workers:
+        try:
+            memory.append(results.get(timeout=1))
+        except queue.Empty:
+            failed = [w.exitcode for w in workers if w.exitcode]
+            if failed:
+                done.set()
+                raise RuntimeError(f"Worker exited with code {failed[0]}")
+    elapsed = time.perf_counter() - start
+    done.set()
+    for worker in workers:
+        worker.join()
+    private, pss = np.array(memory).T
+    return {'workers': n_workers, 'startup_s': elapsed,
+            'private_mb_per_worker': private.mean(), 'pss_mb_total': pss.sum()}
+
+
+def run(df, worker_counts, context):
+    """
+    Measure every mode at every worker count on the columns of ``df``.
+
+    Returns ``(table, data_mb)``: the measurements indexed by mode and
+    workers, with the private memory each worker adds over the baseline
+    workers (``added_mb_per_worker``), and the size of the columns in MB.
+    """
+    rows = []
+    with colstore.SharedColumns(df) as shared:
+        sources = {'baseline': None, 'pickled': df, 'shared': shared.spec}
+        data_mb = shared.nbytes / 2 ** 20
+        for n_workers in worker_counts:
+            for mode in MODES:
+                rows.append(dict(measure(sources[mode], n_workers, context), mode=mode))
+    table = pd.DataFrame(rows).set_index(['mode', 'workers']).sort_index()
+    baseline = table.loc['baseline', 'private_mb_per_worker']
+    table['added_mb_per_worker'] = (table['private_mb_per_worker']
+                                    - baseline.reindex(table.index, level='workers'))
+    return table, data_mb
+
+
+def check(table, data_mb):
+    """Messages for every measurement outside the bounds above (none: pass)."""
+    failures = []
+    limit = SHARED_FRACTION * data_mb + SLACK_MB
+    for n_workers, added in table.loc['shared', 'added_mb_per_worker'].items():
+        if added > limit:
+            failures.append(f"shared, {n_workers} workers: {added:.1f} MB per worker "
+                            f"over the baseline, limit {limit:.1f} MB")
+    floor = PICKLED_FRACTION * data_mb
+    for n_workers, added in table.loc['pickled', 'added_mb_per_worker'].items():
+        if added < floor:
+            failures.append(f"pickled, {n_workers} workers: {added:.1f} MB per worker "
+                            f"over the baseline, expected at least {floor:.1f} MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--scale', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(),
+                                                           'team30-benchmarks'))
+    parser.add_argument('--start-method', default='spawn',
+                        choices=multiprocessing.get_all_start_methods())
+    parser.add_argument('--output', default=None, help="also write the table as CSV")
+    args = parser.parse_args()
+
+    path = dataset(args.scale, args.seed, args.data_dir)
+    df, _ = data.load_cleaned(path, columns=colstore.DEFAULT_COLUMNS, cache_dir=None)
+    df = data.to_columnar(df)
+    context = multiprocessing.get_context(args.start_method)
+
+    table, data_mb = run(df, args.workers, context)
+    print(f"{len(df)} rows, {data_mb:.1f} MB of columns")
+    print(table.round(2).to_string())
+    if args.output:
+        table.to_csv(args.output)
+    failures = check(table, data_mb)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: shared-column workers stay within the memory bound")
+
+
+if __name__ == '__main__':
+    main()
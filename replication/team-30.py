@@ -9,130 +9,322 @@ Analysis Approach:
 2. Exploratory data analysis
 3. Statistical modeling (Poisson/Negative Binomial regression)
 4. Visualization of results
+
+Usage:
+    python team-30.py                                   # every stage
+    python team-30.py --stages tests --data path/to/CrowdstormingDataJuly1st.csv
+    python team-30.py --stages eda plots --stream
+
+The stages are load, eda, tests, plots and report. load always runs, and
+report needs the models fitted by tests, so it brings tests along. Only
+numpy, pandas and the data modules of team30 are imported up front;
+scipy.stats, statsmodels and the resampling modules are imported by the
+tests stage and matplotlib and seaborn by the plots stage (STAGE_IMPORTS),
+so a run without them does not pay for their import (see
+benchmarks/startup.py).
 """
 
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy import stats
-import statsmodels.api as sm
-from statsmodels.tools import add_constant
+import argparse
+import os
+import time
 import warnings
 warnings.filterwarnings('ignore')
 
-# Set style for visualizations
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (12, 8)
+import numpy as np
+import pandas as pd
+
+from team30 import (compressed, data, groupindex, incremental, modelstore, parallel,
+                    profiling, scheduler, streaming)
+from team30.summary import summarize
+
+STAGES = ['load', 'eda', 'tests', 'plots', 'report']
+
+# What each stage imports beyond numpy, pandas and the data modules
+STAGE_IMPORTS = {
+    'tests': ['scipy.stats', 'statsmodels.api', 'team30.bootstrap', 'team30.glmm',
+              'team30.permutation'],
+    'plots': ['matplotlib.pyplot', 'seaborn'],
+}
+
+# Where the Makefile mounts the data; TEAM30_DATA or --data point elsewhere
+DEFAULT_DATA = '/data/CrowdstormingDataJuly1st.csv'
 
-def load_and_clean_data(filepath):
-    """Load and preprocess the dataset."""
+# Columns used by the analysis stages; only these are read from the cache.
+# refCountry, leagueCountry, position and meanIAT are the subgroup cuts of
+# the group index.
+ANALYSIS_COLUMNS = ['playerShort', 'refNum', 'games', 'redCards',
+                    'skinTone', 'skinToneCategory', 'darkSkin',
+                    'refCountry', 'leagueCountry', 'position', 'meanIAT']
+
+# Subgroup cuts of the exploratory analysis; referee countries are many, so
+# only the ones with the most dyads are shown.
+SUBGROUP_DIMENSIONS = ['leagueCountry', 'position', 'meanIAT', 'refCountry']
+TOP_REF_COUNTRIES = 10
+
+def load_and_clean_data(filepath, columns=None, cache_dir=data.DEFAULT_CACHE_DIR):
+    """
+    Load and preprocess the dataset.
+
+    The cleaned data is cached in a typed columnar file under ``cache_dir``
+    (see team30/data.py); ``columns`` restricts what is read back from it.
+    """
     print("=" * 80)
     print("LOADING AND CLEANING DATA")
     print("=" * 80)
     
-    df = pd.read_csv(filepath)
-    print(f"Initial dataset shape: {df.shape}")
-    print(f"Total observations: {len(df):,}")
+    df, meta = data.load_cleaned(filepath, columns=columns, cache_dir=cache_dir)
+    initial_count, n_columns = meta['initial_shape']
+    print(f"Initial dataset shape: {(initial_count, n_columns)}")
+    print(f"Total observations: {initial_count:,}")
+    if meta['source'] == 'cache':
+        print(f"Loaded cleaned data from cache: {meta['path']}")
+    
+    # Skin tone is the average of the two raters; rows without any rating are
+    # removed. Categories use the bins [0, 0.25, 0.5, 0.75, 1.0] and dark skin
+    # is skinTone > 0.5 (see data.CLEANING_PARAMS).
+    print(f"Removed {initial_count - meta['clean_shape'][0]:,} rows with missing skin tone ratings")
+    
+    print(f"\nFinal dataset shape: {tuple(meta['clean_shape'])}")
+    print(f"Players analyzed: {df['playerShort'].nunique():,}")
+    
+    return df
+
+def scan_data(filepath, chunk_size=streaming.DEFAULT_CHUNK_SIZE,
+              cache_dir=data.DEFAULT_CACHE_DIR):
+    """
+    Streaming counterpart of load_and_clean_data.
+
+    Reads the data in chunks of ``chunk_size`` rows and keeps only the
+    summary and the compressed model patterns (see team30/streaming.py).
+    """
+    print("=" * 80)
+    print("LOADING AND CLEANING DATA (STREAMING)")
+    print("=" * 80)
     
-    # Create average skin tone rating
-    df['skinTone'] = df[['rater1', 'rater2']].mean(axis=1)
+    summary, patterns, meta = streaming.scan(filepath, chunk_size=chunk_size,
+                                             cache_dir=cache_dir)
+    initial_count, n_columns = meta['initial_shape']
+    print(f"Initial dataset shape: {(initial_count, n_columns)}")
+    print(f"Total observations: {initial_count:,}")
+    print(f"Read {meta['chunks']:,} chunks of up to {chunk_size:,} rows from the "
+          f"{'cache: ' + meta['path'] if meta['source'] == 'cache' else 'CSV'}")
+    print(f"Removed {initial_count - meta['clean_shape'][0]:,} rows with missing skin tone ratings")
     
-    # Remove rows with missing skin tone ratings
-    initial_count = len(df)
-    df = df.dropna(subset=['skinTone'])
-    print(f"Removed {initial_count - len(df):,} rows with missing skin tone ratings")
+    print(f"\nFinal dataset shape: {tuple(meta['clean_shape'])}")
+    print(f"Players analyzed: {summary.n_players:,}")
     
-    # Create binary skin tone categories
-    # Using median split: 0.25 to 0.5 as reference
-    df['skinToneCategory'] = pd.cut(df['skinTone'], 
-                                     bins=[0, 0.25, 0.5, 0.75, 1.0],
-                                     labels=['Very Light', 'Light', 'Dark', 'Very Dark'],
-                                     include_lowest=True)
+    return summary, patterns
+
+def update_data(filepaths, state_dir=incremental.DEFAULT_STATE_DIR,
+                chunk_size=streaming.DEFAULT_CHUNK_SIZE):
+    """
+    Incremental counterpart of scan_data.
+
+    Merges the rows of ``filepaths`` not seen before into the reduced state
+    in ``state_dir`` (see team30/incremental.py) and returns the summary,
+    the compressed model patterns and the state.
+    """
+    print("=" * 80)
+    print("LOADING AND CLEANING DATA (INCREMENTAL)")
+    print("=" * 80)
     
-    # Binary classification: light (0-0.5) vs dark (0.5-1.0)
-    df['darkSkin'] = (df['skinTone'] > 0.5).astype(int)
+    state, added = incremental.ingest(filepaths, state_dir, chunk_size=chunk_size)
+    for source in added:
+        print(f"Added {source['clean_rows']:,} of {source['rows']:,} rows from {source['path']}"
+              + (f" (from byte {source['offset']:,})" if source['offset'] else ""))
+    if not added:
+        print("No new rows")
+    print(f"State: {state_dir} ({len(state.sources)} sources)")
     
-    print(f"\nFinal dataset shape: {df.shape}")
-    print(f"Players analyzed: {df['playerShort'].nunique():,}")
+    print(f"\nFinal dataset: {state.n:,} dyads")
+    print(f"Players analyzed: {len(state.players):,}")
     
-    return df
+    return state.summary(), state.patterns, state
+
+def category_stats(index):
+    """Summary.category_stats() from the skinToneCategory groups of ``index``."""
+    table = index.table('skinToneCategory')
+    out = pd.DataFrame({
+        ('redCards', 'count'): table['n'],
+        ('redCards', 'sum'): table['red'],
+        ('redCards', 'mean'): table['mean'],
+        ('games', 'sum'): table['games'],
+    })
+    out.columns = pd.MultiIndex.from_tuples(out.columns)
+    return out
 
-def exploratory_analysis(df):
-    """Perform exploratory data analysis."""
+def subgroup_table(index, dimension):
+    """
+    Dyads, red cards and red cards per game of every group of ``dimension``,
+    with the dark/light ratio of red cards per game within the group.
+    """
+    table = index.table(dimension)[['n', 'red', 'per_game']].copy()
+    table['dark_light'] = [
+        index.compare({'darkSkin': 1, dimension: level},
+                      {'darkSkin': 0, dimension: level})['rate_ratio']
+        for level in table.index]
+    return table
+
+def exploratory_analysis(summary, index=None):
+    """
+    Perform exploratory data analysis.
+
+    The distributions are read from ``summary`` (see team30/summary.py),
+    which holds the data's counts and sums by skin tone and red cards. With
+    the group index of the dyads (team30/groupindex.py) the light/dark and
+    category breakdowns come from its group totals, with the same figures,
+    and the red cards by league, position, referee IAT quartile and referee
+    country follow; without it (streamed or incremental data) those are
+    left out.
+    """
     print("\n" + "=" * 80)
     print("EXPLORATORY DATA ANALYSIS")
     print("=" * 80)
     
     # Basic statistics
+    skin = summary.skin_tone_stats()
     print("\n1. SKIN TONE DISTRIBUTION")
     print("-" * 40)
-    print(f"Mean skin tone: {df['skinTone'].mean():.3f}")
-    print(f"Median skin tone: {df['skinTone'].median():.3f}")
-    print(f"Std deviation: {df['skinTone'].std():.3f}")
-    print(f"Range: [{df['skinTone'].min():.3f}, {df['skinTone'].max():.3f}]")
+    print(f"Mean skin tone: {skin['mean']:.3f}")
+    print(f"Median skin tone: {skin['median']:.3f}")
+    print(f"Std deviation: {skin['std']:.3f}")
+    print(f"Range: [{skin['min']:.3f}, {skin['max']:.3f}]")
     
+    if index is None:
+        light, dark = summary.group('light'), summary.group('dark')
+    else:
+        light, dark = index.totals({'darkSkin': 0}), index.totals({'darkSkin': 1})
     print("\n2. SKIN TONE CATEGORIES")
     print("-" * 40)
-    print(df['skinToneCategory'].value_counts().sort_index())
-    print(f"\nDark skin (>0.5): {df['darkSkin'].sum():,} ({df['darkSkin'].mean()*100:.1f}%)")
-    print(f"Light skin (≤0.5): {(1-df['darkSkin']).sum():,} ({(1-df['darkSkin'].mean())*100:.1f}%)")
+    print(summary.category_counts())
+    print(f"\nDark skin (>0.5): {dark['n']:,} ({dark['n'] / summary.n*100:.1f}%)")
+    print(f"Light skin (≤0.5): {light['n']:,} ({light['n'] / summary.n*100:.1f}%)")
     
     # Red card statistics
+    red = summary.red_card_stats()
     print("\n3. RED CARD STATISTICS")
     print("-" * 40)
-    print(f"Total red cards: {df['redCards'].sum():,}")
-    print(f"Players with at least one red card: {(df['redCards'] > 0).sum():,}")
-    print(f"Percentage with red cards: {(df['redCards'] > 0).mean()*100:.2f}%")
-    print(f"Mean red cards per observation: {df['redCards'].mean():.4f}")
-    print(f"Max red cards: {df['redCards'].max()}")
+    print(f"Total red cards: {red['total']:,}")
+    print(f"Players with at least one red card: {red['any']:,}")
+    print(f"Percentage with red cards: {red['any'] / summary.n*100:.2f}%")
+    print(f"Mean red cards per observation: {red['mean']:.4f}")
+    print(f"Max red cards: {red['max']}")
     
     # Red cards by skin tone
     print("\n4. RED CARDS BY SKIN TONE")
     print("-" * 40)
     
     # By binary classification
-    light_df = df[df['darkSkin'] == 0]
-    dark_df = df[df['darkSkin'] == 1]
-    
     print("\nLight Skin (≤0.5):")
-    print(f"  Total observations: {len(light_df):,}")
-    print(f"  Total red cards: {light_df['redCards'].sum()}")
-    print(f"  Mean red cards: {light_df['redCards'].mean():.4f}")
-    print(f"  Red card rate: {(light_df['redCards'] > 0).mean()*100:.2f}%")
+    print(f"  Total observations: {light['n']:,}")
+    print(f"  Total red cards: {light['red']}")
+    print(f"  Mean red cards: {light['mean']:.4f}")
+    print(f"  Red card rate: {light['any_rate']*100:.2f}%")
     
     print("\nDark Skin (>0.5):")
-    print(f"  Total observations: {len(dark_df):,}")
-    print(f"  Total red cards: {dark_df['redCards'].sum()}")
-    print(f"  Mean red cards: {dark_df['redCards'].mean():.4f}")
-    print(f"  Red card rate: {(dark_df['redCards'] > 0).mean()*100:.2f}%")
+    print(f"  Total observations: {dark['n']:,}")
+    print(f"  Total red cards: {dark['red']}")
+    print(f"  Mean red cards: {dark['mean']:.4f}")
+    print(f"  Red card rate: {dark['any_rate']*100:.2f}%")
     
     # By category
     print("\n5. RED CARDS BY DETAILED CATEGORIES")
     print("-" * 40)
-    category_stats = df.groupby('skinToneCategory', observed=True).agg({
-        'redCards': ['count', 'sum', 'mean'],
-        'games': 'sum'
-    }).round(4)
-    print(category_stats)
+    stats_by_category = summary.category_stats() if index is None else category_stats(index)
+    print(stats_by_category.round(4))
     
     # Calculate red cards per game
     print("\n6. RED CARDS PER GAME PLAYED")
     print("-" * 40)
     print("\nLight Skin (≤0.5):")
-    light_rate = light_df['redCards'].sum() / light_df['games'].sum()
-    print(f"  Red cards per game: {light_rate:.5f}")
+    print(f"  Red cards per game: {light['per_game']:.5f}")
     
     print("\nDark Skin (>0.5):")
-    dark_rate = dark_df['redCards'].sum() / dark_df['games'].sum()
-    print(f"  Red cards per game: {dark_rate:.5f}")
+    print(f"  Red cards per game: {dark['per_game']:.5f}")
+    
+    print(f"\nRatio (Dark/Light): {dark['per_game']/light['per_game']:.3f}")
     
-    print(f"\nRatio (Dark/Light): {dark_rate/light_rate:.3f}")
+    if index is None:
+        return
     
-    return light_df, dark_df
+    print("\n7. RED CARDS BY SUBGROUP")
+    print("-" * 40)
+    print("Dyads, red cards, red cards per game and its dark/light ratio")
+    for dimension in SUBGROUP_DIMENSIONS:
+        if dimension not in index.dimensions:
+            continue
+        table = subgroup_table(index, dimension)
+        if dimension == 'meanIAT':
+            table.index.name = 'meanIAT quartile'
+        elif dimension == 'refCountry':
+            print(f"\nReferee countries: {len(table)} "
+                  f"(the {TOP_REF_COUNTRIES} with the most dyads)")
+            table = table.nlargest(TOP_REF_COUNTRIES, 'n')
+        print()
+        print(table.round({'per_game': 5, 'dark_light': 3}).to_string())
+
+def statistical_tests(df, summary, mode='full', n_boot=10000, n_perm=10000, n_jobs=None,
+                      patterns=None, profiler=None, store=None, mixed=True, warm_from=None):
+    """
+    Perform statistical tests.
+
+    The Mann-Whitney and chi-square tests only need the counts in
+    ``summary``; the regression models are fitted on ``df``. In streaming
+    mode ``df`` is None and the models are fitted from the compressed
+    ``patterns`` table; the dyad-level sections 5 and 6 are skipped and
+    ``robust`` is None.
+
+    With ``mode='compressed'`` the regression models are fitted on the unique
+    (redCards, skinTone, games) patterns with frequency weights (see
+    team30/compressed.py). Estimates, and the No. Observations and Df
+    Residuals of the model summaries, are identical to ``mode='full'``.
 
-def statistical_tests(df, light_df, dark_df):
-    """Perform statistical tests."""
+    The Poisson skin tone effect is also reported with player-clustered
+    standard errors and an ``n_boot``-replicate cluster bootstrap run on
+    ``n_jobs`` processes (see team30/bootstrap.py), and tested with an
+    ``n_perm``-permutation player-level permutation test (see
+    team30/permutation.py). Zero skips either one. With ``mixed`` the model
+    is also fitted with crossed random intercepts for player and referee (see
+    team30/glmm.py).
+
+    Each model fit and resampling run is timed as a stage of ``profiler``
+    (see team30/profiling.py).
+
+    The Negative Binomial fit starts from the Poisson estimates, and both
+    start from the earlier results in ``warm_from`` ({family: [results]}),
+    e.g. the previous estimates of an incremental run. With a
+    modelstore.ModelStore as ``store`` both fits are looked up there first
+    and stored after fitting, so a rerun on unchanged data skips them (see
+    team30/modelstore.py).
+
+    The sections after the count models are model_tests, cluster_inference,
+    permutation_inference and mixed_model_inference, which main() runs
+    concurrently.
+    """
+    poisson_model, nb_model = model_tests(df, summary, mode=mode, patterns=patterns,
+                                          profiler=profiler, store=store,
+                                          warm_from=warm_from)
+    if df is None:
+        return poisson_model, nb_model, None
+    robust = collect_robust(
+        cluster_inference(df, poisson_model, n_boot=n_boot, n_jobs=n_jobs, profiler=profiler),
+        permutation_inference(df, n_perm=n_perm, n_jobs=n_jobs, profiler=profiler),
+        mixed_model_inference(df, profiler=profiler) if mixed else None)
+    return poisson_model, nb_model, robust
+
+def model_tests(df, summary, mode='full', patterns=None, profiler=None, store=None,
+                warm_from=None):
+    """
+    Sections 1-4 of statistical_tests: the two tests on the counts and the
+    Poisson and Negative Binomial models. Returns both fitted models.
+    """
+    from scipy import stats
+    from statsmodels.tools import add_constant
+
+    if profiler is None:
+        profiler = profiling.Profiler(trace_memory=False)
+    warm_from = warm_from or {}
+    
     print("\n" + "=" * 80)
     print("STATISTICAL TESTS")
     print("=" * 80)
@@ -141,9 +333,7 @@ def statistical_tests(df, light_df, dark_df):
     print("\n1. MANN-WHITNEY U TEST")
     print("-" * 40)
     print("Comparing red card distributions between light and dark skin players")
-    statistic, p_value = stats.mannwhitneyu(light_df['redCards'], 
-                                             dark_df['redCards'], 
-                                             alternative='two-sided')
+    statistic, p_value = summary.mann_whitney()
     print(f"U-statistic: {statistic:.2f}")
     print(f"P-value: {p_value:.6f}")
     print(f"Result: {'Significant' if p_value < 0.05 else 'Not significant'} at α=0.05")
@@ -153,7 +343,7 @@ def statistical_tests(df, light_df, dark_df):
     print("-" * 40)
     print("Testing independence between skin tone and receiving any red card")
     
-    contingency = pd.crosstab(df['darkSkin'], df['redCards'] > 0)
+    contingency = summary.contingency()
     chi2, p_value_chi, dof, expected = stats.chi2_contingency(contingency)
     print(f"Chi-square statistic: {chi2:.4f}")
     print(f"Degrees of freedom: {dof}")
@@ -166,12 +356,27 @@ def statistical_tests(df, light_df, dark_df):
     print("Predicting red cards from skin tone (controlling for games played)")
     
     # Prepare data for regression
-    model_df = df[['redCards', 'skinTone', 'games']].dropna()
+    if df is None:
+        mode = 'compressed'
+    if mode == 'compressed':
+        if patterns is None:
+            patterns = compressed.compress_patterns(df, ['skinTone', 'games'])
+        model_df = patterns
+        weights = model_df['count']
+        print(f"Compressed {int(weights.sum()):,} observations to "
+              f"{len(model_df):,} covariate patterns")
+    else:
+        model_df = df[['redCards', 'skinTone', 'games']].dropna()
+        weights = None
     X = add_constant(model_df[['skinTone', 'games']])
     y = model_df['redCards']
     
     # Fit Poisson model
-    poisson_model = sm.Poisson(y, X).fit(disp=False)
+    with profiler.stage('poisson', rows=len(y)) as record:
+        poisson_model = modelstore.fit_cached('poisson', y, X, weights, store=store,
+                                              warm_from=warm_from.get('poisson', ()))
+        record['cached'] = getattr(poisson_model, 'cached', False)
+        record.update(profiling.fit_info(poisson_model))
     print(poisson_model.summary())
     
     # Extract key results
@@ -193,7 +398,13 @@ def statistical_tests(df, light_df, dark_df):
     print("-" * 40)
     print("Alternative model accounting for potential overdispersion")
     
-    nb_model = sm.NegativeBinomial(y, X).fit(disp=False)
+    # Newton steps converge to the exact MLE, so both modes agree.
+    with profiler.stage('negbin', rows=len(y)) as record:
+        nb_model = modelstore.fit_cached('negbin', y, X, weights, store=store,
+                                         warm_from=[*warm_from.get('negbin', ()),
+                                                    poisson_model])
+        record['cached'] = getattr(nb_model, 'cached', False)
+        record.update(profiling.fit_info(nb_model))
     print(nb_model.summary())
     
     # Extract key results
@@ -208,23 +419,154 @@ def statistical_tests(df, light_df, dark_df):
     print(f"Result: {'Significant' if skin_pval_nb < 0.05 else 'Not significant'} at α=0.05")
     print("=" * 40)
     
+    if df is None:
+        print("\nCluster-robust inference, the permutation test and the mixed model need the")
+        print("player of every dyad; skipped in streaming mode.")
+    
     return poisson_model, nb_model
 
-def create_visualizations(df, light_df, dark_df):
-    """Create visualizations of the results."""
+def cluster_inference(df, poisson_model, n_boot=10000, n_jobs=None, profiler=None,
+                      mp_context=None):
+    """
+    Section 5 of statistical_tests: player-clustered and two-way clustered
+    standard errors of the Poisson skin tone effect, and the cluster
+    bootstrap. Returns the ``robust`` fields of these. ``mp_context`` is the
+    bootstrap pool's multiprocessing context (see team30/parallel.py).
+    """
+    from scipy import stats
+
+    from team30 import bootstrap
+
+    if profiler is None:
+        profiler = profiling.Profiler(trace_memory=False)
+    skin_coef = poisson_model.params['skinTone']
+    
+    # 5. Player-clustered inference for the Poisson model
+    print("\n5. CLUSTER-ROBUST INFERENCE (POISSON)")
+    print("-" * 40)
+    print("Accounting for repeated observations of the same player (and referee)")
+    
+    with profiler.stage('cluster_robust', rows=len(df)) as record:
+        cluster_data = bootstrap.build_cluster_data(df, cluster='playerShort', cluster2='refNum')
+        skin = cluster_data['names'].index('skinTone')
+        beta = bootstrap.fit_poisson(cluster_data)
+        se_player = np.sqrt(bootstrap.cluster_robust_cov(cluster_data, beta)[skin, skin])
+        se_two_way = np.sqrt(bootstrap.cluster_robust_cov(cluster_data, beta,
+                                                          two_way=True)[skin, skin])
+        record['clusters'] = cluster_data['Y'].shape[0]
+    pval_player = 2 * stats.norm.sf(abs(skin_coef / se_player))
+    print(f"Naive std. error:              {poisson_model.bse['skinTone']:.4f}")
+    print(f"Player-clustered std. error:   {se_player:.4f} (p = {pval_player:.6f})")
+    print(f"Player+referee clustered s.e.: {se_two_way:.4f}")
+    
+    robust = {'se_player': se_player, 'pval_player': pval_player,
+              'se_two_way': se_two_way, 'boot': None}
+    if n_boot:
+        with profiler.stage('bootstrap', replicates=n_boot) as record:
+            boot = bootstrap.cluster_bootstrap(cluster_data, n_boot=n_boot, n_jobs=n_jobs,
+                                               mp_context=mp_context)
+            record['converged'] = boot['n_converged']
+        robust['boot'] = boot['summary'].loc['skinTone']
+        print(f"Player cluster bootstrap ({boot['n_converged']:,}/{n_boot:,} replicates):")
+        print(f"  Std. error: {robust['boot']['boot_se']:.4f}")
+        print(f"  95% CI: [{robust['boot']['ci_low']:.4f}, {robust['boot']['ci_high']:.4f}]")
+    
+    return robust
+
+def permutation_inference(df, n_perm=10000, n_jobs=None, profiler=None, mp_context=None):
+    """
+    Section 6 of statistical_tests: the player-level permutation test, or
+    None. ``mp_context`` is as for cluster_inference.
+    """
+    from team30 import permutation
+
+    if not n_perm:
+        return None
+    if profiler is None:
+        profiler = profiling.Profiler(trace_memory=False)
+    
+    # 6. Player-level permutation test
+    print("\n6. PLAYER-LEVEL PERMUTATION TEST")
+    print("-" * 40)
+    print("Shuffling skin tone across players (all of a player's dyads move together)")
+    with profiler.stage('permutation', permutations=n_perm):
+        sums = permutation.player_sums(df)
+        perm = permutation.permutation_test(sums, n_perm=n_perm, n_jobs=n_jobs,
+                                            mp_context=mp_context)
+    labels = {'rate_ratio': 'Rate ratio (dark/light, per game)',
+              'chi2': 'Chi-square (dark x any red card)',
+              'score': 'Poisson score statistic (skin tone)'}
+    for name, row in perm.iterrows():
+        print(f"{labels[name]}: {row['observed']:.4f}")
+        print(f"  Permutation p-value: {row['p_value']:.4f} "
+              f"(Monte Carlo s.e. {row['mc_se']:.4f}, {n_perm:,} permutations)")
+    
+    return perm
+
+def mixed_model_inference(df, profiler=None):
+    """Section 7 of statistical_tests: the crossed random-effects Poisson model."""
+    from team30 import glmm
+
+    if profiler is None:
+        profiler = profiling.Profiler(trace_memory=False)
+    
+    # 7. Crossed random effects for player and referee
+    print("\n7. CROSSED RANDOM-EFFECTS POISSON MODEL")
+    print("-" * 40)
+    print("Random intercepts for player and referee (variational Bayes, sparse design)")
+    with profiler.stage('glmm', rows=len(df)) as record:
+        mixed_model = glmm.fit(glmm.build_design(df))
+        record.update(nobs=mixed_model['nobs'], iterations=mixed_model['iterations'],
+                      sweeps=mixed_model['sweeps'], converged=mixed_model['converged'])
+    print(mixed_model['table'].round(4).to_string())
+    sd, n_groups = mixed_model['sd'], mixed_model['n_groups']
+    print(f"Random intercept s.d.: player {sd['playerShort']:.4f} "
+          f"({n_groups['playerShort']:,} players), referee {sd['refNum']:.4f} "
+          f"({n_groups['refNum']:,} referees)")
+    print("(Variational estimates; with few red cards per group they tend to "
+          "understate the s.d.)")
+    skin_row = mixed_model['table'].loc['skinTone']
+    print(f"Skin tone IRR: {np.exp(skin_row['coef']):.4f} "
+          f"(p = {skin_row['P>|z|']:.6f}, converged: {mixed_model['converged']})")
+    
+    return mixed_model
+
+def collect_robust(cluster, perm=None, mixed_model=None):
+    """The ``robust`` results of statistical_tests from its sections 5-7."""
+    return dict(cluster, permutation=perm, glmm=mixed_model)
+
+def create_visualizations(summary, render='aggregated'):
+    """
+    Create visualizations of the results from ``summary``.
+
+    ``render='aggregated'`` draws the skin tone vs red cards panel as a
+    weighted hexbin of the summary counts, so the figure costs the same at
+    any data size. ``render='full'`` draws the original jittered scatter of
+    every dyad instead.
+    """
     print("\n" + "=" * 80)
     print("CREATING VISUALIZATIONS")
     print("=" * 80)
     
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
+    # Set style for visualizations
+    sns.set_style("whitegrid")
+    plt.rcParams['figure.figsize'] = (12, 8)
+    
     fig, axes = plt.subplots(2, 3, figsize=(18, 12))
     fig.suptitle('Analysis: Skin Tone and Red Cards in Soccer', fontsize=16, fontweight='bold')
     
     # 1. Distribution of skin tone ratings
-    axes[0, 0].hist(df['skinTone'], bins=50, edgecolor='black', alpha=0.7, color='steelblue')
-    axes[0, 0].axvline(df['skinTone'].mean(), color='red', linestyle='--', 
-                       linewidth=2, label=f'Mean: {df["skinTone"].mean():.3f}')
-    axes[0, 0].axvline(df['skinTone'].median(), color='orange', linestyle='--', 
-                       linewidth=2, label=f'Median: {df["skinTone"].median():.3f}')
+    skin_counts = summary.skin_tone_counts()
+    skin = summary.skin_tone_stats()
+    axes[0, 0].hist(skin_counts.index, weights=skin_counts, bins=50, edgecolor='black',
+                    alpha=0.7, color='steelblue')
+    axes[0, 0].axvline(skin['mean'], color='red', linestyle='--', 
+                       linewidth=2, label=f'Mean: {skin["mean"]:.3f}')
+    axes[0, 0].axvline(skin['median'], color='orange', linestyle='--', 
+                       linewidth=2, label=f'Median: {skin["median"]:.3f}')
     axes[0, 0].set_xlabel('Skin Tone Rating (0=Very Light, 1=Very Dark)')
     axes[0, 0].set_ylabel('Frequency')
     axes[0, 0].set_title('Distribution of Skin Tone Ratings')
@@ -232,7 +574,7 @@ def create_visualizations(df, light_df, dark_df):
     axes[0, 0].grid(True, alpha=0.3)
     
     # 2. Red cards by skin tone category
-    category_means = df.groupby('skinToneCategory', observed=True)['redCards'].mean()
+    category_means = summary.category_stats()[('redCards', 'mean')]
     colors = ['#e8f4f8', '#a8d8ea', '#6bb6d6', '#2e7d99']
     bars = axes[0, 1].bar(range(len(category_means)), category_means, 
                           color=colors, edgecolor='black')
@@ -249,24 +591,33 @@ def create_visualizations(df, light_df, dark_df):
                        f'{height:.4f}', ha='center', va='bottom', fontsize=9)
     
     # 3. Box plot: Red cards by dark/light skin
-    data_for_box = [light_df['redCards'], dark_df['redCards']]
-    bp = axes[0, 2].boxplot(data_for_box, labels=['Light Skin\n(≤0.5)', 'Dark Skin\n(>0.5)'],
-                            patch_artist=True)
+    box_stats = [dict(summary.box_stats(0), label='Light Skin\n(≤0.5)'),
+                 dict(summary.box_stats(1), label='Dark Skin\n(>0.5)')]
+    bp = axes[0, 2].bxp(box_stats, patch_artist=True)
     bp['boxes'][0].set_facecolor('#a8d8ea')
     bp['boxes'][1].set_facecolor('#2e7d99')
     axes[0, 2].set_ylabel('Red Cards')
     axes[0, 2].set_title('Red Cards Distribution: Light vs Dark Skin')
     axes[0, 2].grid(True, alpha=0.3, axis='y')
     
-    # 4. Scatter plot: Skin tone vs red cards (with jitter)
-    jitter_x = df['skinTone'] + np.random.normal(0, 0.02, len(df))
-    jitter_y = df['redCards'] + np.random.normal(0, 0.05, len(df))
-    axes[1, 0].scatter(jitter_x, jitter_y, alpha=0.3, s=10, color='steelblue')
+    # 4. Skin tone vs red cards: dyad density, or a scatter (with jitter)
+    if render == 'full':
+        skin_tone, red_cards = summary.points()
+        jitter_x = skin_tone + np.random.normal(0, 0.02, len(skin_tone))
+        jitter_y = red_cards + np.random.normal(0, 0.05, len(red_cards))
+        axes[1, 0].scatter(jitter_x, jitter_y, alpha=0.3, s=10, color='steelblue',
+                           rasterized=True)
+    else:
+        table = summary.table
+        hb = axes[1, 0].hexbin(table['skinTone'], table['redCards'], C=table['n'],
+                               reduce_C_function=np.sum, gridsize=(20, 6), bins='log',
+                               cmap='Blues', mincnt=1, rasterized=True)
+        fig.colorbar(hb, ax=axes[1, 0], label='Observations')
     
     # Add trend line
-    z = np.polyfit(df['skinTone'], df['redCards'], 1)
+    z = summary.trend()
     p = np.poly1d(z)
-    x_line = np.linspace(df['skinTone'].min(), df['skinTone'].max(), 100)
+    x_line = np.linspace(skin['min'], skin['max'], 100)
     axes[1, 0].plot(x_line, p(x_line), "r--", linewidth=2, label='Trend')
     
     axes[1, 0].set_xlabel('Skin Tone Rating')
@@ -276,8 +627,9 @@ def create_visualizations(df, light_df, dark_df):
     axes[1, 0].grid(True, alpha=0.3)
     
     # 5. Red card rate comparison
-    light_rate = (light_df['redCards'] > 0).mean() * 100
-    dark_rate = (dark_df['redCards'] > 0).mean() * 100
+    groups = summary.groups()
+    light_rate = groups.loc['light', 'any_rate'] * 100
+    dark_rate = groups.loc['dark', 'any_rate'] * 100
     
     bars = axes[1, 1].bar(['Light Skin\n(≤0.5)', 'Dark Skin\n(>0.5)'], 
                           [light_rate, dark_rate],
@@ -293,8 +645,8 @@ def create_visualizations(df, light_df, dark_df):
                        f'{height:.2f}%', ha='center', va='bottom', fontsize=10)
     
     # 6. Red cards per 100 games
-    light_per_100 = (light_df['redCards'].sum() / light_df['games'].sum()) * 100
-    dark_per_100 = (dark_df['redCards'].sum() / dark_df['games'].sum()) * 100
+    light_per_100 = groups.loc['light', 'per_game'] * 100
+    dark_per_100 = groups.loc['dark', 'per_game'] * 100
     
     bars = axes[1, 2].bar(['Light Skin\n(≤0.5)', 'Dark Skin\n(>0.5)'], 
                           [light_per_100, dark_per_100],
@@ -318,7 +670,22 @@ def create_visualizations(df, light_df, dark_df):
     
     return fig
 
-def generate_report(df, light_df, dark_df, poisson_model, nb_model):
+def save_visualizations(summary, render='aggregated'):
+    """
+    create_visualizations with the Agg backend, closing the figure.
+
+    For running the plots in a worker process: returns the file written
+    rather than the figure.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    
+    fig = create_visualizations(summary, render=render)
+    plt.close(fig)
+    return 'team-30-analysis.png'
+
+def generate_report(summary, poisson_model, nb_model, robust=None):
     """Generate a summary report."""
     print("\n" + "=" * 80)
     print("FINAL REPORT: TEAM 0 ANALYSIS")
@@ -332,8 +699,8 @@ def generate_report(df, light_df, dark_df, poisson_model, nb_model):
     print("METHODOLOGY:")
     print("-" * 80)
     print("1. Dataset: CrowdstormingDataJuly1st.csv")
-    print(f"2. Sample size: {len(df):,} player-referee observations")
-    print(f"3. Players analyzed: {df['playerShort'].nunique():,}")
+    print(f"2. Sample size: {summary.n:,} player-referee observations")
+    print(f"3. Players analyzed: {summary.n_players:,}")
     print("4. Skin tone measurement: Average of two independent raters (0-1 scale)")
     print("5. Classification: Light (≤0.5) vs Dark (>0.5) skin tone")
     print("6. Statistical methods:")
@@ -342,25 +709,28 @@ def generate_report(df, light_df, dark_df, poisson_model, nb_model):
     print("   - Chi-square test of independence")
     print("   - Poisson regression (controlling for games played)")
     print("   - Negative Binomial regression")
+    if robust is not None and robust.get('glmm') is not None:
+        print("   - Poisson regression with crossed player and referee random effects")
     
     print("\n" + "-" * 80)
     print("KEY FINDINGS:")
     print("-" * 80)
     
     # Calculate key statistics
-    light_mean = light_df['redCards'].mean()
-    dark_mean = dark_df['redCards'].mean()
-    light_rate = (light_df['redCards'] > 0).mean() * 100
-    dark_rate = (dark_df['redCards'] > 0).mean() * 100
-    light_per_game = light_df['redCards'].sum() / light_df['games'].sum()
-    dark_per_game = dark_df['redCards'].sum() / dark_df['games'].sum()
+    light, dark = summary.group('light'), summary.group('dark')
+    light_mean = light['mean']
+    dark_mean = dark['mean']
+    light_rate = light['any_rate'] * 100
+    dark_rate = dark['any_rate'] * 100
+    light_per_game = light['per_game']
+    dark_per_game = dark['per_game']
     
     print(f"\n1. DESCRIPTIVE STATISTICS:")
-    print(f"   Light skin players: {len(light_df):,} observations")
+    print(f"   Light skin players: {light['n']:,} observations")
     print(f"   - Mean red cards: {light_mean:.4f}")
     print(f"   - Red card rate: {light_rate:.2f}%")
     print(f"   - Red cards per game: {light_per_game:.5f}")
-    print(f"   Dark skin players: {len(dark_df):,} observations")
+    print(f"   Dark skin players: {dark['n']:,} observations")
     print(f"   - Mean red cards: {dark_mean:.4f}")
     print(f"   - Red card rate: {dark_rate:.2f}%")
     print(f"   - Red cards per game: {dark_per_game:.5f}")
@@ -376,6 +746,15 @@ def generate_report(df, light_df, dark_df, poisson_model, nb_model):
     print(f"   - P-value: {skin_pval:.6f}")
     print(f"   - Incidence Rate Ratio: {irr:.4f}")
     print(f"   - Effect: {(irr-1)*100:+.2f}% change per unit increase in skin tone")
+    if robust is not None:
+        print(f"   - Player-clustered std. error: {robust['se_player']:.4f} "
+              f"(p = {robust['pval_player']:.6f})")
+        if robust['boot'] is not None:
+            print(f"   - Cluster bootstrap 95% CI: [{robust['boot']['ci_low']:.4f}, "
+                  f"{robust['boot']['ci_high']:.4f}]")
+        if robust['permutation'] is not None:
+            perm_p = robust['permutation']['p_value']
+            print(f"   - Player-level permutation p-value (score test): {perm_p['score']:.4f}")
     
     skin_coef_nb = nb_model.params['skinTone']
     skin_pval_nb = nb_model.pvalues['skinTone']
@@ -386,6 +765,12 @@ def generate_report(df, light_df, dark_df, poisson_model, nb_model):
     print(f"   - P-value: {skin_pval_nb:.6f}")
     print(f"   - Incidence Rate Ratio: {irr_nb:.4f}")
     print(f"   - Effect: {(irr_nb-1)*100:+.2f}% change per unit increase in skin tone")
+    if robust is not None and robust.get('glmm') is not None:
+        skin_row = robust['glmm']['table'].loc['skinTone']
+        print(f"   Crossed Random-Effects Poisson Model (player + referee):")
+        print(f"   - Skin tone coefficient: {skin_row['coef']:.4f}")
+        print(f"   - P-value: {skin_row['P>|z|']:.6f}")
+        print(f"   - Incidence Rate Ratio: {np.exp(skin_row['coef']):.4f}")
     
     print("\n" + "-" * 80)
     print("CONCLUSION:")
@@ -411,40 +796,205 @@ def generate_report(df, light_df, dark_df, poisson_model, nb_model):
     print("3. Confounding variables may exist (e.g., playing style, position, league)")
     print("4. Red cards are rare events, leading to many zeros in the data")
     print("5. Multiple observations per player may introduce clustering effects")
+    if robust is not None:
+        print("   (the Poisson effect is also reported with player-clustered errors)")
     print("6. Referee bias (implicit or explicit) cannot be directly measured")
     
     print("\n" + "=" * 80)
     print("ANALYSIS COMPLETE")
     print("=" * 80)
 
-def main():
-    """Main analysis pipeline."""
+def resolve_stages(stages):
+    """
+    The stages to run for the requested ``stages``, in pipeline order.
+
+    load is always run and report brings in tests, whose models it reports.
+    """
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+    stages = {'load', *stages}
+    if 'report' in stages:
+        stages.add('tests')
+    return [stage for stage in STAGES if stage in stages]
+
+def main(fit_mode='compressed', stream=False, chunk_size=streaming.DEFAULT_CHUNK_SIZE,
+         render='aggregated', metrics_path='team-30-metrics.jsonl', profile_dir=None,
+         trace_memory=True, model_cache=modelstore.DEFAULT_MODEL_DIR, incremental_dir=None,
+         new_data=(), stages=STAGES, filepath=None, n_boot=10000, n_perm=10000, mixed=True,
+         n_jobs=None, concurrent=True):
+    """
+    Main analysis pipeline.
+
+    ``stages`` selects among load, eda, tests, plots and report (see
+    resolve_stages). ``filepath`` is the CSV; it defaults to TEAM30_DATA or
+    else DEFAULT_DATA.
+    ``fit_mode`` is passed to statistical_tests; 'full' fits every dyad.
+    ``n_boot``, ``n_perm``, ``mixed`` and ``n_jobs`` are passed to it too.
+    ``render`` is passed to create_visualizations.
+    Stages that do not depend on each other run at the same time, the plots
+    in a separate process; ``concurrent=False`` runs them one after another
+    in this process. The printed output is the same either way.
+    Timings and memory of every stage and model fit are appended to the JSON
+    Lines file ``metrics_path`` (see team30/profiling.py); with
+    ``profile_dir`` each stage's cProfile statistics are saved there too.
+    ``trace_memory=False`` drops the tracemalloc peaks, which cost time in
+    allocation-heavy stages such as plotting.
+    Fitted models are kept in the directory ``model_cache`` and reused while
+    the data and specification are unchanged; None always refits.
+    With ``stream=True`` the data is never held in memory as a whole: it is
+    reduced chunk by chunk to the summary and the compressed patterns, and
+    the models are fitted from those.
+    With ``incremental_dir`` the reduced tables are kept there between runs
+    and only rows not seen before are read: the dataset on the first run,
+    then whatever is appended to it or listed in ``new_data``. As with
+    ``stream``, the models are fitted from the tables, starting from the
+    estimates of the previous run.
+    """
+    start = time.perf_counter()
+    stages = resolve_stages(stages)
+    # Imported before the stages run, as tracemalloc slows imports several
+    # times over inside a traced stage; concurrent plots import in their process
+    for stage in stages:
+        if stage == 'plots' and concurrent:
+            continue
+        for module in STAGE_IMPORTS.get(stage, ()):
+            __import__(module)
+    
     print("\n")
     print("=" * 80)
     print("TEAM 0: ONE DATASET, MANY ANALYSTS")
     print("Soccer, Skin Tone, and Red Cards Analysis")
     print("=" * 80)
     
-    # File path
-    filepath = '/data/CrowdstormingDataJuly1st.csv'
+    # File path; TEAM30_DATA points elsewhere (run_teams.py's local executor)
+    if filepath is None:
+        filepath = os.environ.get('TEAM30_DATA', DEFAULT_DATA)
     
-    # 1. Load and clean data
-    df = load_and_clean_data(filepath)
+    profiler = profiling.Profiler(metrics_path, profile_dir=profile_dir,
+                                  trace_memory=trace_memory)
     
-    # 2. Exploratory analysis
-    light_df, dark_df = exploratory_analysis(df)
+    # 1. Load and clean data
+    state = None
+    with profiler.stage('load', streaming=stream,
+                        incremental=incremental_dir is not None) as record:
+        if incremental_dir is not None:
+            df = None
+            summary, patterns, state = update_data([filepath, *new_data], incremental_dir,
+                                                   chunk_size=chunk_size)
+        elif stream:
+            df = None
+            summary, patterns = scan_data(filepath, chunk_size=chunk_size)
+        else:
+            df = load_and_clean_data(filepath, columns=ANALYSIS_COLUMNS)
+            summary, patterns = summarize(df), None
+        # Subgroup cuts need the dyads, so only the in-memory data has one
+        index = None if df is None else groupindex.GroupIndex(df)
+        record['rows'] = summary.n
+    
+    # The stages after loading form a graph (team30/scheduler.py): eda, the
+    # count models and plots need only the load; the cluster-robust,
+    # permutation and mixed-model sections only the data and (for the first)
+    # the Poisson fit; the report the models. Independent parts run at the
+    # same time, plots in a process of its own, and their output is printed
+    # in the order below.
+    graph = scheduler.Scheduler(profiler, max_workers=None if concurrent else 1)
+    
+    # 2. Exploratory analysis; the later stages reuse its summary
+    if 'eda' in stages:
+        graph.add('eda', exploratory_analysis, summary, index=index,
+                  fields={'rows': summary.n})
     
     # 3. Statistical tests
-    poisson_model, nb_model = statistical_tests(df, light_df, dark_df)
+    models = robust = None
+    if 'tests' in stages:
+        store = None if model_cache is None else modelstore.ModelStore(model_cache)
+        warm_from = None if state is None else state.warm_starts()
+        models = graph.add('tests', model_tests, df, summary, mode=fit_mode,
+                           patterns=patterns, profiler=profiler, store=store,
+                           warm_from=warm_from, fields={'rows': summary.n, 'mode': fit_mode})
+        if df is not None:
+            # Each section times its own parts. Their worker pools start while
+            # other stages' threads run, so they must not fork this process.
+            context = parallel.thread_safe_context()
+            sections = [
+                graph.add('cluster', cluster_inference, df, models[0], n_boot=n_boot,
+                          n_jobs=n_jobs, profiler=profiler, mp_context=context,
+                          timed=False),
+                graph.add('permutation', permutation_inference, df, n_perm=n_perm,
+                          n_jobs=n_jobs, profiler=profiler, mp_context=context,
+                          timed=False),
+                graph.add('mixed', mixed_model_inference, df, profiler=profiler,
+                          timed=False) if mixed else None,
+            ]
+            robust = graph.add('robust', collect_robust, *sections, timed=False)
     
     # 4. Create visualizations
-    fig = create_visualizations(df, light_df, dark_df)
+    if 'plots' in stages:
+        graph.add('plots', save_visualizations, summary, render=render, process=concurrent,
+                  fields={'render': render})
     
     # 5. Generate final report
-    generate_report(df, light_df, dark_df, poisson_model, nb_model)
+    if 'report' in stages:
+        graph.add('report', generate_report, summary, models[0], models[1], robust)
+    
+    results = graph.run()
+    if state is not None and models is not None:
+        state.record_fits(poisson=results['tests'][0], negbin=results['tests'][1])
+        incremental.save_state(state, incremental_dir)
     
-    print("\nAll outputs generated successfully!")
-    print("- Visualization: team-30-analysis.png")
+    if stages == STAGES:
+        print("\nAll outputs generated successfully!")
+    else:
+        print(f"\nStages run: {', '.join(stages)}")
+    if 'plots' in stages:
+        print("- Visualization: team-30-analysis.png")
+    if metrics_path is not None:
+        print(f"- Stage metrics: {metrics_path}")
+    
+    stages = profiler.table()
+    stages = stages[stages['parent'].isna()].set_index('stage')
+    print("\nStage timings (wall / CPU seconds, peak traced MB):")
+    for name, row in stages.iterrows():
+        peak = row.get('tracemalloc_peak_mb', np.nan)
+        print(f"  {name:<14} {row['wall_s']:8.2f} {row['cpu_s']:8.2f} {peak:10.1f}")
+    print(f"Total wall time: {time.perf_counter() - start:.2f} s"
+          + (" (stages overlap)" if concurrent else ""))
+
+def parse_args(argv=None):
+    """main()'s keyword arguments from the command line."""
+    parser = argparse.ArgumentParser(description="Team 30 analysis: skin tone and red cards")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                        help="stages to run (load always runs; report needs tests)")
+    parser.add_argument('--data', dest='filepath', metavar='CSV', default=None,
+                        help=f"the CSV (default: $TEAM30_DATA or {DEFAULT_DATA})")
+    parser.add_argument('--fit-mode', choices=['compressed', 'full'], default='compressed')
+    parser.add_argument('--stream', action='store_true',
+                        help="reduce the data chunk by chunk instead of loading it")
+    parser.add_argument('--chunk-size', type=int, default=streaming.DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--incremental-dir', default=None,
+                        help="keep reduced tables here and read only new rows")
+    parser.add_argument('--new-data', nargs='+', default=[],
+                        help="more CSVs to add to the incremental state")
+    parser.add_argument('--render', choices=['aggregated', 'full'], default='aggregated')
+    parser.add_argument('--boot', dest='n_boot', type=int, default=10000,
+                        help="cluster bootstrap replicates (0 skips)")
+    parser.add_argument('--perm', dest='n_perm', type=int, default=10000,
+                        help="player-level permutations (0 skips)")
+    parser.add_argument('--no-mixed', dest='mixed', action='store_false',
+                        help="skip the crossed random-effects model")
+    parser.add_argument('--sequential', dest='concurrent', action='store_false',
+                        help="run the stages one at a time, in this process")
+    parser.add_argument('--jobs', dest='n_jobs', type=int, default=None,
+                        help="worker processes for resampling (default: all CPUs)")
+    parser.add_argument('--model-cache', default=modelstore.DEFAULT_MODEL_DIR,
+                        help="directory of stored model fits")
+    parser.add_argument('--no-model-cache', dest='model_cache', action='store_const',
+                        const=None, help="always refit")
+    parser.add_argument('--metrics', dest='metrics_path', default='team-30-metrics.jsonl')
+    parser.add_argument('--profile-dir', default=None)
+    parser.add_argument('--no-tracemalloc', dest='trace_memory', action='store_false')
+    return vars(parser.parse_args(argv))
 
 if __name__ == "__main__":
-    main()
+    main(**parse_args())
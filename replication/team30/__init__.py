@@ -0,0 +1,6 @@
+"""
+Helper modules for the Team 30 analysis pipeline (team-30.py).
+
+The pipeline script itself stays a plain script; everything that has to be
+shared between stages, worker processes or benchmarks lives here.
+"""
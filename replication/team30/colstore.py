@@ -0,0 +1,193 @@
+"""
+Cleaned columns in shared memory, for worker processes to read without copies.
+
+A process pool initializer that takes the cleaned DataFrame pickles all of it
+into every worker, so memory and start-up time grow with the worker count.
+SharedColumns instead writes the columns once into a single
+multiprocessing.shared_memory segment: numeric columns as they are, and
+categoricals as their integer codes, with the categories themselves kept in
+the spec. The spec is a small dict and is all that is pickled to a worker;
+attach() maps the segment there and returns a DataFrame whose columns are
+read-only NumPy views of it. Pages are shared by every process, so each
+additional worker costs only its own working memory.
+
+    with SharedColumns(df) as shared:
+        parallel.run_tasks(func, tasks, n_jobs=8, initializer=_init_worker,
+                           initargs=(shared.spec,))
+
+Segments are removed (unlinked) by the process that created them:
+
+* on leaving the ``with`` block or on close(), and at interpreter exit;
+* if that process dies without running either (SIGKILL, a crash), by
+  multiprocessing's resource tracker, which outlives it and unlinks the
+  segments registered with it;
+* failing both, by remove_stale(), which runs whenever a store is created
+  and deletes segments whose creating process no longer exists (their
+  names carry its pid; Linux only, where segments live in /dev/shm).
+"""
+
+import atexit
+import os
+import re
+import secrets
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# The columns the parallel engines read
+DEFAULT_COLUMNS = ['redCards', 'games', 'skinTone', 'rater1', 'rater2', 'meanIAT',
+                   'meanExp', 'playerShort', 'refNum']
+
+PREFIX = 'team30'
+
+# Column offsets within a segment are multiples of this (one cache line)
+ALIGNMENT = 64
+
+SHM_DIR = '/dev/shm'
+
+# Segments attached by this process, kept open while their views are in use
+_ATTACHED = {}
+
+
+def _layout(arrays):
+    """Offsets of ``arrays`` packed into one aligned buffer, and its size."""
+    offsets, size = [], 0
+    for values in arrays:
+        size = -(-size // ALIGNMENT) * ALIGNMENT
+        offsets.append(size)
+        size += values.nbytes
+    return offsets, max(size, 1)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, owned by another user
+        return True
+    return True
+
+
+def remove_stale(directory=SHM_DIR):
+    """Unlink segments left by processes that no longer exist; returns their names."""
+    if not os.path.isdir(directory):
+        return []
+    pattern = re.compile(re.escape(PREFIX) + r'-(\d+)-[0-9a-f]+$')
+    removed = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match and not _pid_alive(int(match.group(1))):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                continue
+            removed.append(name)
+    return removed
+
+
+class SharedColumns:
+    """
+    Columns of ``df`` copied into a new shared memory segment.
+
+    ``columns`` defaults to the DEFAULT_COLUMNS present in ``df``. Numeric
+    and boolean columns are stored as they are, categoricals as codes and
+    object (string) columns as categoricals; other dtypes raise TypeError.
+    ``spec`` is what workers pass to attach().
+    """
+
+    def __init__(self, df, columns=None):
+        if columns is None:
+            columns = [c for c in DEFAULT_COLUMNS if c in df.columns]
+        arrays, entries = [], []
+        for column in columns:
+            s = df[column]
+            if s.dtype == object:
+                s = s.astype('category')
+            entry = {'name': column}
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                values = s.cat.codes.to_numpy()
+                entry['categories'] = s.cat.categories
+                entry['ordered'] = bool(s.cat.ordered)
+            elif pd.api.types.is_numeric_dtype(s.dtype) or pd.api.types.is_bool_dtype(s.dtype):
+                values = s.to_numpy()
+            else:
+                raise TypeError(f"Cannot share column {column!r} of dtype {s.dtype}")
+            entry['dtype'] = values.dtype.str
+            arrays.append(values)
+            entries.append(entry)
+        offsets, size = _layout(arrays)
+
+        remove_stale()
+        self._pid = os.getpid()
+        name = f"{PREFIX}-{self._pid}-{secrets.token_hex(6)}"
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        atexit.register(self.close)
+        for values, entry, offset in zip(arrays, entries, offsets):
+            np.ndarray(values.shape, values.dtype, buffer=self._shm.buf,
+                       offset=offset)[:] = values
+            entry['offset'] = offset
+        self.spec = {'name': self._shm.name, 'nrows': len(df), 'columns': entries}
+        self.nbytes = size
+
+    def close(self):
+        """Release and unlink the segment; safe to call more than once."""
+        if self._shm is None or os.getpid() != self._pid:
+            return
+        atexit.unregister(self.close)
+        try:
+            self._shm.close()
+        except BufferError:
+            # Views into it are still alive in this process; the mapping goes
+            # with them, and unlinking below still frees the segment's name
+            pass
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _open(name):
+    try:
+        # Python 3.13+: only the creating process should track the segment
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Earlier versions register it with the resource tracker on every
+        # open. Pool workers share their parent's tracker, which keeps one
+        # entry per name, so this neither leaks nor unlinks early.
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach(spec):
+    """
+    DataFrame of the columns in ``spec``, as read-only views of the segment.
+
+    The segment stays mapped for the life of this process (or until
+    detach()). Operations that modify columns in place raise ValueError;
+    filtering or assigning new columns works on copies as usual.
+    """
+    shm = _ATTACHED.get(spec['name'])
+    if shm is None:
+        shm = _ATTACHED[spec['name']] = _open(spec['name'])
+    columns = {}
+    for entry in spec['columns']:
+        values = np.ndarray(spec['nrows'], np.dtype(entry['dtype']), buffer=shm.buf,
+                            offset=entry['offset'])
+        values.flags.writeable = False
+        if 'categories' in entry:
+            values = pd.Categorical.from_codes(values, entry['categories'],
+                                               ordered=entry['ordered'])
+        columns[entry['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+def detach(spec):
+    """Unmap a segment attached by this process; its frames must be gone."""
+    shm = _ATTACHED.pop(spec['name'], None)
+    if shm is not None:
+        shm.close()
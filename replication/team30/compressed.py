@@ -0,0 +1,93 @@
+"""
+Frequency-weight ("compressed") fitting of the count models.
+
+The Poisson and Negative Binomial models in statistical_tests depend only on
+(redCards, skinTone, games). Those take few distinct values, so the ~146k
+player-referee dyads collapse to a few hundred patterns. Each pattern is
+fitted once with the number of dyads sharing it as a frequency weight. The
+weighted log-likelihood is the full-data log-likelihood, so coefficients,
+standard errors, p-values and log-likelihoods are the same as for a fit on
+every dyad, and so are the reported number of observations and residual
+degrees of freedom, which count the weights rather than the patterns.
+
+The pattern tables only need pandas; the weighted model classes, which
+subclass statsmodels' models, live in weighted.py so that reading and
+reducing the data does not import statsmodels. They are still available
+here as compressed.WeightedPoisson and compressed.WeightedNegativeBinomial.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def compress_patterns(df, covariates, outcome='redCards'):
+    """
+    Collapse ``df`` to its unique (outcome, covariates) rows.
+
+    Returns a frame with the outcome, the covariates and a ``count`` column
+    holding the number of rows of ``df`` that share each pattern. Rows with a
+    missing value in any of these columns are dropped.
+    """
+    keys = [outcome] + list(covariates)
+    table = (df.groupby(keys, observed=True, sort=True)
+               .size()
+               .rename('count')
+               .reset_index())
+    return table[table['count'] > 0].reset_index(drop=True)
+
+
+def merge_patterns(tables):
+    """
+    Combine compress_patterns tables of disjoint parts of the data.
+
+    The result equals compress_patterns of the parts concatenated.
+    """
+    table = pd.concat(tables, ignore_index=True)
+    keys = [c for c in table.columns if c != 'count']
+    return table.groupby(keys, sort=True)['count'].sum().reset_index()
+
+
+def compress_arrays(y, X):
+    """
+    Array version of compress_patterns for an already built design matrix.
+
+    Returns ``(y, X, counts)`` restricted to the unique rows of ``[y, X]``.
+    """
+    stacked = np.column_stack([y, X])
+    # Sort rows lexicographically and cut at changes; this is the result of
+    # np.unique(axis=0, return_counts=True) at a fraction of its cost.
+    order = np.lexsort(stacked.T[::-1])
+    stacked = stacked[order]
+    starts = np.flatnonzero(np.r_[True, np.any(stacked[1:] != stacked[:-1], axis=1)])
+    counts = np.diff(np.r_[starts, len(stacked)])
+    unique = stacked[starts]
+    return unique[:, 0], unique[:, 1:], counts
+
+
+def nb_alpha_start(y, mu, freq_weights, k):
+    """Moment estimate of the NB2 alpha at means ``mu``, floored at 0.05."""
+    resid = y - mu
+    df_resid = freq_weights.sum() - k
+    alpha = np.sum(freq_weights * (resid ** 2 / mu - 1) / mu) / df_resid
+    return max(0.05, alpha)
+
+
+def nb_start_params(poisson_result):
+    """
+    NB2 start values from a (weighted) Poisson fit.
+
+    Mirrors NegativeBinomial.fit's own default: the Poisson coefficients plus
+    a moment estimate of alpha, floored at 0.05.
+    """
+    model = poisson_result.model
+    w = getattr(model, 'freq_weights', np.ones(len(model.endog)))
+    alpha = nb_alpha_start(model.endog, poisson_result.predict(), w,
+                           len(poisson_result.params))
+    return np.append(np.asarray(poisson_result.params), alpha)
+
+
+def __getattr__(name):
+    if name in ('WeightedPoisson', 'WeightedNegativeBinomial'):
+        from team30 import weighted
+        return getattr(weighted, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,228 @@
+"""
+Loading, cleaning and on-disk caching of the crowdstorming dataset.
+
+The first load of a CSV parses it, derives the skin tone columns and writes a
+typed columnar copy (Parquet when pyarrow is available, otherwise a NumPy
+.npz archive). Later loads read only the requested columns from that copy.
+The cache key combines a hash of the source file with the cleaning
+parameters, so editing either one rebuilds the cache.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Bump when the layout or the cleaning code changes in a way the parameters
+# below do not capture.
+CACHE_VERSION = 2
+
+CLEANING_PARAMS = {
+    'skin_tone_bins': [0, 0.25, 0.5, 0.75, 1.0],
+    'skin_tone_labels': ['Very Light', 'Light', 'Dark', 'Very Dark'],
+    'dark_threshold': 0.5,
+}
+
+# Identifier columns stored as categoricals; every other text column is
+# stored as a categorical as well.
+CATEGORICAL_COLUMNS = ['playerShort', 'refNum', 'refCountry', 'Alpha_3',
+                       'leagueCountry', 'club', 'position']
+
+DERIVED_COLUMNS = ['skinTone', 'skinToneCategory', 'darkSkin']
+
+INT32 = np.iinfo(np.int32)
+
+DEFAULT_CACHE_DIR = os.environ.get('TEAM30_CACHE_DIR', '.team30-cache')
+
+
+def clean(df, params=CLEANING_PARAMS):
+    """Derive skinTone, skinToneCategory and darkSkin; drop unrated rows."""
+    # Create average skin tone rating
+    df['skinTone'] = df[['rater1', 'rater2']].mean(axis=1)
+
+    # Derived columns are added before the rows are dropped so they are set on
+    # the original frame rather than on a filtered copy.
+    df['skinToneCategory'] = pd.cut(df['skinTone'],
+                                    bins=params['skin_tone_bins'],
+                                    labels=params['skin_tone_labels'],
+                                    include_lowest=True)
+
+    # Binary classification: light (<= threshold) vs dark (> threshold)
+    df['darkSkin'] = (df['skinTone'] > params['dark_threshold']).astype(int)
+
+    # Remove rows with missing skin tone ratings
+    return df.dropna(subset=['skinTone'])
+
+
+def file_hash(filepath, chunk_size=1 << 20):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(filepath, params=CLEANING_PARAMS):
+    """Key identifying a cleaned copy of ``filepath`` under ``params``."""
+    digest = hashlib.sha256()
+    digest.update(file_hash(filepath).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(str(CACHE_VERSION).encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_format():
+    """'parquet' when pyarrow is installed, 'npz' otherwise."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'npz'
+    return 'parquet'
+
+
+def to_columnar(df):
+    """Convert a cleaned frame to the compact dtypes stored in the cache."""
+    out = {}
+    for col in df.columns:
+        s = df[col].reset_index(drop=True)
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            out[col] = s
+        elif col in CATEGORICAL_COLUMNS or s.dtype == object:
+            out[col] = s.astype('category')
+        elif pd.api.types.is_integer_dtype(s.dtype):
+            # Counts are used directly in arithmetic (log exposure, sums), so
+            # nothing narrower than int32: int8 games would give float16 logs
+            # and overflow when added up.
+            if s.empty or (s.min() >= INT32.min and s.max() <= INT32.max):
+                s = s.astype(np.int32)
+            out[col] = s
+        else:
+            out[col] = s
+    return pd.DataFrame(out)
+
+
+def _cache_paths(filepath, key, cache_dir, fmt):
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    base = os.path.join(cache_dir, f"{stem}-{key}")
+    return base + '.' + fmt, base + '.json'
+
+
+def _remove_stale(filepath, cache_dir, keep):
+    """Delete cached copies of ``filepath`` built under other keys."""
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    pattern = re.compile(re.escape(stem) + r'-[0-9a-f]{16}\.(parquet|npz|json)$')
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if pattern.match(name) and path not in keep:
+            os.remove(path)
+
+
+def _write_npz(df, path):
+    arrays = {}
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            categories = np.asarray(s.cat.categories)
+            if categories.dtype == object:
+                categories = categories.astype(str)
+            arrays[col] = s.cat.codes.to_numpy()
+            arrays[col + '.categories'] = categories
+        else:
+            arrays[col] = s.to_numpy()
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def _read_npz(path, columns, meta):
+    out = {}
+    with np.load(path) as archive:
+        for col in columns:
+            if col in meta['categorical']:
+                out[col] = pd.Categorical.from_codes(
+                    archive[col], archive[col + '.categories'],
+                    ordered=meta['categorical'][col])
+            else:
+                out[col] = archive[col]
+    return pd.DataFrame(out)
+
+
+def write_cache(df, path, meta_path, meta):
+    """Write a cleaned frame and its metadata; both files appear atomically."""
+    tmp = path + '.tmp'
+    if meta['format'] == 'parquet':
+        df.to_parquet(tmp, index=False)
+    else:
+        _write_npz(df, tmp)
+    os.replace(tmp, path)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def read_cache(path, meta, columns=None):
+    """Read ``columns`` (default: all) from a cache file written above."""
+    columns = list(meta['columns']) if columns is None else list(columns)
+    missing = [c for c in columns if c not in meta['columns']]
+    if missing:
+        raise KeyError(f"Columns not in cache: {missing}")
+    if meta['format'] == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+        # pyarrow gives back integer categoricals (refNum, ...) as integers
+        for col in columns:
+            if (col in meta['categorical']
+                    and not isinstance(df[col].dtype, pd.CategoricalDtype)):
+                df[col] = df[col].astype(pd.CategoricalDtype(
+                    ordered=meta['categorical'][col]))
+        return df
+    return _read_npz(path, columns, meta)
+
+
+def load_cleaned(filepath, columns=None, cache_dir=DEFAULT_CACHE_DIR,
+                 params=CLEANING_PARAMS):
+    """
+    Return ``(df, meta)`` for the cleaned dataset.
+
+    ``meta`` records the shape before and after cleaning, where the data came
+    from (``'cache'`` or ``'csv'``) and the cache file path. Pass
+    ``cache_dir=None`` to bypass the cache entirely.
+    """
+    if cache_dir is None:
+        raw = pd.read_csv(filepath)
+        initial_shape = list(raw.shape)
+        df = clean(raw, params)
+        meta = {'initial_shape': initial_shape, 'clean_shape': list(df.shape),
+                'source': 'csv', 'path': None}
+        return (df if columns is None else df[list(columns)]), meta
+
+    fmt = cache_format()
+    key = cache_key(filepath, params)
+    path, meta_path = _cache_paths(filepath, key, cache_dir, fmt)
+
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta.update(source='cache', path=path)
+        return read_cache(path, meta, columns), meta
+
+    raw = pd.read_csv(filepath)
+    initial_shape = list(raw.shape)
+    df = to_columnar(clean(raw, params))
+    meta = {
+        'key': key,
+        'format': fmt,
+        'params': params,
+        'initial_shape': initial_shape,
+        'clean_shape': list(df.shape),
+        'columns': list(df.columns),
+        'categorical': {c: bool(df[c].cat.ordered) for c in df.columns
+                        if isinstance(df[c].dtype, pd.CategoricalDtype)},
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    write_cache(df, path, meta_path, meta)
+    _remove_stale(filepath, cache_dir, keep={path, meta_path})
+    meta.update(source='csv', path=path)
+    return (df if columns is None else df[list(columns)]), meta
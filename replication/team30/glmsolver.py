@@ -0,0 +1,508 @@
+"""
+Batched Newton solver for the count models: Poisson, NB2 and zero-inflated Poisson.
+
+statsmodels' discrete models are general-purpose: every fit builds a model
+object, checks its data, runs a generic optimizer through numerically
+wrapped callbacks and computes a full results object. For the models of
+this pipeline, refitted many times with different outcomes or weights
+(bootstrap replicates, permutations, the multiverse), that overhead is most
+of the cost. This module fits them directly:
+
+    fit = glmsolver.fit('negbin', y, X, exposure=games, weights=counts)
+    fit.params, fit.bse, fit.pvalues, fit.llf, fit.summary_frame()
+
+* ``family`` is 'poisson', 'negbin' (NB2, with dispersion ``alpha``) or
+  'zip' (zero-inflated Poisson with a logit inflation model on
+  ``exog_infl``, a constant by default);
+* ``offset`` is added to the linear predictor and ``exposure`` multiplies
+  the mean (``log(exposure)`` is an offset); rows with zero exposure carry
+  no information and are ignored;
+* ``weights`` are frequency weights: row i stands for ``weights[i]``
+  identical rows, so compressed pattern tables give the full-data fit.
+
+``y``, ``weights``, ``offset`` and ``exposure`` may be (batch x n) arrays
+instead of vectors, and 1-D ones are shared by the whole batch; each row of
+the batch is then a separate fit, all solved together by the same array
+operations. Parameters come back as (batch x k) arrays.
+
+The solver is Newton's method on the log-likelihood with analytic
+gradients and Hessians (in log(alpha) for NB2). Where the Hessian is not
+negative definite it is shifted until it is, and a step that lowers the
+log-likelihood is halved. A fit has converged when no parameter (alpha
+itself for NB2, and only while alpha is clearly above zero) moves by more
+than ``tol`` in a full step. Computation stays
+in the dtype of ``X`` (float32 or float64); the default ``tol`` depends on
+it.
+
+Parameter order and names follow statsmodels' Poisson, NegativeBinomial
+and ZeroInflatedPoisson, whose estimates these match to the tolerance.
+Standard errors come from the exact Hessian; for ZeroInflatedPoisson they
+can differ in the third digit from statsmodels', whose analytic ZIP Hessian
+is approximate.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.special import digamma, expit, gammaln, ndtr, polygamma
+
+FAMILIES = ('poisson', 'negbin', 'zip')
+
+# Default convergence tolerance on the Newton step, by dtype
+TOLERANCE = {np.dtype(np.float32): 1e-4, np.dtype(np.float64): 1e-10}
+
+# Step halvings tried before a step is taken anyway
+MAX_HALVINGS = 30
+
+# Largest count for which NB2's gamma function terms are summed directly
+MAX_COUNT_TABLE = 1000
+
+# Arrays of the fit data with one row per fit (or one shared row)
+_BATCH_KEYS = ('y', 'w', 'off', 'wy', 'wyX', 'counts')
+
+
+class GLMFit:
+    """
+    Estimates of one fit, or of a batch of fits along the first axis.
+
+    ``params``, ``bse`` and ``cov`` are in statsmodels' parameter order
+    (``names``); ``cov`` is the inverse of the negative Hessian at the
+    estimates. ``llf`` includes all constants, ``nobs`` is the weighted
+    number of observations, and ``iterations`` counts Newton steps.
+    """
+
+    def __init__(self, family, names, params, cov, llf, converged, iterations, nobs):
+        self.family = family
+        self.names = names
+        self.params = params
+        self.cov = cov
+        self.llf = llf
+        self.converged = converged
+        self.iterations = iterations
+        self.nobs = nobs
+
+    @property
+    def bse(self):
+        return np.sqrt(np.diagonal(self.cov, axis1=-2, axis2=-1))
+
+    @property
+    def zvalues(self):
+        return self.params / self.bse
+
+    @property
+    def pvalues(self):
+        return 2 * ndtr(-np.abs(self.zvalues))
+
+    def summary_frame(self):
+        """Coefficient table of a single fit, with statsmodels' column names."""
+        if self.params.ndim != 1:
+            raise ValueError("summary_frame needs a single fit, not a batch")
+        return pd.DataFrame({'Coef.': self.params, 'Std.Err.': self.bse,
+                             'z': self.zvalues, 'P>|z|': self.pvalues},
+                            index=self.names)
+
+    def __repr__(self):
+        batch = '' if self.params.ndim == 1 else f", batch={self.params.shape[0]}"
+        return f"GLMFit({self.family!r}, k={len(self.names)}{batch})"
+
+
+def _xtdx(c, A, B=None):
+    """``A.T @ diag(c[b]) @ B`` for every row b of ``c``."""
+    B = A if B is None else B
+    if len(c) == 1:
+        return ((A.T * c) @ B)[None]
+    # One matrix product with the per-observation products of the columns
+    pairs = (A[:, :, None] * B[:, None, :]).reshape(len(A), -1)
+    return (c @ pairs).reshape(len(c), A.shape[1], B.shape[1])
+
+
+def _rows(a, index):
+    """Rows ``index`` of a batch array; shared (1 x n) arrays are kept."""
+    return a if a is None or a.shape[0] == 1 else a[index]
+
+
+def _select(data, index):
+    return {key: _rows(value, index) if key in _BATCH_KEYS else value
+            for key, value in data.items()}
+
+
+def _linear(theta, X, off):
+    eta = theta @ X.T
+    if off is not None:
+        eta += off
+    return eta
+
+
+# Log-likelihood (without the constant -log(y!)), gradient and Hessian of
+# each family, one row per fit. ``data`` holds the design ``X`` (and ``Z``),
+# the outcomes ``y``, weights ``w``, offsets ``off`` and the constants
+# ``wy = w * y`` and ``wyX = wy @ X``.
+
+def _poisson(theta, data, derivatives=True):
+    X, w = data['X'], data['w']
+    eta = _linear(theta, X, data['off'])
+    wmu = w * np.exp(eta)
+    ll = np.einsum('bn,bn->b', np.broadcast_to(data['wy'], eta.shape), eta) - wmu.sum(axis=1)
+    if not derivatives:
+        return ll
+    return ll, data['wyX'] - wmu @ X, -_xtdx(wmu, X)
+
+
+def _gamma_terms(a1, data, derivatives):
+    """
+    ``gammaln(y + a1) - gammaln(a1)`` and the same differences of digamma and
+    trigamma, for every fit's ``a1`` (one per row).
+
+    For counts up to MAX_COUNT_TABLE these are the sums over j < y of
+    ``log(a1 + j)``, ``1 / (a1 + j)`` and ``-1 / (a1 + j)**2``, read from
+    cumulative tables; that is exact and much cheaper than the special
+    functions on every observation.
+    """
+    y = data['y']
+    counts = data.get('counts')
+    if counts is None:
+        if not derivatives:
+            return gammaln(y + a1) - gammaln(a1)
+        return (gammaln(y + a1) - gammaln(a1), digamma(y + a1) - digamma(a1),
+                polygamma(1, y + a1) - polygamma(1, a1))
+    terms = a1 + np.arange(data['max_count'], dtype=a1.dtype)
+    index = np.broadcast_to(counts, y.shape)
+
+    def summed(values):
+        table = np.zeros((len(a1), values.shape[1] + 1), dtype=values.dtype)
+        np.cumsum(values, axis=1, out=table[:, 1:])
+        return np.take_along_axis(table, index, axis=1)
+
+    if not derivatives:
+        return summed(np.log(terms))
+    return summed(np.log(terms)), summed(1 / terms), -summed(terms ** -2)
+
+
+def _negbin(theta, data, derivatives=True, log_alpha=True):
+    X, y, w = data['X'], data['y'], data['w']
+    k = X.shape[1]
+    eta = _linear(theta[:, :k], X, data['off'])
+    mu = np.exp(eta)
+    alpha = np.exp(theta[:, k:]) if log_alpha else theta[:, k:]
+    a1 = 1 / alpha
+    log1p_amu = np.log1p(alpha * mu)
+    gamma_terms = _gamma_terms(a1, data, derivatives)
+    lgamma = gamma_terms[0] if derivatives else gamma_terms
+    ll = (w * (lgamma - (a1 + y) * log1p_amu)
+          + data['wy'] * (np.log(alpha) + eta)).sum(axis=1)
+    if not derivatives:
+        return ll
+    _, dgamma, tgamma = gamma_terms
+
+    # The terms of statsmodels' NegativeBinomial score and Hessian (nb2),
+    # summed with weights
+    resid = y - mu
+    denom = mu + a1
+    da1 = -alpha ** -2
+    dalpha_obs = dgamma - log1p_amu - resid / denom
+    grad_b = (w * a1 * resid / denom) @ X
+    grad_a = da1[:, 0] * (w * dalpha_obs).sum(axis=1)
+
+    hess = np.empty(theta.shape + (theta.shape[1],), dtype=theta.dtype)
+    hess[:, :k, :k] = -_xtdx(w * a1 * mu * (a1 + y) / denom ** 2, X)
+    hess_ba = -(w * mu * resid * a1 ** 2 / denom ** 2) @ X
+    dada = (2 * alpha ** -3 * dalpha_obs
+            + da1 ** 2 * (tgamma + 1 / a1 - 1 / denom + resid / denom ** 2))
+    hess_aa = (w * dada).sum(axis=1)
+    if log_alpha:
+        # Chain rule for the log(alpha) parametrization
+        a = alpha[:, 0]
+        hess_aa = a ** 2 * hess_aa + a * grad_a
+        hess_ba = a[:, None] * hess_ba
+        grad_a = a * grad_a
+    hess[:, k, :k] = hess_ba
+    hess[:, :k, k] = hess_ba
+    hess[:, k, k] = hess_aa
+    return ll, np.column_stack([grad_b, grad_a]), hess
+
+
+def _zip(theta, data, derivatives=True):
+    X, Z, y, w = data['X'], data['Z'], data['y'], data['w']
+    m = Z.shape[1]
+    s = theta[:, :m] @ Z.T
+    eta = _linear(theta[:, m:], X, data['off'])
+    mu = np.exp(eta)
+    zero = y == 0
+    # log(1 - pi) and, for zeros, log(pi + (1 - pi) exp(-mu)), without overflow
+    log1m_pi = -np.logaddexp(0, s)
+    ll = (w * (log1m_pi + np.where(zero, np.logaddexp(s, -mu), y * eta - mu))).sum(axis=1)
+    if not derivatives:
+        return ll
+
+    pi = expit(s)
+    q = np.exp(-mu)
+    p0 = pi + (1 - pi) * q
+    # Derivatives of a zero's log-likelihood in the inflation (s) and count
+    # (eta) linear predictors
+    u = pi * (1 - pi) * (1 - q) / p0
+    v = -(1 - pi) * mu * q / p0
+    d_s = np.where(zero, u, -pi)
+    d_eta = np.where(zero, v, y - mu)
+    d_ss = np.where(zero, u * (1 - 2 * pi) - u ** 2, -pi * (1 - pi))
+    d_ee = np.where(zero, v * (1 - mu) - v ** 2, -mu)
+    d_se = np.where(zero, pi * (1 - pi) * mu * q / p0 - u * v, 0)
+
+    grad = np.column_stack([(w * d_s) @ Z, (w * d_eta) @ X])
+    hess = np.empty(theta.shape + (theta.shape[1],), dtype=theta.dtype)
+    hess[:, :m, :m] = _xtdx(w * d_ss, Z)
+    hess[:, m:, m:] = _xtdx(w * d_ee, X)
+    cross = _xtdx(w * d_se, Z, X)
+    hess[:, :m, m:] = cross
+    hess[:, m:, :m] = cross.transpose(0, 2, 1)
+    return ll, grad, hess
+
+
+_PARTS = {'poisson': _poisson, 'negbin': _negbin, 'zip': _zip}
+
+
+def solve(hess, grad):
+    """Solve ``hess @ step = grad`` per batch row; singular rows give NaN."""
+    try:
+        return np.linalg.solve(hess, grad[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return np.stack([_safe_solve(h, g) for h, g in zip(hess, grad)])
+
+
+def _safe_solve(hess, grad):
+    try:
+        return np.linalg.solve(hess, grad)
+    except np.linalg.LinAlgError:
+        return np.full_like(grad, np.nan)
+
+
+def _inv(hess):
+    """Inverse per batch row; singular rows give NaN."""
+    try:
+        return np.linalg.inv(hess)
+    except np.linalg.LinAlgError:
+        eye = np.eye(hess.shape[-1], dtype=hess.dtype)
+        return np.stack([_safe_solve(h, eye) for h in hess])
+
+
+def _ascent_step(hess, grad):
+    """Newton step, with the Hessian shifted where it is not negative definite."""
+    info = -hess
+    step = solve(info, grad)
+    finite = np.isfinite(info).all(axis=(1, 2))
+    lowest = np.zeros(len(info), dtype=info.dtype)
+    if finite.any():
+        lowest[finite] = np.linalg.eigvalsh(info[finite])[:, 0]
+    indefinite = lowest < 0
+    if indefinite.any():
+        # Shifted so that its smallest eigenvalue is |lowest|
+        eye = np.eye(info.shape[-1], dtype=info.dtype)
+        shifted = info[indefinite] - 2 * lowest[indefinite, None, None] * eye
+        step[indefinite] = solve(shifted, grad[indefinite])
+    return step
+
+
+def newton(parts, theta, data, tol, max_iter, scale=None):
+    """
+    Maximize ``parts``' log-likelihood from ``theta``, one row per fit.
+
+    ``parts(theta, data)`` returns the log-likelihood, gradient and Hessian
+    of every row, and only the log-likelihood with ``derivatives=False``.
+    ``scale(theta)``, if given, converts steps to the scale ``tol`` applies
+    to. Returns ``(theta, converged, iterations, ll, hess)`` with the
+    log-likelihood and Hessian at ``theta``; fits that reach a non-finite
+    value stop, come back as NaN and are not converged.
+    """
+    theta = theta.copy()
+    n = theta.shape[0]
+    converged = np.zeros(n, dtype=bool)
+    failed = np.zeros(n, dtype=bool)
+    iterations = np.zeros(n, dtype=int)
+    eps = np.finfo(theta.dtype).eps
+    ll, grad, hess = parts(theta, data)
+    for _ in range(max_iter):
+        active = np.flatnonzero(~(converged | failed))
+        if not len(active):
+            break
+        sub = data if len(active) == n else _select(data, active)
+        current = theta[active]
+        step = _ascent_step(hess[active], grad[active])
+        full = np.abs(step if scale is None else step * scale(current))
+
+        new = current + step
+        ll_new, grad_new, hess_new = parts(new, sub)
+        ll_old = ll[active]
+        slack = np.sqrt(eps) * (1 + np.abs(ll_old))
+        worse = np.flatnonzero(~(ll_new >= ll_old - slack))
+        if len(worse):
+            rows = worse
+            for _ in range(MAX_HALVINGS):
+                step[rows] /= 2
+                new[rows] = current[rows] + step[rows]
+                ll_rows = parts(new[rows], _select(sub, rows), derivatives=False)
+                rows = rows[~(ll_rows >= ll_old[rows] - slack[rows])]
+                if not len(rows):
+                    break
+            ll_new[worse], grad_new[worse], hess_new[worse] = parts(new[worse],
+                                                                   _select(sub, worse))
+
+        theta[active], ll[active], grad[active], hess[active] = new, ll_new, grad_new, hess_new
+        iterations[active] += 1
+        finite = np.isfinite(new).all(axis=1) & np.isfinite(full).all(axis=1)
+        failed[active[~finite]] = True
+        converged[active[finite & (full <= tol).all(axis=1)]] = True
+    theta[failed | ~np.isfinite(theta).all(axis=1)] = np.nan
+    return theta, converged, iterations, ll, hess
+
+
+def _batch(value, n, dtype, name):
+    """``value`` as a (rows x n) array of ``dtype``; vectors become one shared row."""
+    a = np.asarray(value, dtype=dtype)
+    if a.ndim == 0:
+        a = np.full(n, a, dtype=dtype)
+    if a.ndim == 1:
+        a = a[None, :]
+    elif a.shape == (n, 1):
+        # A column, as patsy returns the outcome
+        a = a.T
+    if a.ndim != 2 or a.shape[1] != n:
+        raise ValueError(f"{name} must have {n} values per row, got shape {a.shape}")
+    return a
+
+
+def _names(X, prefix=''):
+    columns = getattr(X, 'columns', None)
+    if columns is not None:
+        return [prefix + str(c) for c in columns]
+    if prefix and X.shape[1] == 1:
+        return [prefix + 'const']
+    return [f'{prefix}x{i}' for i in range(X.shape[1])]
+
+
+def _poisson_start(data):
+    """One IRLS step from ``mu = (y + mean(y)) / 2``, as statsmodels' GLM starts."""
+    X, y, w, off = data['X'], data['y'], data['w'], data['off']
+    ybar = data['wy'].sum(axis=1, keepdims=True) / w.sum(axis=1, keepdims=True)
+    mu = (y + ybar) / 2
+    z = np.log(mu) if off is None else np.log(mu) - off
+    weight = w * mu
+    return solve(_xtdx(weight, X), (weight * z) @ X)
+
+
+def _data(y, X, offset, exposure, weights, dtype, count_table=False):
+    """The batch arrays of fit(), and the weighted number of observations."""
+    n = X.shape[0]
+    y = _batch(y, n, dtype, 'y')
+    w = _batch(1 if weights is None else weights, n, dtype, 'weights')
+    off = None
+    if offset is not None:
+        off = _batch(offset, n, dtype, 'offset')
+    if exposure is not None:
+        with np.errstate(divide='ignore'):
+            log_exposure = np.log(_batch(exposure, n, dtype, 'exposure'))
+        off = log_exposure if off is None else off + log_exposure
+    batched = max(a.shape[0] for a in (y, w, off) if a is not None)
+    for name, a in (('y', y), ('weights', w), ('offset/exposure', off)):
+        if a is not None and a.shape[0] not in (1, batched):
+            raise ValueError(f"{name} has {a.shape[0]} rows, expected 1 or {batched}")
+    if off is not None and not np.isfinite(off).all():
+        empty = np.isneginf(off)
+        if (empty & (y > 0) & (w > 0)).any():
+            raise ValueError("y > 0 where the exposure is zero")
+        if not (empty | np.isfinite(off)).all():
+            raise ValueError("offset and exposure must be finite and exposure >= 0")
+        w = np.where(empty, 0, w).astype(dtype)
+        off = np.where(empty, 0, off).astype(dtype)
+    nobs = np.broadcast_to(w.sum(axis=1), (batched,))
+    data = {'X': X, 'y': np.broadcast_to(y, (batched, n)), 'w': w, 'off': off}
+    data['wy'] = w * data['y']
+    data['wyX'] = data['wy'] @ X
+    if count_table and y.min(initial=0) >= 0 and y.max(initial=0) <= MAX_COUNT_TABLE \
+            and (y == np.round(y)).all():
+        data['counts'] = y.astype(np.intp)
+        data['max_count'] = int(y.max(initial=0))
+    return data, nobs
+
+
+def fit(family, y, X, offset=None, exposure=None, weights=None, exog_infl=None,
+        start=None, tol=None, max_iter=100, dtype=None):
+    """
+    Fit ``family`` to ``y`` on the design ``X`` (with its constant column).
+
+    Returns a GLMFit; see the module docstring for the arguments. ``start``
+    gives starting parameters, one vector or one row per fit; otherwise
+    they come from a Poisson fit (with a moment estimate of alpha for NB2,
+    as NegativeBinomial.fit, and the share of excess zeros for ZIP).
+    """
+    if family not in FAMILIES:
+        raise ValueError(f"family must be one of {FAMILIES}, got {family!r}")
+    # Vectors throughout give a single fit rather than a batch of one
+    single = all(np.ndim(v) < 2 or np.shape(v)[1] == 1
+                 for v in (y, weights, offset, exposure))
+    names = _names(X)
+    X = np.asarray(X)
+    if dtype is None:
+        dtype = X.dtype if X.dtype in (np.float32, np.float64) else np.float64
+    dtype = np.dtype(dtype)
+    X = np.ascontiguousarray(X, dtype=dtype)
+    tol = TOLERANCE[dtype] if tol is None else tol
+    data, nobs = _data(y, X, offset, exposure, weights, dtype,
+                       count_table=family == 'negbin')
+    y, w, off = data['y'], data['w'], data['off']
+    n_fits, n = y.shape
+
+    scale = None
+    if family == 'zip':
+        Z = np.ones((n, 1)) if exog_infl is None else exog_infl
+        names = _names(Z, 'inflate_') + names
+        data['Z'] = np.ascontiguousarray(Z, dtype=dtype)
+    elif family == 'negbin':
+        names = names + ['alpha']
+        k = X.shape[1]
+
+        # Below this alpha is zero to working precision (the fit is the
+        # Poisson one), and the terms of its Hessian cancel to rounding error
+        floor = np.finfo(dtype).eps ** (1 / 3)
+
+        def scale(theta):
+            # Steps in alpha rather than log(alpha); none once alpha is below the floor
+            alpha = np.exp(theta[:, k:])
+            return np.column_stack([np.ones((len(theta), k), dtype=dtype),
+                                    np.where(alpha < floor, 0, alpha)])
+
+    if start is not None:
+        theta = np.array(np.broadcast_to(np.asarray(start, dtype=dtype),
+                                         (n_fits, len(names))))
+        if family == 'negbin':
+            theta[:, -1] = np.log(theta[:, -1])
+    else:
+        theta = _poisson_start(data)
+        if family != 'poisson':
+            theta = newton(_poisson, theta, data, tol, max_iter)[0]
+            mu = np.exp(_linear(theta, X, off))
+        if family == 'negbin':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                moments = np.where(mu > 0, ((y - mu) ** 2 / mu - 1) / mu, 0)
+            alpha = (w * moments).sum(axis=1) / (w.sum(axis=1) - X.shape[1])
+            theta = np.column_stack([theta, np.log(np.maximum(0.05, alpha))])
+        elif family == 'zip':
+            # Inflation probability: the share of zeros beyond the Poisson fit's
+            total = w.sum(axis=1)
+            observed = (w * (y == 0)).sum(axis=1) / total
+            expected = (w * np.exp(-mu)).sum(axis=1) / total
+            excess = np.clip((observed - expected) / (1 - expected), 0.01, 0.99)
+            logit = np.broadcast_to(np.log(excess / (1 - excess)), (n, n_fits))
+            gamma = np.linalg.lstsq(data['Z'], logit.astype(dtype), rcond=None)[0].T
+            theta = np.column_stack([gamma, theta])
+
+    parts = _PARTS[family]
+    theta, converged, iterations, ll, hess = newton(parts, theta, data, tol, max_iter,
+                                                    scale=scale)
+    if family == 'negbin':
+        # Report alpha, with its covariance from the Hessian in alpha
+        theta[:, -1] = np.exp(theta[:, -1])
+        ll, _, hess = _negbin(theta, data, log_alpha=False)
+    cov = _inv(-hess)
+    llf = ll - (w * gammaln(y + 1)).sum(axis=1)
+    if single:
+        theta, cov, llf, converged, iterations, nobs = (
+            theta[0], cov[0], llf[0], converged[0], iterations[0], nobs[0])
+    return GLMFit(family, names, theta, cov, llf, converged, iterations, nobs)
@@ -0,0 +1,186 @@
+"""
+Index of the cleaned dyads by player, referee and categorical attributes.
+
+Follow-up questions are subgroup cuts: red card rates per referee country,
+league, position or meanIAT quartile, and their intersections. GroupIndex
+is built once from the cleaned data. For every dimension it keeps
+
+* ``codes``: the group of each dyad (-1 where the value is missing);
+* a CSR layout of the groups, ``indptr`` and ``rows``: the dyads of group
+  ``g`` are ``rows[indptr[g]:indptr[g + 1]]``, in increasing order;
+* ``totals``: the dyads, red cards, games and dyads with a red card of
+  every group (one bincount each).
+
+Totals, rates and rate ratios of a selection within one dimension are sums
+of precomputed group totals and never touch the dyads. An intersection
+across dimensions starts from the CSR rows of its smallest part and checks
+the codes of the other dimensions on those rows only, so its cost is the
+size of that part, not of the data. Numeric columns in ``quantiles`` are
+indexed by quantile (levels 1..q, with the cut points in ``edges``).
+
+    index = GroupIndex(df)
+    index.table('refCountry')
+    index.totals({'leagueCountry': 'England', 'position': ['Goalkeeper']})
+    index.compare({'darkSkin': 1, 'meanIAT': 4}, {'darkSkin': 0, 'meanIAT': 4})
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ['playerShort', 'refNum', 'refCountry', 'leagueCountry', 'position',
+              'club', 'skinToneCategory', 'darkSkin']
+
+QUANTILES = {'meanIAT': 4, 'meanExp': 4}
+
+TOTALS = ['n', 'red', 'games', 'any_red']
+
+
+def rates(totals):
+    """Add mean red cards, any-red-card rate and red cards per game to ``totals``."""
+    n, red = totals['n'], totals['red']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return dict(totals, mean=np.divide(red, n), any_rate=np.divide(totals['any_red'], n),
+                    per_game=np.divide(red, totals['games']))
+
+
+class GroupIndex:
+    """
+    Group index of a cleaned frame (see data.clean).
+
+    ``dimensions`` are categorical or discrete columns, indexed by their
+    distinct values; ``quantiles`` maps numeric columns to a number of
+    quantile groups. Columns missing from ``df`` are skipped.
+    """
+
+    def __init__(self, df, dimensions=DIMENSIONS, quantiles=QUANTILES):
+        self.n_rows = len(df)
+        self.red = df['redCards'].to_numpy(dtype=np.int64)
+        self.games = df['games'].to_numpy(dtype=np.int64)
+        self.codes, self.levels, self.indptr, self.rows = {}, {}, {}, {}
+        self.totals_by, self.edges, self._lookup = {}, {}, {}
+
+        columns = {d: df[d] for d in dimensions if d in df.columns}
+        for column, q in quantiles.items():
+            if column in df.columns:
+                groups, self.edges[column] = pd.qcut(df[column], q, labels=False,
+                                                     retbins=True, duplicates='drop')
+                columns[column] = (groups + 1).astype('Int64')
+        for dimension, values in columns.items():
+            self._add(dimension, values)
+
+    def _add(self, dimension, values):
+        codes, levels = pd.factorize(values, sort=True)
+        codes = codes.astype(np.int32)
+        size = len(levels)
+        indexed = codes >= 0
+        counts = np.bincount(codes[indexed], minlength=size)
+        # Stable, so each group's rows stay in increasing order
+        order = np.argsort(codes, kind='stable').astype(np.int32)
+        self.codes[dimension] = codes
+        self.levels[dimension] = levels
+        self.indptr[dimension] = np.concatenate([[0], np.cumsum(counts)])
+        self.rows[dimension] = order[len(codes) - indexed.sum():]
+        self.totals_by[dimension] = np.column_stack([
+            counts,
+            np.bincount(codes[indexed], weights=self.red[indexed], minlength=size),
+            np.bincount(codes[indexed], weights=self.games[indexed], minlength=size),
+            np.bincount(codes[indexed], weights=self.red[indexed] > 0, minlength=size),
+        ]).astype(np.int64)
+        self._lookup[dimension] = {level: i for i, level in enumerate(levels)}
+
+    @property
+    def dimensions(self):
+        return list(self.codes)
+
+    def group_codes(self, dimension, values):
+        """Codes of the groups ``values`` (one level or a list) of ``dimension``."""
+        if dimension not in self._lookup:
+            raise KeyError(f"Not an indexed dimension: {dimension!r}")
+        if np.ndim(values) == 0:
+            values = [values]
+        lookup = self._lookup[dimension]
+        missing = [v for v in values if v not in lookup]
+        if missing:
+            raise KeyError(f"No {dimension} group {missing[0]!r}")
+        return np.unique(np.array([lookup[v] for v in values], dtype=np.int64))
+
+    def group_rows(self, dimension, value):
+        """Row positions of the dyads in one group."""
+        g = self.group_codes(dimension, value)[0]
+        indptr = self.indptr[dimension]
+        return self.rows[dimension][indptr[g]:indptr[g + 1]]
+
+    def _parts(self, selection):
+        parts = [(d, self.group_codes(d, v)) for d, v in selection.items()]
+        sizes = [np.sum(self.totals_by[d][g, 0]) for d, g in parts]
+        return [parts[i] for i in np.argsort(sizes, kind='stable')]
+
+    def select(self, selection):
+        """
+        Row positions (increasing) of the dyads in ``selection``.
+
+        ``selection`` maps dimensions to a level or a list of levels; rows
+        must be in one of the listed groups of every dimension.
+        """
+        if not selection:
+            return np.arange(self.n_rows)
+        (dimension, groups), *others = self._parts(selection)
+        indptr, rows = self.indptr[dimension], self.rows[dimension]
+        selected = np.concatenate([rows[indptr[g]:indptr[g + 1]] for g in groups]
+                                  or [rows[:0]])
+        if len(groups) > 1:
+            selected.sort()
+        for dimension, groups in others:
+            # One extra slot at the end so that code -1 (missing) is never kept
+            keep = np.zeros(len(self.levels[dimension]) + 1, dtype=bool)
+            keep[groups] = True
+            selected = selected[keep[self.codes[dimension][selected]]]
+        return selected
+
+    def totals(self, selection=None):
+        """Dyads, red cards, games and dyads with a red card in ``selection``, with rates."""
+        selection = selection or {}
+        if len(selection) <= 1:
+            # Within one dimension: sums of group totals
+            if selection:
+                (dimension, values), = selection.items()
+                sums = self.totals_by[dimension][self.group_codes(dimension, values)].sum(axis=0)
+            else:
+                sums = [self.n_rows, self.red.sum(), self.games.sum(),
+                        np.count_nonzero(self.red)]
+        else:
+            rows = self.select(selection)
+            red = self.red[rows]
+            sums = [len(rows), red.sum(), self.games[rows].sum(), np.count_nonzero(red)]
+        return rates({k: int(v) for k, v in zip(TOTALS, sums)})
+
+    def compare(self, selection, reference=None):
+        """
+        Rates of ``selection`` against ``reference`` (default: all other dyads).
+
+        Returns both totals and the ratios of the mean red cards and of red
+        cards per game, with a 95% Wald interval for the latter.
+        """
+        group = self.totals(selection)
+        if reference is None:
+            everything = self.totals()
+            reference = rates({k: everything[k] - group[k] for k in TOTALS})
+        else:
+            reference = self.totals(reference)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_ratio = np.divide(group['mean'], reference['mean'])
+            rate_ratio = np.divide(group['per_game'], reference['per_game'])
+            se = np.sqrt(np.divide(1, group['red']) + np.divide(1, reference['red']))
+            q = NormalDist().inv_cdf(0.975)
+            # No red cards on either side: ratio 0 or inf, interval nan
+            low, high = rate_ratio * np.exp(-q * se), rate_ratio * np.exp(q * se)
+        return {'group': group, 'reference': reference, 'mean_ratio': mean_ratio,
+                'rate_ratio': rate_ratio, 'rate_ratio_low': low, 'rate_ratio_high': high}
+
+    def table(self, dimension):
+        """Totals and rates of every group of ``dimension``, one row per level."""
+        totals = pd.DataFrame(self.totals_by[dimension], columns=TOTALS,
+                              index=pd.Index(self.levels[dimension], name=dimension))
+        return pd.DataFrame(rates({c: totals[c] for c in TOTALS}))
@@ -0,0 +1,257 @@
+"""
+Incremental updates of the reduced dataset as new dyads arrive.
+
+Everything the streaming pipeline needs is additive over rows (see
+streaming.py): the summary table behind the descriptive statistics, the
+contingency table and the Mann-Whitney test, the (redCards, skinTone, games)
+pattern counts the count models are fitted on, and the set of players.
+State keeps these tables, a record of every ingested source and the last
+model estimates in one file. ingest() reads only rows it has not seen,
+reduces them chunk by chunk and merges them in, so its cost depends on the
+new rows and the size of the tables, not on the history (a file that was
+appended to is hashed again, which is cheap next to parsing it). The merged
+tables equal those of a scan over all the data, and so do the statistics
+and (to the solver's tolerance) the fits; refits start from the stored
+estimates.
+
+A source counts as seen by its path, size and modification time, or else by
+content hash. A seen file that has grown, with its old bytes unchanged (a
+season appended to the CSV), contributes only the appended rows; any other
+change to an ingested file is an error, since its old rows cannot be taken
+back out.
+"""
+
+import hashlib
+import json
+import os
+import types
+
+import numpy as np
+import pandas as pd
+
+from team30 import compressed, data, streaming
+from team30.summary import Summary, merge_tables, summary_table
+
+STATE_VERSION = 1
+
+DEFAULT_STATE_DIR = os.path.join(data.DEFAULT_CACHE_DIR, 'incremental')
+
+STATE_FILE = 'state.npz'
+
+
+class State:
+    """
+    Reduced tables of every source ingested so far.
+
+    ``table`` is a summary.summary_table, ``patterns`` a compress_patterns
+    table over streaming.MODEL_COVARIATES and ``players`` the sorted player
+    ids. ``sources`` lists what was read from each file and ``estimates``
+    holds the last fitted parameters by model family.
+    """
+
+    def __init__(self, table, patterns, players, sources=(), estimates=None,
+                 params=data.CLEANING_PARAMS):
+        self.table = table
+        self.patterns = patterns
+        self.players = players
+        self.sources = list(sources)
+        self.estimates = dict(estimates or {})
+        self.params = params
+
+    @classmethod
+    def empty(cls, params=data.CLEANING_PARAMS):
+        dtype = pd.CategoricalDtype(params['skin_tone_labels'], ordered=True)
+        table = summary_table(pd.DataFrame({
+            'darkSkin': pd.Series(dtype='int64'),
+            'skinToneCategory': pd.Series(dtype=dtype),
+            'skinTone': pd.Series(dtype=float), 'redCards': pd.Series(dtype='int64'),
+            'games': pd.Series(dtype='int64')}))
+        patterns = pd.DataFrame({'redCards': pd.Series(dtype='int64'),
+                                 'skinTone': pd.Series(dtype=float),
+                                 'games': pd.Series(dtype='int64'),
+                                 'count': pd.Series(dtype='int64')})
+        return cls(table, patterns, np.array([], dtype=str), params=params)
+
+    @property
+    def n(self):
+        return int(self.table['n'].sum())
+
+    def summary(self):
+        return Summary(self.table, len(self.players),
+                       categories=list(self.params['skin_tone_labels']))
+
+    def merge(self, table, patterns, players):
+        """Add the reduced tables of new rows."""
+        self.table = merge_tables([self.table, table])
+        self.patterns = compressed.merge_patterns([self.patterns, patterns])
+        self.players = np.union1d(self.players, np.asarray(players, dtype=str))
+
+    def warm_starts(self):
+        """
+        Stored estimates as ``{family: [result]}``, for the ``warm_from`` of
+        modelstore.fit_cached.
+        """
+        return {family: [types.SimpleNamespace(params=pd.Series(params))]
+                for family, params in self.estimates.items()}
+
+    def record_fits(self, **results):
+        """Keep the parameters of fitted results, by family (poisson=..., negbin=...)."""
+        for family, result in results.items():
+            if result is not None:
+                self.estimates[family] = {str(k): float(v)
+                                          for k, v in result.params.items()}
+
+
+def _pack(arrays, prefix, df):
+    for column in df.columns:
+        s = df[column]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            arrays[f'{prefix}.{column}'] = s.cat.codes.to_numpy()
+            arrays[f'{prefix}.{column}.categories'] = np.asarray(s.cat.categories, dtype=str)
+        else:
+            arrays[f'{prefix}.{column}'] = s.to_numpy()
+
+
+def _unpack(archive, prefix, columns):
+    out = {}
+    for column in columns:
+        values = archive[f'{prefix}.{column}']
+        if f'{prefix}.{column}.categories' in archive.files:
+            values = pd.Categorical.from_codes(
+                values, archive[f'{prefix}.{column}.categories'], ordered=True)
+        out[column] = values
+    return pd.DataFrame(out)
+
+
+def save_state(state, directory=DEFAULT_STATE_DIR):
+    """Write ``state`` to ``directory``; the file is replaced atomically."""
+    os.makedirs(directory, exist_ok=True)
+    meta = {'version': STATE_VERSION, 'params': state.params, 'sources': state.sources,
+            'estimates': state.estimates, 'table': list(state.table.columns),
+            'patterns': list(state.patterns.columns)}
+    arrays = {'meta': np.array(json.dumps(meta)), 'players': state.players}
+    _pack(arrays, 'table', state.table)
+    _pack(arrays, 'patterns', state.patterns)
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(path + '.tmp', path)
+
+
+def load_state(directory=DEFAULT_STATE_DIR, params=data.CLEANING_PARAMS):
+    """
+    The state saved in ``directory``, or an empty one if there is none.
+
+    Raises ValueError if it was built with other cleaning parameters or
+    by another version of this module.
+    """
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        return State.empty(params)
+    with np.load(path) as archive:
+        meta = json.loads(str(archive['meta']))
+        if meta['version'] != STATE_VERSION:
+            raise ValueError(f"{path} has state version {meta['version']}, "
+                             f"expected {STATE_VERSION}; rebuild it")
+        if meta['params'] != json.loads(json.dumps(params)):
+            raise ValueError(f"{path} was built with other cleaning parameters; "
+                             "rebuild it")
+        table = _unpack(archive, 'table', meta['table'])
+        patterns = _unpack(archive, 'patterns', meta['patterns'])
+        players = archive['players']
+    return State(table, patterns, players, meta['sources'], meta['estimates'], params)
+
+
+def _hashes(filepath, nbytes, chunk_size=1 << 20):
+    """SHA-256 of the first ``nbytes`` bytes of a file and of all of it, in one read."""
+    digest, prefix = hashlib.sha256(), None
+    with open(filepath, 'rb') as f:
+        position = 0
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            if prefix is None and position + len(chunk) >= nbytes:
+                cut = nbytes - position
+                digest.update(chunk[:cut])
+                prefix = digest.hexdigest()
+                digest.update(chunk[cut:])
+            else:
+                digest.update(chunk)
+            position += len(chunk)
+    return (digest.hexdigest() if prefix is None else prefix), digest.hexdigest()
+
+
+def new_rows(state, filepath):
+    """
+    ``(offset, sha256)``: the byte offset of the rows of ``filepath`` not yet
+    in ``state``, and the file's hash (None when it was not needed).
+
+    The offset is 0 for a new file, the file size if it has been fully
+    ingested, and the old size of a file that has only been appended to
+    since.
+    """
+    path = os.path.abspath(filepath)
+    stat = os.stat(path)
+    previous = [s for s in state.sources if s['path'] == path]
+    if previous:
+        # The latest record covers the file up to its last known size
+        last = previous[-1]
+        if last['size'] == stat.st_size and last['mtime_ns'] == stat.st_mtime_ns:
+            return stat.st_size, None
+        prefix, digest = _hashes(path, last['size'])
+        if prefix == last['sha256'] and stat.st_size >= last['size']:
+            return last['size'], digest
+        raise ValueError(f"{path} changed since it was ingested; rebuild the state")
+    digest = data.file_hash(path)
+    if any(s['sha256'] == digest for s in state.sources):
+        return stat.st_size, digest
+    return 0, digest
+
+
+def _tail_chunks(filepath, offset, chunk_size, params):
+    """Cleaned chunks of the CSV rows that start at byte ``offset``."""
+    header = pd.read_csv(filepath, nrows=0).columns
+    with open(filepath, 'rb') as f:
+        f.seek(offset)
+        for raw in pd.read_csv(f, header=None, names=header,
+                               usecols=streaming.RAW_COLUMNS, chunksize=chunk_size):
+            yield len(raw), data.clean(raw, params)[streaming.CLEAN_COLUMNS]
+
+
+def ingest(filepaths, directory=DEFAULT_STATE_DIR, chunk_size=streaming.DEFAULT_CHUNK_SIZE,
+           params=data.CLEANING_PARAMS):
+    """
+    Merge the unseen rows of the CSVs ``filepaths`` into the saved state.
+
+    Returns ``(state, added)``, where ``added`` has one record per file that
+    contributed rows (its path, byte range and raw and cleaned row counts).
+    The state is saved after each file.
+    """
+    state = load_state(directory, params)
+    added = []
+    for filepath in filepaths:
+        offset, digest = new_rows(state, filepath)
+        path = os.path.abspath(filepath)
+        stat = os.stat(path)
+        if offset >= stat.st_size:
+            continue
+        if offset == 0:
+            meta = {}
+            chunks = ((None, chunk) for chunk in streaming.iter_chunks(
+                path, meta, chunk_size, cache_dir=None, params=params))
+        else:
+            chunks = _tail_chunks(path, offset, chunk_size, params)
+        n_raw = n_clean = 0
+        for rows, chunk in chunks:
+            n_raw += len(chunk) if rows is None else rows
+            n_clean += len(chunk)
+            state.merge(summary_table(chunk),
+                        compressed.compress_patterns(chunk, streaming.MODEL_COVARIATES),
+                        chunk['playerShort'].dropna().unique())
+        if offset == 0:
+            n_raw = meta['initial_shape'][0]
+        record = {'path': path, 'offset': offset, 'size': stat.st_size,
+                  'mtime_ns': stat.st_mtime_ns, 'sha256': digest,
+                  'rows': n_raw, 'clean_rows': n_clean}
+        state.sources.append(record)
+        save_state(state, directory)
+        added.append(record)
+    return state, added
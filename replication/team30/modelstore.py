@@ -0,0 +1,364 @@
+"""
+Warm-started model fits and a persistent store of fitted results.
+
+fit_cached fits one model family on a design through a ModelStore. The key
+is a fingerprint of the data (outcome, design matrix, column names,
+frequency weights) plus the model specification (family, fit options,
+statsmodels version). On a hit the stored results come back as a
+CachedFit, with no refit. On a miss the model is fitted, its results are
+stored, and the live statsmodels results are returned.
+
+Misses start from previous fits where possible. ``warm_from`` takes fitted
+results of nested or overlapping specifications, and every coefficient whose
+column name they share starts at their estimate. A Negative Binomial fit
+seeded from a Poisson fit also gets a moment estimate of alpha (see
+compressed.nb_alpha_start).
+
+Entries are small .npz files (params, covariance, standard errors, p-values,
+intervals, log-likelihoods and convergence details; no pickles). Reads
+refresh an entry's modification time, and writes evict the least recently
+used entries once the store exceeds ``max_bytes``.
+"""
+
+import hashlib
+import json
+import os
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# statsmodels (and scipy.stats) are imported by the functions that fit or
+# summarize, so that importing this module, e.g. for DEFAULT_MODEL_DIR, or
+# opening a store stays cheap for runs that fit nothing
+from team30 import compressed, data
+
+# Bump when the stored fields or their meaning change
+STORE_VERSION = 2
+
+DEFAULT_MODEL_DIR = os.path.join(data.DEFAULT_CACHE_DIR, 'models')
+
+DEFAULT_MAX_BYTES = 64 * 2 ** 20
+
+def data_fingerprint(y, X, freq_weights=None, names=None):
+    """Hash of a design: outcome, matrix, column names and weights."""
+    digest = hashlib.sha256()
+    for array in (y, X, freq_weights):
+        if array is None:
+            digest.update(b'none')
+            continue
+        array = np.ascontiguousarray(np.asarray(array, dtype=float))
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    digest.update(json.dumps(list(names) if names is not None else None).encode())
+    return digest.hexdigest()
+
+
+def spec_key(fingerprint, family, fit_options):
+    """Store key of a design fingerprint and a model specification."""
+    import statsmodels
+
+    spec = {'family': family, 'options': fit_options, 'version': STORE_VERSION,
+            'statsmodels': statsmodels.__version__}
+    digest = hashlib.sha256(fingerprint.encode())
+    digest.update(json.dumps(spec, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:32]
+
+
+class CachedFit:
+    """
+    Fitted results restored from a ModelStore.
+
+    Offers the parts of the statsmodels results API the pipeline uses:
+    ``params``, ``bse``, ``tvalues``, ``pvalues``, ``conf_int()``,
+    ``cov_params()``, ``llf``, ``llnull``, ``nobs``, ``converged``,
+    ``mle_retvals`` and ``summary()``.
+    """
+
+    cached = True
+
+    def __init__(self, fields):
+        self._fields = fields
+        names = [str(name) for name in fields['names']]
+        self.params = pd.Series(fields['params'], index=names)
+        self.bse = pd.Series(fields['bse'], index=names)
+        self.tvalues = pd.Series(fields['tvalues'], index=names)
+        self.pvalues = pd.Series(fields['pvalues'], index=names)
+        self.family = str(fields['family'])
+        self.model_name = str(fields['model_name'])
+        self.endog_name = str(fields['endog_name'])
+        self.method = str(fields['method'])
+        self.cov_type = str(fields['cov_type'])
+        self.fitted_at = float(fields['fitted_at'])
+        for name in ('llf', 'llnull', 'nobs', 'df_model', 'df_resid'):
+            setattr(self, name, float(fields[name]))
+        self.converged = bool(fields['converged'])
+        self.iterations = int(fields['iterations'])
+        self.mle_retvals = {'converged': self.converged, 'iterations': self.iterations}
+        self.mle_settings = {'optimizer': self.method}
+
+    @property
+    def prsquared(self):
+        return 1 - self.llf / self.llnull
+
+    @property
+    def llr_pvalue(self):
+        from scipy import stats
+
+        return stats.chi2.sf(2 * (self.llf - self.llnull), self.df_model)
+
+    def conf_int(self, alpha=0.05):
+        if alpha != 0.05:
+            raise ValueError("Only the 95% interval is stored")
+        return pd.DataFrame(self._fields['conf_int'], index=self.params.index)
+
+    def cov_params(self):
+        return pd.DataFrame(self._fields['cov'], index=self.params.index,
+                            columns=self.params.index)
+
+    def summary(self):
+        """Coefficient table in statsmodels' layout, marked as restored."""
+        from statsmodels.iolib.summary import Summary, summary_params
+
+        fitted = time.localtime(self.fitted_at)
+        left = [('Dep. Variable:', [self.endog_name]),
+                ('Model:', [self.model_name]),
+                ('Method:', ['MLE']),
+                ('Date:', [time.strftime('%a, %d %b %Y', fitted)]),
+                ('Time:', [time.strftime('%H:%M:%S', fitted)]),
+                ('converged:', [str(self.converged)]),
+                ('Covariance Type:', [self.cov_type])]
+        right = [('No. Observations:', [f'{self.nobs:.0f}']),
+                 ('Df Residuals:', [f'{self.df_resid:.0f}']),
+                 ('Df Model:', [f'{self.df_model:g}']),
+                 ('Pseudo R-squ.:', [f'{self.prsquared:#8.4g}']),
+                 ('Log-Likelihood:', [f'{self.llf:#8.5g}']),
+                 ('LL-Null:', [f'{self.llnull:#8.5g}']),
+                 ('LLR p-value:', [f'{self.llr_pvalue:#6.4g}'])]
+        smry = Summary()
+        smry.add_table_2cols(self, gleft=left, gright=right,
+                             yname=self.endog_name, xname=list(self.params.index),
+                             title=f'{self.model_name} Regression Results (model cache)')
+        smry.tables.append(summary_params(
+            (self, self.params.to_numpy(), self.bse.to_numpy(), self.tvalues.to_numpy(),
+             self.pvalues.to_numpy(), self._fields['conf_int']),
+            yname=self.endog_name, xname=list(self.params.index), use_t=False))
+        return smry
+
+
+def _result_fields(result, family):
+    """Arrays and scalars of a live statsmodels result to store."""
+    retvals = getattr(result, 'mle_retvals', None)
+    if retvals is not None:
+        method = result.mle_settings.get('optimizer')
+        iterations = retvals.get('iterations', -1)
+        converged = retvals.get('converged', True)
+    else:
+        method = getattr(result, 'method', 'IRLS')
+        iterations = (result.fit_history or {}).get('iteration', -1)
+        converged = getattr(result, 'converged', True)
+    return {
+        'names': np.array(result.model.exog_names, dtype=str),
+        'params': np.asarray(result.params, dtype=float),
+        'bse': np.asarray(result.bse, dtype=float),
+        'tvalues': np.asarray(result.tvalues, dtype=float),
+        'pvalues': np.asarray(result.pvalues, dtype=float),
+        'conf_int': np.asarray(result.conf_int(), dtype=float),
+        'cov': np.asarray(result.cov_params(), dtype=float),
+        'llf': result.llf,
+        'llnull': result.llnull,
+        'nobs': result.nobs,
+        'df_model': result.df_model,
+        'df_resid': result.df_resid,
+        'converged': bool(converged),
+        'iterations': -1 if iterations is None else int(iterations),
+        'method': str(method),
+        'cov_type': result.cov_type,
+        'family': family,
+        'model_name': type(result.model).__name__,
+        'endog_name': result.model.endog_names,
+        'fitted_at': time.time(),
+    }
+
+
+class ModelStore:
+    """Directory of fitted results with least-recently-used eviction."""
+
+    def __init__(self, directory=DEFAULT_MODEL_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """The CachedFit stored under ``key``, or None."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                fields = {name: archive[name] for name in archive.files}
+            os.utime(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # Missing, evicted meanwhile by another process, or truncated
+            return None
+        return CachedFit(fields)
+
+    def put(self, key, fields):
+        """Store ``fields`` under ``key`` and evict old entries if needed."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **fields)
+        os.replace(tmp, path)
+        self.evict()
+
+    def entries(self):
+        """``(path, size, mtime)`` of every entry, least recently used first."""
+        if not os.path.isdir(self.directory):
+            return []
+        out = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            out.append((path, stat.st_size, stat.st_mtime))
+        return sorted(out, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Delete least recently used entries until under ``max_bytes``."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            os.remove(path)
+
+
+def _term_key(name):
+    return ':'.join(sorted(str(name).split(':')))
+
+
+def warm_start_params(names, family, warm_from, y=None, X=None, freq_weights=None):
+    """
+    Start values for ``family`` on columns ``names`` from earlier fits.
+
+    Each coefficient takes its estimate from the first result in
+    ``warm_from`` that has a column of the same name, and 0 otherwise.
+    Interactions match in any order, so patsy's ``a:b`` matches ``b:a``. A
+    missing intercept starts at the log of the mean outcome. For 'negbin'
+    alpha comes from an earlier NB fit if there is one, else from the
+    moment estimate at the warm-started means. Returns None when no
+    coefficient could be taken from ``warm_from``.
+    """
+    names = list(names)
+    keys = [_term_key(name) for name in names]
+    start = np.zeros(len(names))
+    found = np.zeros(len(names), dtype=bool)
+    alpha = None
+    for result in warm_from:
+        if result is None:
+            continue
+        params = result.params
+        if not hasattr(params, 'index'):
+            params = pd.Series(params, index=result.model.exog_names)
+        params = pd.Series(np.asarray(params), index=[_term_key(n) for n in params.index])
+        for i, key in enumerate(keys):
+            if not found[i] and key in params.index:
+                start[i] = params[key]
+                found[i] = True
+        if alpha is None and 'alpha' in params.index:
+            alpha = params['alpha']
+    if not found.any():
+        return None
+    if family not in ('poisson', 'negbin'):
+        return start
+
+    y = np.asarray(y, dtype=float).ravel()
+    w = np.ones(len(y)) if freq_weights is None else np.asarray(freq_weights, dtype=float)
+    for i, name in enumerate(names):
+        if name in ('Intercept', 'const') and not found[i]:
+            start[i] = np.log(np.sum(w * y) / w.sum())
+    if family == 'poisson':
+        return start
+    if alpha is None:
+        mu = np.exp(np.asarray(X, dtype=float) @ start)
+        alpha = compressed.nb_alpha_start(y, mu, w, len(start))
+    return np.append(start, alpha)
+
+
+def _model(family, y, X, freq_weights):
+    import statsmodels.api as sm
+
+    from team30 import weighted
+
+    if family == 'poisson':
+        if freq_weights is None:
+            return sm.Poisson(y, X)
+        return weighted.WeightedPoisson(y, X, freq_weights=freq_weights)
+    if family == 'negbin':
+        if freq_weights is None:
+            return sm.NegativeBinomial(y, X)
+        return weighted.WeightedNegativeBinomial(y, X, freq_weights=freq_weights)
+    if family == 'logit':
+        return sm.GLM(y, X, family=sm.families.Binomial(), freq_weights=freq_weights)
+    if family == 'ols':
+        return sm.GLM(y, X, family=sm.families.Gaussian(), freq_weights=freq_weights)
+    raise ValueError(f"Unknown model family: {family!r}")
+
+
+def fit_cached(family, y, X, freq_weights=None, store=None, warm_from=(), names=None,
+               **fit_options):
+    """
+    Fit ``family`` on ``(y, X)``, through ``store`` if one is given.
+
+    ``family`` is 'poisson', 'negbin', 'logit' or 'ols' (the last two as
+    GLMs); without ``freq_weights`` the count models are statsmodels' own
+    Poisson and NegativeBinomial. ``names`` label the
+    columns of an array ``X`` (a DataFrame's columns are used as is).
+    ``fit_options`` go to the model's ``fit``; the count models default to
+    Newton's method. Returns the live statsmodels results after a fit and a
+    CachedFit on a store hit.
+    """
+    if names is not None and not hasattr(X, 'columns'):
+        X = pd.DataFrame(X, columns=list(names))
+    if family in ('poisson', 'negbin'):
+        fit_options = dict({'method': 'newton', 'disp': False}, **fit_options)
+    model = _model(family, y, X, freq_weights)
+    names = list(model.exog_names)
+
+    key = None
+    if store is not None:
+        fingerprint = data_fingerprint(model.endog, model.exog, freq_weights, names)
+        key = spec_key(fingerprint, family, fit_options)
+        cached = store.get(key)
+        if cached is not None:
+            return cached
+
+    if 'start_params' not in fit_options:
+        warm_from = [result for result in warm_from if result is not None]
+        if family == 'negbin' and freq_weights is not None and not warm_from:
+            # NegativeBinomial's default start is an unweighted Poisson fit
+            warm_from = [fit_cached('poisson', y, X, freq_weights, store=store)]
+        start = warm_start_params(names[:model.exog.shape[1]], family, warm_from,
+                                  model.endog, model.exog, freq_weights)
+        if start is not None:
+            fit_options['start_params'] = start
+    result = model.fit(**fit_options)
+
+    if store is not None:
+        store.put(key, _result_fields(result, family))
+    return result
@@ -0,0 +1,303 @@
+"""
+Multiverse specification engine.
+
+A grid names the analytic choices to vary: outcome, covariate set, skin tone
+coding, exclusion filter and model family. Every combination is fitted and
+its skin tone estimate is written to one results table.
+
+Specifications that differ only in model family share a design matrix. The
+engine groups them into one task, builds the patsy design once, compresses
+it to unique rows (see compressed.py) and fits each family on that. Tasks
+run across a process pool, and finished rows are appended to the output CSV
+as they arrive. The pool's workers read the data from shared memory (see
+colstore.py) rather than each receiving a pickled copy of it.
+
+The NB fit of a design warm-starts from the Poisson fit of the same design.
+No start values carry over between designs, so every result is the same
+whichever worker fits it and in whatever order. With
+``--model-cache`` every fit also goes through a modelstore.ModelStore, so a
+rerun only fits the specifications that changed.
+
+    python -m team30.multiverse --data CrowdstormingDataJuly1st.csv --jobs 8 \
+        --model-cache .team30-cache/models
+"""
+
+import argparse
+import contextlib
+import csv
+import itertools
+import re
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from patsy import dmatrices
+
+from team30 import colstore, compressed, data, modelstore, parallel
+
+# Right-hand sides; ``skin`` is the skin tone variable of the specification.
+# The team27_* sets are the three dmatrices formulas of dataset/code/27/27.py.
+COVARIATE_SETS = {
+    'games': 'games',
+    'games_position': 'games + C(position)',
+    'games_league': 'games + C(leagueCountry)',
+    'team27_q1': ('skin*games + skin*goals + skin*yellowCards'
+                  ' + skin*meanIAT + skin*meanExp'),
+    'team27_q2a': ('meanIAT*skin + meanIAT*games + meanIAT*goals'
+                   ' + meanIAT*yellowCards + meanIAT*meanExp'),
+    'team27_q2b': ('meanExp*skin + meanExp*games + meanExp*goals'
+                   ' + meanExp*yellowCards + meanExp*meanIAT'),
+}
+
+OUTCOMES = {
+    'redCards': 'count',
+    'anyRedCard': 'binary',
+}
+
+# Families and the outcome types they accept
+FAMILIES = {
+    'poisson': {'count'},
+    'negbin': {'count'},
+    'logit': {'binary'},
+    'ols': {'count', 'binary'},
+}
+
+DEFAULT_GRID = {
+    'outcome': ['redCards', 'anyRedCard'],
+    'covariates': list(COVARIATE_SETS),
+    'skin_coding': ['mean', 'sum', 'rater1', 'rater2', 'max',
+                    'mean>0.25', 'mean>0.5', 'mean>0.75'],
+    'exclusion': ['none', 'both_raters', 'min_games_2'],
+    'family': ['poisson', 'negbin', 'logit', 'ols'],
+}
+
+RESULT_COLUMNS = ['outcome', 'covariates', 'skin_coding', 'exclusion', 'family',
+                  'n_obs', 'n_patterns', 'estimate', 'std_err', 'p_value',
+                  'ci_low', 'ci_high', 'converged', 'error', 'seconds']
+
+DESIGN_KEYS = ('outcome', 'covariates', 'skin_coding', 'exclusion')
+
+# Set once per worker by _init_worker
+_DATA = None
+_STORE = None
+
+
+def skin_tone(df, coding):
+    """
+    Skin tone variable for ``coding``.
+
+    ``mean`` is the cleaned skinTone (mean of available raters), ``sum`` the
+    rater sum used by team 27, ``rater1``/``rater2``/``max`` single or maximum
+    ratings. A suffix ``>t`` turns any of these into a 0/1 indicator.
+    """
+    base, _, threshold = coding.partition('>')
+    if base == 'mean':
+        values = df['skinTone']
+    elif base == 'sum':
+        values = df['rater1'] + df['rater2']
+    elif base in ('rater1', 'rater2'):
+        values = df[base]
+    elif base == 'max':
+        values = df[['rater1', 'rater2']].max(axis=1)
+    else:
+        raise ValueError(f"Unknown skin tone coding: {coding!r}")
+    if threshold:
+        values = (values > float(threshold)).astype(float).where(values.notna())
+    return values
+
+
+def exclusion_mask(df, name):
+    """Boolean mask of the rows kept by exclusion filter ``name``."""
+    if name == 'none':
+        return np.ones(len(df), dtype=bool)
+    if name == 'both_raters':
+        return (df['rater1'].notna() & df['rater2'].notna()).to_numpy()
+    if name == 'raters_agree':
+        return (df['rater1'] == df['rater2']).to_numpy()
+    match = re.fullmatch(r'min_games_(\d+)', name)
+    if match:
+        return (df['games'] >= int(match.group(1))).to_numpy()
+    raise ValueError(f"Unknown exclusion filter: {name!r}")
+
+
+def formula(outcome, covariates):
+    """Patsy formula for an outcome and a covariate set name or expression."""
+    rhs = COVARIATE_SETS.get(covariates, covariates)
+    return f"{outcome} ~ skin + {rhs}"
+
+
+def required_columns(grid):
+    """Columns of the cleaned dataset needed to run ``grid``."""
+    columns = {'redCards', 'games', 'skinTone', 'rater1', 'rater2'}
+    for covariates in grid['covariates']:
+        rhs = COVARIATE_SETS.get(covariates, covariates)
+        columns.update(re.findall(r'[A-Za-z_]\w*', rhs))
+    columns -= {'skin', 'C', 'I', 'np'}
+    return sorted(columns)
+
+
+def expand_grid(grid):
+    """All compatible specifications of ``grid`` as a list of dicts."""
+    specs = []
+    for outcome, covariates, coding, exclusion, family in itertools.product(
+            grid['outcome'], grid['covariates'], grid['skin_coding'],
+            grid['exclusion'], grid['family']):
+        if OUTCOMES[outcome] not in FAMILIES[family]:
+            continue
+        specs.append({'outcome': outcome, 'covariates': covariates,
+                      'skin_coding': coding, 'exclusion': exclusion,
+                      'family': family})
+    return specs
+
+
+def design_tasks(specs):
+    """Group specifications that share a design matrix into one task each."""
+    tasks = {}
+    for spec in specs:
+        key = tuple(spec[k] for k in DESIGN_KEYS)
+        tasks.setdefault(key, []).append(spec['family'])
+    return [(key, families) for key, families in tasks.items()]
+
+
+def build_design(df, outcome, covariates, skin_coding, exclusion):
+    """Compressed ``(y, X, counts, names)`` for one design."""
+    mask = exclusion_mask(df, exclusion)
+    frame = df.loc[mask].copy()
+    frame['skin'] = skin_tone(frame, skin_coding)
+    frame['anyRedCard'] = (frame['redCards'] > 0).astype(float)
+    y, X = dmatrices(formula(outcome, covariates), data=frame,
+                     NA_action='drop', return_type='matrix')
+    names = X.design_info.column_names
+    y, X, counts = compressed.compress_arrays(np.asarray(y)[:, 0], np.asarray(X))
+    return y, X, counts, names
+
+
+def fit_family(family, y, X, counts, poisson_result=None, store=None, names=None,
+               warm_from=()):
+    """
+    Fit one model family on a compressed design.
+
+    Goes through modelstore.fit_cached; ``warm_from`` are earlier fits to
+    start from, and the NB fit also starts from ``poisson_result``.
+    """
+    options = {}
+    if family == 'negbin':
+        warm_from = [poisson_result, *warm_from]
+        options['maxiter'] = 100
+    return modelstore.fit_cached(family, y, X, counts, store=store, names=names,
+                                 warm_from=warm_from, **options)
+
+
+def _converged(result):
+    retvals = getattr(result, 'mle_retvals', None)
+    if retvals is not None:
+        return bool(retvals.get('converged', True))
+    return bool(getattr(result, 'converged', True))
+
+
+def _init_worker(df, model_cache=None):
+    """``df`` is the data, or the spec of a colstore.SharedColumns holding it."""
+    global _DATA, _STORE
+    _DATA = colstore.attach(df) if isinstance(df, dict) else df
+    _STORE = None if model_cache is None else modelstore.ModelStore(model_cache)
+    warnings.filterwarnings('ignore')
+
+
+def run_design(task):
+    """Worker entry point: build one design and fit all of its families."""
+    key, families = task
+    spec = dict(zip(DESIGN_KEYS, key))
+    rows = []
+    try:
+        y, X, counts, names = build_design(_DATA, **spec)
+    except Exception as exc:  # record the failure, keep the multiverse going
+        return [dict(spec, family=f, error=f"design: {exc}") for f in families]
+
+    fitted = {}
+    # Poisson first so the NB fit can start from it
+    for family in sorted(families, key=lambda f: f != 'poisson'):
+        row = dict(spec, family=family, n_obs=int(counts.sum()),
+                   n_patterns=len(y))
+        start = time.perf_counter()
+        try:
+            result = fit_family(family, y, X, counts,
+                                poisson_result=fitted.get('poisson'), store=_STORE,
+                                names=names)
+            fitted[family] = result
+            i = names.index('skin')
+            params = np.asarray(result.params)
+            bse = np.asarray(result.bse)
+            ci = np.asarray(result.conf_int())
+            row.update(estimate=params[i], std_err=bse[i],
+                       p_value=np.asarray(result.pvalues)[i],
+                       ci_low=ci[i, 0], ci_high=ci[i, 1],
+                       converged=_converged(result))
+        except Exception as exc:
+            row['error'] = str(exc)
+        row['seconds'] = time.perf_counter() - start
+        rows.append(row)
+    return rows
+
+
+def run_multiverse(df, grid=DEFAULT_GRID, n_jobs=None, output=None, model_cache=None):
+    """
+    Fit every specification of ``grid`` on the cleaned data ``df``.
+
+    Rows are appended to the CSV ``output`` (if given) as they finish. Returns
+    the full results table, one row per specification. Fits are stored in
+    and reused from the directory ``model_cache`` if given.
+    """
+    specs = expand_grid(grid)
+    tasks = design_tasks(specs)
+    df = df[[c for c in required_columns(grid) if c in df.columns]]
+
+    writer = None
+    handle = None
+    if output is not None:
+        handle = open(output, 'w', newline='')
+        writer = csv.DictWriter(handle, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+
+    rows = []
+    with contextlib.ExitStack() as stack:
+        if handle is not None:
+            stack.callback(handle.close)
+        shared = df
+        if min(parallel.resolve_jobs(n_jobs), len(tasks)) > 1:
+            shared = stack.enter_context(colstore.SharedColumns(df, list(df.columns))).spec
+        for _, task_rows in parallel.run_tasks(run_design, tasks, n_jobs=n_jobs,
+                                               initializer=_init_worker,
+                                               initargs=(shared, model_cache)):
+            rows.extend(task_rows)
+            if writer is not None:
+                writer.writerows(task_rows)
+                handle.flush()
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--data', default='/data/CrowdstormingDataJuly1st.csv')
+    parser.add_argument('--output', default='team-30-multiverse.csv')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="worker processes (default: all CPUs)")
+    parser.add_argument('--model-cache', default=None,
+                        help="directory to store fitted models in and reuse them from")
+    args = parser.parse_args()
+
+    df, _ = data.load_cleaned(args.data, columns=required_columns(DEFAULT_GRID))
+    specs = expand_grid(DEFAULT_GRID)
+    print(f"Fitting {len(specs)} specifications "
+          f"({len(design_tasks(specs))} design matrices)")
+    start = time.perf_counter()
+    results = run_multiverse(df, DEFAULT_GRID, n_jobs=args.jobs, output=args.output,
+                             model_cache=args.model_cache)
+    print(f"Done in {time.perf_counter() - start:.1f}s; "
+          f"{results['error'].notna().sum()} failed; results in {args.output}")
+    ok = results[results['error'].isna()]
+    print(ok.groupby('family')['estimate'].describe())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Small process-pool helpers shared by the parallel engines.
+
+Work is split into independent tasks; per-worker state (the data) is set up
+once by an initializer instead of being pickled with every task. With
+``n_jobs=1`` everything runs in the calling process, which keeps tracebacks
+readable and avoids pool start-up for small jobs.
+
+Pools are started with the platform's default context (fork on Linux)
+unless told otherwise. A pool started while other threads are running, as
+under team30/scheduler.py, should use thread_safe_context(): a forked
+worker inherits the locks those threads held at the time (of the I/O
+buffers, the allocator, BLAS) and can hang on them.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def resolve_jobs(n_jobs):
+    """Number of worker processes for ``n_jobs`` (None, 0 or -1: all CPUs)."""
+    if n_jobs is None or n_jobs <= 0:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+def thread_safe_context():
+    """forkserver where the platform has it, else spawn; neither forks this process."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def run_tasks(func, tasks, n_jobs=None, initializer=None, initargs=(), mp_context=None):
+    """
+    Apply ``func`` to every task and yield ``(task, result)`` as each finishes.
+
+    Results arrive in completion order, not submission order. ``mp_context``
+    is the pool's multiprocessing context (default: the platform's); with
+    forkserver or spawn, ``func``, the initializer and its arguments must
+    pickle.
+    """
+    tasks = list(tasks)
+    n_jobs = min(resolve_jobs(n_jobs), max(len(tasks), 1))
+    if n_jobs == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            yield task, func(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=initializer,
+                             initargs=initargs, mp_context=mp_context) as pool:
+        futures = {pool.submit(func, task): task for task in tasks}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,185 @@
+"""
+Player-level permutation test of the skin tone effect.
+
+Skin tone is a property of the player, so under the null hypothesis of no
+effect the players' skin tone ratings are exchangeable. Each permutation
+shuffles the ratings across players and keeps all of a player's dyads
+together.
+
+All test statistics used here are functions of per-player sums: dyads, red
+cards, games, dyads with a red card, and the fitted means of the null
+Poisson model. A batch of permutations is therefore a (permutations x
+players) matrix of shuffled ratings, and every statistic is a few matrix
+products with those sums. There are no refits and no pass over the dyads.
+Permutations are processed in chunks to bound memory, optionally across
+worker processes with per-chunk SeedSequence seeding.
+
+Statistics:
+
+* ``rate_ratio``: dark/light red cards per game (dark is skin tone above
+  ``threshold``), compared two-sided on the log scale;
+* ``chi2``: chi-square (with Yates' correction, as scipy.stats.chi2_contingency)
+  for dark skin x at least one red card over dyads;
+* ``score``: score statistic for skin tone in the Poisson model
+  redCards ~ games + skinTone, evaluated at the fitted null model.
+"""
+
+import numpy as np
+import pandas as pd
+
+from team30 import glmsolver, parallel
+
+STATISTICS = ('rate_ratio', 'chi2', 'score')
+
+# Largest (permutations x players) block of shuffled ratings formed at once,
+# in elements
+PERMUTATION_BUDGET = 4_000_000
+
+# Set once per worker by _init_worker
+_PLAYER_SUMS = None
+
+
+def player_sums(df, threshold=0.5):
+    """
+    Per-player sufficient statistics for the permutation test.
+
+    Returns a dict of arrays indexed by player plus the fixed totals and the
+    information matrix of the null model's nuisance parameters.
+    """
+    model_df = df[['playerShort', 'skinTone', 'games', 'redCards']].dropna()
+    y = model_df['redCards'].to_numpy(dtype=float)
+    games = model_df['games'].to_numpy(dtype=float)
+
+    # Null model: redCards ~ 1 + games (no skin tone)
+    design = np.column_stack([np.ones(len(y)), games])
+    null = glmsolver.fit('poisson', y, design)
+    mu = np.exp(design @ null.params)
+
+    codes, _ = pd.factorize(model_df['playerShort'])
+    n_players = codes.max() + 1
+
+    def by_player(values):
+        return np.bincount(codes, weights=values, minlength=n_players)
+
+    sums = {
+        'skin': by_player(model_df['skinTone'].to_numpy(dtype=float))
+                / np.bincount(codes, minlength=n_players),
+        'n': by_player(np.ones(len(y))),
+        'red': by_player(y),
+        'games': by_player(games),
+        'any_red': by_player((y > 0).astype(float)),
+        'mu': by_player(mu),
+        'mu_games': by_player(mu * games),
+        'threshold': threshold,
+    }
+    # Information of (const, games) at the null fit; fixed under permutation
+    sums['info_zz'] = np.array([[mu.sum(), (mu * games).sum()],
+                                [(mu * games).sum(), (mu * games ** 2).sum()]])
+    return sums
+
+
+def statistics(sums, skin):
+    """
+    All test statistics for a (permutations x players) matrix of ratings.
+
+    Returns a dict of arrays with one value per row of ``skin``.
+    """
+    skin = np.atleast_2d(skin)
+    dark = (skin > sums['threshold']).astype(float)
+
+    # Rate ratio of red cards per game, dark vs light
+    red_dark = dark @ sums['red']
+    games_dark = dark @ sums['games']
+    red_light = sums['red'].sum() - red_dark
+    games_light = sums['games'].sum() - games_dark
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate_ratio = (red_dark / games_dark) / (red_light / games_light)
+
+    # 2x2 chi-square: rows dark/light, columns any red card yes/no
+    n_total = sums['n'].sum()
+    red_total = sums['any_red'].sum()
+    n_dark = dark @ sums['n']
+    a = dark @ sums['any_red']
+    observed = np.stack([a, n_dark - a, red_total - a,
+                         n_total - n_dark - (red_total - a)], axis=-1)
+    rows = np.stack([n_dark, n_dark, n_total - n_dark, n_total - n_dark], axis=-1)
+    cols = np.array([red_total, n_total - red_total, red_total, n_total - red_total])
+    expected = rows * cols / n_total
+    diff = np.abs(observed - expected)
+    # Yates' correction, as applied by chi2_contingency to 2x2 tables
+    diff = diff - np.minimum(0.5, diff)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = np.sum(diff ** 2 / expected, axis=-1)
+
+    # Efficient score statistic for skin tone at the null Poisson fit
+    u = skin @ (sums['red'] - sums['mu'])
+    info_ss = (skin ** 2) @ sums['mu']
+    info_sz = np.stack([skin @ sums['mu'], skin @ sums['mu_games']], axis=-1)
+    correction = np.einsum('bi,ij,bj->b', info_sz, np.linalg.inv(sums['info_zz']),
+                           info_sz)
+    score = u ** 2 / (info_ss - correction)
+
+    return {'rate_ratio': rate_ratio, 'chi2': chi2, 'score': score}
+
+
+def _extremeness(name, values):
+    """Map a statistic to a scale where larger means more extreme."""
+    if name == 'rate_ratio':
+        return np.abs(np.log(values))
+    return values
+
+
+def _init_worker(sums):
+    global _PLAYER_SUMS
+    _PLAYER_SUMS = sums
+
+
+def _permutation_chunk(task):
+    """Worker entry point: count permutations at least as extreme as observed."""
+    size, seed_seq, observed = task
+    sums = _PLAYER_SUMS
+    rng = np.random.default_rng(seed_seq)
+    skin = rng.permuted(np.tile(sums['skin'], (size, 1)), axis=1)
+    stats = statistics(sums, skin)
+    counts = {}
+    for name in STATISTICS:
+        extreme = _extremeness(name, stats[name])
+        # Relative tolerance so ties with the observed value count as extreme
+        counts[name] = int(np.sum(extreme >= observed[name] * (1 - 1e-12)))
+    return counts
+
+
+def permutation_test(sums, n_perm=10000, seed=0, n_jobs=1, chunk_size=1000, mp_context=None):
+    """
+    Player-level permutation test of every statistic in STATISTICS.
+
+    Returns a DataFrame indexed by statistic with the observed value, the
+    permutation p-value ``(1 + #extreme) / (1 + n_perm)`` and its Monte Carlo
+    standard error. Chunks shrink below ``chunk_size`` when needed to keep
+    each one within PERMUTATION_BUDGET elements. ``mp_context`` is passed to
+    parallel.run_tasks.
+    """
+    observed = statistics(sums, sums['skin'])
+    observed_extreme = {name: _extremeness(name, observed[name])[0]
+                        for name in STATISTICS}
+
+    chunk_size = max(1, min(chunk_size, PERMUTATION_BUDGET // len(sums['skin'])))
+    n_chunks = -(-n_perm // chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    tasks = [(min(chunk_size, n_perm - i * chunk_size), seeds[i], observed_extreme)
+             for i in range(n_chunks)]
+
+    extreme = dict.fromkeys(STATISTICS, 0)
+    for _, counts in parallel.run_tasks(_permutation_chunk, tasks, n_jobs=n_jobs,
+                                        initializer=_init_worker, initargs=(sums,),
+                                        mp_context=mp_context):
+        for name in STATISTICS:
+            extreme[name] += counts[name]
+
+    rows = []
+    for name in STATISTICS:
+        p = (1 + extreme[name]) / (1 + n_perm)
+        rows.append({'statistic': name, 'observed': observed[name][0],
+                     'n_extreme': extreme[name], 'p_value': p,
+                     'mc_se': np.sqrt(p * (1 - p) / n_perm)})
+    return pd.DataFrame(rows).set_index('statistic')
@@ -0,0 +1,205 @@
+"""
+Per-stage instrumentation of the team-30 pipeline.
+
+A Profiler times named stages:
+
+    profiler = Profiler('team-30-metrics.jsonl')
+    with profiler.stage('load') as record:
+        df = ...
+        record['rows'] = len(df)
+
+Each stage records wall time, CPU time of this process and of reaped child
+processes (the worker pools), the tracemalloc peak, and resident memory.
+The record dict can carry extra fields such as row counts (which add a
+``rows_per_s`` throughput), and fit_info adds
+a statsmodels fit's iteration count and convergence. Stages nest; a model
+fit inside the tests stage is its own record, with ``parent`` set.
+
+Stages may also run at the same time on different threads (see
+scheduler.py); nesting is tracked per thread. CPU times are those of the
+whole process, and tracemalloc peaks are process-wide, so the figures of
+overlapping stages include each other's work.
+
+Every finished stage is appended to a JSON Lines file as one object, so
+runs can be diffed or loaded with ``pd.read_json(path, lines=True)``. With
+``profile_dir`` set, each top-level stage also runs under cProfile and its
+statistics are dumped to ``<profile_dir>/<run_id>-<n>-<stage>.prof``
+(cProfile cannot nest, so inner stages are included in their parent's
+dump, and a stage that starts while another thread's stage is being
+profiled is not profiled).
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _rss_mb():
+    """Current resident set size in MB, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def _max_rss_mb(who='self'):
+    """Peak resident set size so far in MB (of this process or its children)."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self'
+                               else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 2 ** 20 if os.uname().sysname == 'Darwin' else 2 ** 10
+    return usage.ru_maxrss / scale
+
+
+def _children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def fit_info(result):
+    """Optimizer details of a statsmodels results object."""
+    info = {'nobs': float(result.nobs)}
+    retvals = getattr(result, 'mle_retvals', None)
+    if retvals is not None:
+        info['method'] = result.mle_settings.get('optimizer')
+        info['iterations'] = retvals.get('iterations')
+        info['converged'] = bool(retvals.get('converged', True))
+    elif getattr(result, 'fit_history', None) is not None:
+        # GLM IRLS
+        info['method'] = getattr(result, 'method', 'IRLS')
+        info['iterations'] = result.fit_history.get('iteration')
+        info['converged'] = bool(getattr(result, 'converged', True))
+    return info
+
+
+class Profiler:
+    """
+    Stage timer writing one JSON object per stage to ``metrics_path``.
+
+    Without ``metrics_path`` the records are only kept in ``records``.
+    ``trace_memory=False`` skips tracemalloc, which slows allocation-heavy
+    code down noticeably. ``context`` fields (a commit, a data scale, ...)
+    are added to every record.
+    """
+
+    def __init__(self, metrics_path=None, profile_dir=None, trace_memory=True,
+                 run_id=None, context=None):
+        self.metrics_path = metrics_path
+        self.context = dict(context or {})
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.run_id = run_id or time.strftime('%Y%m%dT%H%M%S')
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Open stages of every thread, whose peaks the traced memory counts toward
+        self._active = []
+        self._count = 0
+        self._started_tracing = False
+        self._profiling = False
+
+    @property
+    def _stack(self):
+        """Open stages of the calling thread, innermost last."""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _fold_peak(self):
+        # The traced peak since the last reset belongs to every open stage
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self._active:
+            record['_peak'] = max(record['_peak'], peak)
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        """Time the enclosed block as stage ``name``; yields its record."""
+        stack = self._stack
+        record = {'run_id': self.run_id, **self.context, 'stage': name,
+                  'parent': stack[-1]['stage'] if stack else None}
+        record.update(fields)
+        record['_peak'] = 0
+
+        tracing = self.trace_memory
+        profile = None
+        with self._lock:
+            if tracing:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started_tracing = True
+                self._fold_peak()
+                tracemalloc.reset_peak()
+                self._active.append(record)
+            if self.profile_dir is not None and not stack and not self._profiling:
+                profile = cProfile.Profile()
+                self._profiling = True
+            self._count += 1
+            index = self._count
+
+        stack.append(record)
+        wall, cpu, cpu_children = time.perf_counter(), time.process_time(), _children_cpu()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            record['wall_s'] = time.perf_counter() - wall
+            record['cpu_s'] = time.process_time() - cpu
+            record['cpu_children_s'] = _children_cpu() - cpu_children
+            if record.get('rows') and record['wall_s'] > 0:
+                record['rows_per_s'] = record['rows'] / record['wall_s']
+            stack.pop()
+
+            with self._lock:
+                if tracing:
+                    self._fold_peak()
+                    self._active = [r for r in self._active if r is not record]
+                    record['tracemalloc_peak_mb'] = record['_peak'] / 2 ** 20
+                    if not self._active and self._started_tracing:
+                        tracemalloc.stop()
+                        self._started_tracing = False
+                if profile is not None:
+                    self._profiling = False
+            del record['_peak']
+            record['rss_mb'] = _rss_mb()
+            record['max_rss_mb'] = _max_rss_mb()
+            record['max_rss_children_mb'] = _max_rss_mb('children')
+
+            if profile is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                record['profile'] = os.path.join(
+                    self.profile_dir, f"{self.run_id}-{index:02d}-{name}.prof")
+                profile.dump_stats(record['profile'])
+
+            with self._lock:
+                self.records.append(record)
+                self._write(record)
+
+    def _write(self, record):
+        if self.metrics_path is None:
+            return
+        with open(self.metrics_path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def table(self):
+        """The records so far as a DataFrame, in completion order."""
+        return pd.DataFrame(self.records)
@@ -0,0 +1,217 @@
+"""
+Dependency-aware concurrent execution of pipeline stages.
+
+A Scheduler holds a graph of tasks. add() registers a function with its
+arguments and returns a handle; passing that handle (or an item of it,
+``handle[0]``) as an argument to a later task makes the later task depend
+on it and receive its result. run() starts every task as soon as the tasks
+it depends on have finished, so independent stages overlap:
+
+    scheduler = Scheduler(profiler)
+    models = scheduler.add('tests', fit_models, df)
+    scheduler.add('plots', draw, summary, process=True)
+    scheduler.add('report', report, summary, models[0], models[1])
+    results = scheduler.run()
+
+Tasks run on threads, which suits stages that spend their time in NumPy or
+in worker pools of their own; such pools must not fork the threaded process
+(see parallel.thread_safe_context). ``process=True`` runs a task in a separate
+(spawned) process instead, for work that holds the GIL or keeps global
+state, such as matplotlib; its function, arguments and result must pickle.
+
+Whatever a task prints is buffered per task and written out in the order
+the tasks were added, so the console reads as it would for a sequential
+run. The earliest task whose output is not out yet prints straight through.
+With a profiling.Profiler, every task is timed as a stage of its own unless
+added with ``timed=False`` (for tasks that time their own parts).
+
+If a task raises, tasks that depend on it are not started, the running ones
+are waited for, and run() re-raises the first error.
+"""
+
+import contextlib
+import io
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor,
+                                wait)
+
+
+class Result:
+    """Handle of a task's result (or of an item in it), for use as an argument."""
+
+    def __init__(self, name, keys=()):
+        self.name = name
+        self.keys = keys
+
+    def __getitem__(self, key):
+        return Result(self.name, (*self.keys, key))
+
+    def resolve(self, results):
+        value = results[self.name]
+        for key in self.keys:
+            value = value[key]
+        return value
+
+    def __repr__(self):
+        return f"Result({self.name!r})" + ''.join(f"[{key!r}]" for key in self.keys)
+
+
+def _resolve(value, results):
+    return value.resolve(results) if isinstance(value, Result) else value
+
+
+def _captured(func, args, kwargs):
+    """Run ``func`` with its output captured; ``(output, result)``. For worker processes."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = func(*args, **kwargs)
+    return out.getvalue(), result
+
+
+class _Task:
+    def __init__(self, name, func, args, kwargs, process, timed, fields):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.process = process
+        self.timed = timed
+        self.fields = fields
+        values = [*args, *kwargs.values()]
+        self.depends = {v.name for v in values if isinstance(v, Result)}
+        self.parts = []
+        self.live = False
+
+
+class _ThreadStdout:
+    """sys.stdout stand-in sending each task thread's writes to its task."""
+
+    def __init__(self, stream, scheduler):
+        self._stream = stream
+        self._scheduler = scheduler
+
+    def write(self, text):
+        task = self._scheduler._running.get(threading.get_ident())
+        if task is None:
+            return self._stream.write(text)
+        self._scheduler._write(task, text)
+        return len(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class Scheduler:
+    """
+    Tasks with dependencies, run concurrently by run().
+
+    ``max_workers`` caps the tasks running at once (default: all of them);
+    ``profiler`` times every task as a stage.
+    """
+
+    def __init__(self, profiler=None, max_workers=None):
+        self.profiler = profiler
+        self.max_workers = max_workers
+        self._tasks = {}
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stream = None
+
+    def add(self, name, func, *args, process=False, timed=True, fields=None, **kwargs):
+        """
+        Register ``func(*args, **kwargs)`` as task ``name`` and return its Result.
+
+        Result arguments are replaced by the results of their tasks, which
+        must have been added before. ``fields`` are extra fields of the
+        task's profiler stage.
+        """
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task: {name!r}")
+        task = _Task(name, func, args, kwargs, process, timed, dict(fields or {}))
+        unknown = task.depends - set(self._tasks)
+        if unknown:
+            raise ValueError(f"Task {name!r} depends on unknown tasks: {sorted(unknown)}")
+        self._tasks[name] = task
+        return Result(name)
+
+    def _write(self, task, text):
+        with self._lock:
+            if task.live:
+                self._stream.write(text)
+            else:
+                task.parts.append(text)
+
+    def _flush(self, order, finished):
+        """Write out buffered output in task order, up to the first unfinished task."""
+        with self._lock:
+            while order:
+                task = order[0]
+                if not task.live:
+                    self._stream.write(''.join(task.parts))
+                    task.parts, task.live = [], True
+                if task.name not in finished:
+                    break
+                order.pop(0)
+            self._stream.flush()
+
+    def _call(self, task, results, processes):
+        args = [_resolve(a, results) for a in task.args]
+        kwargs = {k: _resolve(v, results) for k, v in task.kwargs.items()}
+        self._running[threading.get_ident()] = task
+        try:
+            timer = (self.profiler.stage(task.name, **task.fields)
+                     if self.profiler is not None and task.timed else contextlib.nullcontext())
+            with timer:
+                if not task.process:
+                    return task.func(*args, **kwargs)
+                output, result = processes.submit(_captured, task.func, args, kwargs).result()
+                self._write(task, output)
+                return result
+        finally:
+            del self._running[threading.get_ident()]
+
+    def run(self):
+        """Run every task; returns ``{name: result}``."""
+        tasks = list(self._tasks.values())
+        order = list(tasks)
+        pending = list(tasks)
+        results, finished, futures, errors = {}, set(), {}, []
+        n_processes = sum(task.process for task in tasks)
+
+        self._stream = sys.stdout
+        with contextlib.ExitStack() as stack:
+            threads = stack.enter_context(ThreadPoolExecutor(
+                max_workers=self.max_workers or max(len(tasks), 1)))
+            processes = None
+            if n_processes:
+                processes = stack.enter_context(ProcessPoolExecutor(
+                    max_workers=n_processes, mp_context=multiprocessing.get_context('spawn')))
+            stack.enter_context(contextlib.redirect_stdout(_ThreadStdout(sys.stdout, self)))
+            self._flush(order, finished)
+            while pending or futures:
+                if not errors:
+                    for task in [t for t in pending if t.depends <= finished]:
+                        pending.remove(task)
+                        futures[threads.submit(self._call, task, results, processes)] = task
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = futures.pop(future)
+                    try:
+                        results[task.name] = future.result()
+                    except BaseException as exc:
+                        errors.append(exc)
+                    finished.add(task.name)
+                self._flush(order, finished)
+            # Tasks that never ran (after an error) have nothing to print
+            finished.update(task.name for task in pending)
+            self._flush(order, finished)
+        if errors:
+            raise errors[0]
+        return results
@@ -0,0 +1,193 @@
+"""
+Sensitivity of the light/dark comparison to the skin tone coding.
+
+data.clean codes skin tone as the mean of the two raters and splits it at
+``dark_threshold`` (0.5) and into four pd.cut bins. This module repeats the
+light/dark comparison of the report for every threshold at once, for the
+mean coding and for rater1 only, rater2 only and the larger of the two.
+
+Each coding is reduced once: the dyads are sorted by their rating (one
+np.unique) and summed per distinct rating, giving dyads, red cards, games
+and dyads with a red card. Cumulative sums of that short table give the
+light (rating <= threshold) totals for every threshold, and the dark
+totals are the complements. The whole sweep therefore costs one pass over
+the data per coding. Rates, rate ratios and the chi-square test of
+darkSkin x (redCards > 0) follow from the totals; the chi-square statistic
+is scipy.stats.chi2_contingency's, with the Yates correction. Any binning
+of a coding comes from the same table (see binned).
+
+    python -m team30.sensitivity --data CrowdstormingDataJuly1st.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from team30 import data
+
+CODINGS = ['mean', 'rater1', 'rater2', 'max']
+
+COLUMNS = ['rater1', 'rater2', 'redCards', 'games']
+
+TOTALS = ['n', 'red', 'games', 'any_red']
+
+
+def coding_values(df, coding):
+    """Skin tone of every dyad under ``coding``; NaN where it is unrated."""
+    if coding == 'mean':
+        # As data.clean: the mean of the available ratings
+        return df[['rater1', 'rater2']].mean(axis=1).to_numpy()
+    if coding == 'max':
+        return df[['rater1', 'rater2']].max(axis=1).to_numpy()
+    if coding in ('rater1', 'rater2'):
+        return df[coding].to_numpy(dtype=float)
+    raise ValueError(f"Unknown skin tone coding: {coding!r}")
+
+
+def level_table(df, coding):
+    """Totals per distinct rating under ``coding``, in increasing order."""
+    values = coding_values(df, coding)
+    rated = ~np.isnan(values)
+    levels, index = np.unique(values[rated], return_inverse=True)
+    red = df['redCards'].to_numpy(dtype=float)[rated]
+    games = df['games'].to_numpy(dtype=float)[rated]
+    size = len(levels)
+    return pd.DataFrame({
+        'n': np.bincount(index, minlength=size),
+        'red': np.bincount(index, weights=red, minlength=size),
+        'games': np.bincount(index, weights=games, minlength=size),
+        'any_red': np.bincount(index, weights=red > 0, minlength=size),
+    }, index=pd.Index(levels, name='skinTone')).astype(np.int64)
+
+
+def _compare(light, dark):
+    """Light/dark rates, ratios and chi-square from aligned total frames."""
+    out = pd.DataFrame(index=light.index)
+    for name, part in (('light', light), ('dark', dark)):
+        out[f'n_{name}'] = part['n']
+        out[f'mean_{name}'] = part['red'] / part['n']
+        out[f'any_rate_{name}'] = part['any_red'] / part['n']
+        out[f'per_game_{name}'] = part['red'] / part['games']
+    out['mean_ratio'] = out['mean_dark'] / out['mean_light']
+    out['rate_ratio'] = out['per_game_dark'] / out['per_game_light']
+    # Wald interval of the per-game rate ratio (Poisson counts)
+    se = np.sqrt(1 / dark['red'] + 1 / light['red'])
+    q = stats.norm.ppf(0.975)
+    out['rate_ratio_low'] = out['rate_ratio'] * np.exp(-q * se)
+    out['rate_ratio_high'] = out['rate_ratio'] * np.exp(q * se)
+
+    # 2x2 chi-square with the Yates correction, as chi2_contingency
+    observed = np.stack([light['n'] - light['any_red'], light['any_red'],
+                         dark['n'] - dark['any_red'], dark['any_red']], axis=1)
+    row = np.repeat(np.stack([light['n'], dark['n']], axis=1), 2, axis=1)
+    col = np.tile(np.stack([observed[:, 0] + observed[:, 2],
+                            observed[:, 1] + observed[:, 3]], axis=1), 2)
+    expected = row * col / (light['n'] + dark['n']).to_numpy()[:, None]
+    # |observed - expected| is the same in all four cells of a 2x2 table
+    deviation = np.maximum(np.abs(observed[:, :1] - expected[:, :1]) - 0.5, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['chi2'] = np.sum(deviation ** 2 / expected, axis=1)
+    out['chi2_p'] = stats.chi2.sf(out['chi2'], 1)
+    return out
+
+
+def threshold_sweep(levels):
+    """
+    The light/dark comparison at every threshold of a level_table.
+
+    Dyads rated ``<= threshold`` are light and the rest dark, as data.clean's
+    ``darkSkin``. Thresholds are the distinct ratings except the largest
+    (which leaves no dark dyads).
+    """
+    light = levels[TOTALS].cumsum().iloc[:-1]
+    dark = levels[TOTALS].sum() - light
+    out = _compare(light, dark)
+    out.index.name = 'threshold'
+    return out
+
+
+def binned(levels, bins=data.CLEANING_PARAMS['skin_tone_bins'],
+           labels=data.CLEANING_PARAMS['skin_tone_labels']):
+    """
+    Totals and rates per bin of a level_table, with data.clean's pd.cut bins.
+
+    Bins are right-closed and the lowest one includes its left edge. The
+    bin totals are differences of the cumulative sums at the edges.
+    """
+    cum = np.vstack([np.zeros(len(TOTALS), dtype=np.int64),
+                     levels[TOTALS].cumsum().to_numpy()])
+    values = levels.index.to_numpy()
+    edges = np.searchsorted(values, bins, side='right')
+    edges[0] = np.searchsorted(values, bins[0], side='left')
+    totals = pd.DataFrame(np.diff(cum[edges], axis=0), columns=TOTALS,
+                          index=pd.Index(labels, name='skinToneCategory'))
+    totals['mean'] = totals['red'] / totals['n']
+    totals['any_rate'] = totals['any_red'] / totals['n']
+    totals['per_game'] = totals['red'] / totals['games']
+    return totals
+
+
+def sweep(df, codings=CODINGS):
+    """threshold_sweep of every coding, stacked with a ``coding`` column."""
+    tables = [threshold_sweep(level_table(df, coding)).reset_index().assign(coding=coding)
+              for coding in codings]
+    out = pd.concat(tables, ignore_index=True)
+    return out[['coding'] + [c for c in out.columns if c != 'coding']]
+
+
+def plot(table, default=data.CLEANING_PARAMS['dark_threshold'], path=None):
+    """
+    Rate ratio (with 95% interval) and chi-square p-value against threshold,
+    one line per coding; the pipeline's threshold is marked.
+    """
+    import matplotlib.pyplot as plt
+
+    fig, (top, bottom) = plt.subplots(2, 1, figsize=(9, 8), sharex=True)
+    for coding, part in table.groupby('coding', sort=False):
+        line, = top.plot(part['threshold'], part['rate_ratio'], marker='o', label=coding)
+        top.fill_between(part['threshold'], part['rate_ratio_low'], part['rate_ratio_high'],
+                         color=line.get_color(), alpha=0.1)
+        bottom.plot(part['threshold'], part['chi2_p'], marker='o', color=line.get_color(),
+                    label=coding)
+    for ax in (top, bottom):
+        ax.axvline(default, color='grey', linestyle='--', linewidth=1)
+        ax.grid(True, alpha=0.3)
+    top.axhline(1, color='black', linewidth=1)
+    top.set_ylabel('Red cards per game, dark / light')
+    top.set_title('Sensitivity of the light/dark comparison to the skin tone threshold')
+    top.legend(title='Coding')
+    bottom.axhline(0.05, color='red', linestyle=':', linewidth=1)
+    bottom.set_yscale('log')
+    bottom.set_ylabel('Chi-square p-value (any red card)')
+    bottom.set_xlabel('Threshold (dark = rating above it)')
+    fig.tight_layout()
+    if path is not None:
+        fig.savefig(path, dpi=150)
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--data', default='/data/CrowdstormingDataJuly1st.csv')
+    parser.add_argument('--output', default='team-30-sensitivity.csv')
+    parser.add_argument('--plot', default='team-30-sensitivity.png')
+    args = parser.parse_args()
+
+    df, _ = data.load_cleaned(args.data, columns=COLUMNS)
+    table = sweep(df)
+    table.to_csv(args.output, index=False)
+    print(table[['coding', 'threshold', 'n_light', 'n_dark', 'rate_ratio',
+                 'chi2', 'chi2_p']].round(4).to_string(index=False))
+    print("\nBy skin tone category (mean coding):")
+    print(binned(level_table(df, 'mean')).round(4).to_string())
+
+    import matplotlib
+    matplotlib.use('Agg')
+    plot(table, path=args.plot)
+    print(f"\nTable: {args.output}; plot: {args.plot}")
+
+
+if __name__ == '__main__':
+    main()
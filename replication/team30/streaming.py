@@ -0,0 +1,121 @@
+"""
+Out-of-core pass over the crowdstorming data.
+
+load_cleaned materializes the whole dyad table. scan instead reads it in
+chunks of ``chunk_size`` rows, from the Parquet cache when one exists and
+from the CSV otherwise, and cleans each chunk with data.clean. Each chunk is
+then reduced to the additive tables the pipeline needs:
+
+* the summary table behind every descriptive statistic, the contingency
+  table and the Mann-Whitney test (summary.summary_table);
+* the (redCards, skinTone, games) pattern counts the compressed Poisson and
+  Negative Binomial fits use (compressed.compress_patterns);
+* the set of players seen.
+
+The running tables are merged after every chunk, so memory depends on the
+chunk size and the number of distinct patterns and players, not on the
+number of dyads. The merged tables equal the ones built from the full frame,
+so the downstream statistics and fits are identical.
+"""
+
+import json
+import os
+
+import pandas as pd
+
+from team30 import compressed, data
+from team30.summary import Summary, merge_tables, summary_table
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+MODEL_COVARIATES = ['skinTone', 'games']
+
+# Raw columns the reductions need; data.clean derives the rest.
+RAW_COLUMNS = ['playerShort', 'games', 'redCards', 'rater1', 'rater2']
+
+CLEAN_COLUMNS = ['playerShort', 'games', 'redCards'] + data.DERIVED_COLUMNS
+
+
+def _cached_parquet(filepath, cache_dir, params):
+    """``(path, meta)`` of an existing Parquet cache of ``filepath``, or None."""
+    if cache_dir is None:
+        return None
+    key = data.cache_key(filepath, params)
+    path, meta_path = data._cache_paths(filepath, key, cache_dir, 'parquet')
+    if not (os.path.exists(path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        return path, json.load(f)
+
+
+def _parquet_chunks(path, chunk_size):
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=CLEAN_COLUMNS):
+        yield batch.to_pandas()
+
+
+def _csv_chunks(filepath, chunk_size, params):
+    for raw in pd.read_csv(filepath, usecols=RAW_COLUMNS, chunksize=chunk_size):
+        yield len(raw), data.clean(raw, params)
+
+
+def iter_chunks(filepath, meta, chunk_size=DEFAULT_CHUNK_SIZE,
+                cache_dir=data.DEFAULT_CACHE_DIR, params=data.CLEANING_PARAMS):
+    """
+    Yield cleaned chunks of CLEAN_COLUMNS.
+
+    Chunks come from the Parquet cache if one exists for ``filepath`` and
+    ``params``, otherwise from the CSV. Once the chunks are exhausted the
+    dict ``meta`` holds the same ``initial_shape``, ``clean_shape``,
+    ``source`` and ``path`` entries as data.load_cleaned's metadata.
+    """
+    cached = _cached_parquet(filepath, cache_dir, params)
+    if cached is not None:
+        path, cache_meta = cached
+        dtype = pd.CategoricalDtype(params['skin_tone_labels'], ordered=True)
+        for chunk in _parquet_chunks(path, chunk_size):
+            # Batches carry their own dictionary; restore the full category set
+            chunk['skinToneCategory'] = chunk['skinToneCategory'].astype(dtype)
+            yield chunk
+        meta.update(cache_meta, source='cache', path=path)
+        return
+
+    n_raw = n_clean = 0
+    for rows, chunk in _csv_chunks(filepath, chunk_size, params):
+        n_raw += rows
+        n_clean += len(chunk)
+        yield chunk[CLEAN_COLUMNS]
+    n_columns = len(pd.read_csv(filepath, nrows=0).columns)
+    meta.update(initial_shape=[n_raw, n_columns],
+                clean_shape=[n_clean, n_columns + len(data.DERIVED_COLUMNS)],
+                source='csv', path=None)
+
+
+def scan(filepath, chunk_size=DEFAULT_CHUNK_SIZE, cache_dir=data.DEFAULT_CACHE_DIR,
+         params=data.CLEANING_PARAMS):
+    """
+    Reduce the dataset chunk by chunk.
+
+    Returns ``(summary, patterns, meta)``: the summary.Summary of the cleaned
+    data, its compress_patterns table over MODEL_COVARIATES and the load
+    metadata (see iter_chunks), with ``chunks`` added.
+    """
+    meta = {}
+    table = None
+    patterns = None
+    players = set()
+    n_chunks = 0
+    for chunk in iter_chunks(filepath, meta, chunk_size, cache_dir, params):
+        n_chunks += 1
+        chunk_table = summary_table(chunk)
+        chunk_patterns = compressed.compress_patterns(chunk, MODEL_COVARIATES)
+        table = chunk_table if table is None else merge_tables([table, chunk_table])
+        patterns = (chunk_patterns if patterns is None
+                    else compressed.merge_patterns([patterns, chunk_patterns]))
+        players.update(chunk['playerShort'].dropna().unique())
+
+    meta['chunks'] = n_chunks
+    summary = Summary(table, len(players), categories=list(params['skin_tone_labels']))
+    return summary, patterns, meta
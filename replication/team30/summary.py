@@ -0,0 +1,242 @@
+"""
+Group-level summary of the cleaned data, built in one grouped pass.
+
+Every descriptive number the EDA, plotting and report stages print is a
+function of how many dyads share each (skin tone, red cards) value and how
+many games they cover. summarize groups the data once on those keys (plus
+the two skin tone classifications, which are functions of skinTone) and
+keeps the resulting table of a few dozen rows. Means, rates, category
+aggregates, quantiles, the 2x2 contingency table and the Mann-Whitney test
+are then computed from the table instead of from filtered copies of the
+data.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+GROUP_KEYS = ['darkSkin', 'skinToneCategory', 'skinTone', 'redCards']
+
+GROUP_LABELS = {0: 'light', 1: 'dark'}
+
+
+def summarize(df):
+    """Summary of a cleaned frame (see data.clean)."""
+    return Summary(summary_table(df), df['playerShort'].nunique(),
+                   categories=list(df['skinToneCategory'].cat.categories))
+
+
+def summary_table(df):
+    """Dyad counts and games sums of ``df`` by GROUP_KEYS."""
+    return (df.groupby(GROUP_KEYS, observed=True, sort=True)
+              .agg(n=('games', 'size'), games=('games', 'sum'))
+              .reset_index())
+
+
+def merge_tables(tables):
+    """
+    Combine summary tables of disjoint parts of the data.
+
+    The result equals summary_table of the parts concatenated.
+    """
+    return (pd.concat(tables, ignore_index=True)
+              .groupby(GROUP_KEYS, observed=True, sort=True)[['n', 'games']]
+              .sum()
+              .reset_index())
+
+
+def _value_at(values, cum_counts, k):
+    """Value of the ``k``-th (0-based) element of the sorted, expanded data."""
+    return values[np.searchsorted(cum_counts, k, side='right')]
+
+
+def weighted_quantile(values, counts, q):
+    """
+    Quantile ``q`` of ``values`` repeated ``counts`` times.
+
+    Same linear interpolation as np.percentile and Series.quantile on the
+    expanded data.
+    """
+    order = np.argsort(values, kind='stable')
+    values = np.asarray(values, dtype=float)[order]
+    cum_counts = np.cumsum(np.asarray(counts)[order])
+    pos = q * (cum_counts[-1] - 1)
+    lo, hi = int(np.floor(pos)), int(np.ceil(pos))
+    v_lo = _value_at(values, cum_counts, lo)
+    v_hi = _value_at(values, cum_counts, hi)
+    return v_lo + (v_hi - v_lo) * (pos - lo)
+
+
+class Summary:
+    """
+    Counts and sums of the cleaned data by (darkSkin, skinToneCategory,
+    skinTone, redCards), with the statistics derived from them.
+
+    ``table`` has one row per observed key combination and the columns
+    ``n`` (dyads) and ``games`` (games summed over those dyads).
+    """
+
+    def __init__(self, table, n_players, categories):
+        self.table = table
+        self.n_players = n_players
+        self.categories = categories
+
+    @property
+    def n(self):
+        return int(self.table['n'].sum())
+
+    def skin_tone_counts(self):
+        """Number of dyads for each distinct skin tone value."""
+        return self.table.groupby('skinTone')['n'].sum()
+
+    def skin_tone_stats(self):
+        """Mean, median, standard deviation, minimum and maximum skin tone."""
+        counts = self.skin_tone_counts()
+        values = counts.index.to_numpy(dtype=float)
+        w = counts.to_numpy(dtype=float)
+        mean = np.sum(w * values) / w.sum()
+        var = np.sum(w * (values - mean) ** 2) / (w.sum() - 1)
+        return {'mean': mean,
+                'median': weighted_quantile(values, w, 0.5),
+                'std': np.sqrt(var),
+                'min': values.min(),
+                'max': values.max()}
+
+    def category_counts(self):
+        """Dyads per skin tone category, like value_counts().sort_index()."""
+        counts = self.table.groupby('skinToneCategory', observed=False)['n'].sum()
+        counts = counts.reindex(self.categories, fill_value=0).astype('int64')
+        counts.index.name = 'skinToneCategory'
+        return counts.rename('count')
+
+    def category_stats(self):
+        """
+        Red card count, sum and mean and games played by skin tone category,
+        laid out like ``groupby('skinToneCategory').agg(...)`` on the data.
+        """
+        t = self.table.assign(red=self.table['redCards'] * self.table['n'])
+        g = t.groupby('skinToneCategory', observed=True)[['n', 'red', 'games']].sum()
+        out = pd.DataFrame({
+            ('redCards', 'count'): g['n'],
+            ('redCards', 'sum'): g['red'],
+            ('redCards', 'mean'): g['red'] / g['n'],
+            ('games', 'sum'): g['games'],
+        })
+        out.columns = pd.MultiIndex.from_tuples(out.columns)
+        return out
+
+    def red_card_counts(self, dark=None):
+        """
+        Dyads for each number of red cards, for all dyads or for light
+        (``dark=0``) or dark (``dark=1``) skin only.
+        """
+        t = self.table if dark is None else self.table[self.table['darkSkin'] == dark]
+        return t.groupby('redCards')['n'].sum()
+
+    def red_card_stats(self):
+        """Totals of redCards over all dyads."""
+        counts = self.red_card_counts()
+        red = counts.index.to_numpy()
+        n = counts.to_numpy()
+        return {'total': int(np.sum(red * n)),
+                'any': int(n[red > 0].sum()),
+                'mean': np.sum(red * n) / n.sum(),
+                'max': red.max()}
+
+    def groups(self):
+        """
+        Light/dark skin comparison: dyads, red cards, games, dyads with a red
+        card, and the mean, any-red-card rate and red cards per game.
+        """
+        t = self.table.assign(red=self.table['redCards'] * self.table['n'],
+                              any_red=(self.table['redCards'] > 0) * self.table['n'])
+        g = t.groupby('darkSkin')[['n', 'red', 'games', 'any_red']].sum()
+        g = g.reindex(list(GROUP_LABELS), fill_value=0).rename(index=GROUP_LABELS)
+        g['mean'] = g['red'] / g['n']
+        g['any_rate'] = g['any_red'] / g['n']
+        g['per_game'] = g['red'] / g['games']
+        return g
+
+    def group(self, label):
+        """One row of groups() (``'light'`` or ``'dark'``) as a dict."""
+        row = self.groups().loc[label]
+        counts = {k: int(row[k]) for k in ('n', 'red', 'games', 'any_red')}
+        return dict(row.to_dict(), **counts)
+
+    def contingency(self):
+        """darkSkin x (redCards > 0) counts, as pd.crosstab on the data."""
+        t = self.table.assign(anyRed=self.table['redCards'] > 0)
+        table = t.pivot_table(index='darkSkin', columns='anyRed', values='n',
+                              aggfunc='sum', fill_value=0)
+        table.columns.name = 'redCards'
+        return table
+
+    def mann_whitney(self):
+        """
+        Two-sided Mann-Whitney U test of redCards, light vs dark skin.
+
+        Returns ``(U, p)`` with U for the light skin sample, as
+        scipy.stats.mannwhitneyu(light, dark). Ranks are computed per
+        distinct value from the counts; the p-value is scipy's asymptotic
+        one with tie and continuity corrections, which is what scipy uses
+        whenever the data have ties.
+        """
+        light = self.red_card_counts(dark=0)
+        dark = self.red_card_counts(dark=1)
+        both = light.add(dark, fill_value=0).sort_index()
+        light = light.reindex(both.index, fill_value=0).to_numpy(dtype=float)
+        t = both.to_numpy(dtype=float)
+        n1, n2 = light.sum(), t.sum() - light.sum()
+        n = n1 + n2
+
+        # Midrank of each distinct value in the pooled sample
+        ranks = np.cumsum(t) - (t - 1) / 2
+        u1 = np.sum(light * ranks) - n1 * (n1 + 1) / 2
+        u = max(u1, n1 * n2 - u1)
+
+        tie_term = np.sum(t ** 3 - t)
+        s = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+        z = (u - n1 * n2 / 2 - 0.5) / s
+        # 2 * Phi(-z); math.erfc spares the load and eda stages scipy.special
+        return u1, float(np.clip(math.erfc(z / math.sqrt(2)), 0, 1))
+
+    def box_stats(self, dark, whis=1.5):
+        """
+        Box plot statistics of redCards for light (0) or dark (1) skin, in
+        the form Axes.bxp takes; the same numbers matplotlib's boxplot
+        computes from the raw values.
+        """
+        counts = self.red_card_counts(dark=dark)
+        values = counts.index.to_numpy(dtype=float)
+        n = counts.to_numpy(dtype=float)
+        q1, med, q3 = (weighted_quantile(values, n, q) for q in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        inside = values[(values >= q1 - whis * iqr) & (values <= q3 + whis * iqr)]
+        whislo = inside.min() if inside.size else q1
+        whishi = inside.max() if inside.size else q3
+        total = n.sum()
+        return {'med': med, 'q1': q1, 'q3': q3,
+                'whislo': whislo, 'whishi': whishi,
+                'fliers': values[(values < whislo) | (values > whishi)],
+                'mean': np.sum(values * n) / total,
+                'iqr': iqr,
+                'cilo': med - 1.57 * iqr / np.sqrt(total),
+                'cihi': med + 1.57 * iqr / np.sqrt(total)}
+
+    def points(self):
+        """
+        ``(skinTone, redCards)`` of every dyad, expanded from the counts.
+
+        The rows come out sorted by key rather than in file order.
+        """
+        n = self.table['n'].to_numpy()
+        return (np.repeat(self.table['skinTone'].to_numpy(dtype=float), n),
+                np.repeat(self.table['redCards'].to_numpy(dtype=float), n))
+
+    def trend(self):
+        """Least-squares line redCards ~ skinTone, as np.polyfit on every dyad."""
+        t = self.table
+        return np.polyfit(t['skinTone'].to_numpy(dtype=float),
+                          t['redCards'].to_numpy(dtype=float), 1,
+                          w=np.sqrt(t['n'].to_numpy(dtype=float)))
@@ -0,0 +1,150 @@
+"""
+The frequency-weighted Poisson and Negative Binomial models of compressed.py.
+
+Row i of the design stands for ``freq_weights[i]`` identical rows, so the
+log-likelihood, score and Hessian are the full-data ones, and so are the
+observation counts: ``nobs`` is the sum of the weights and ``df_resid`` is
+counted from it, as with the freq_weights of statsmodels' GLM.
+"""
+
+import numpy as np
+import statsmodels.api as sm
+from scipy.special import digamma, polygamma
+
+
+class _FrequencyWeighted:
+    """Observation counts of a model whose rows carry ``freq_weights``."""
+
+    def initialize(self):
+        super().initialize()
+        nobs = self.freq_weights.sum()
+        self.df_resid += nobs - self.exog.shape[0]
+        self.nobs = nobs
+
+    def fit(self, *args, **kwargs):
+        result = super().fit(*args, **kwargs)
+        # DiscreteResults counts the rows of exog instead of asking the model.
+        # llnull sizes its constant-only design by nobs, so it is computed
+        # (and cached) before nobs is replaced. A constant-only model is its
+        # own null model; refitting it here would recurse.
+        if self.exog.shape[1] == 1 and np.all(self.exog == 1):
+            result._results._cache['llnull'] = result.llf
+        else:
+            result.llnull
+        result._results.nobs = self.nobs
+        result._results.df_resid = self.df_resid
+        return result
+
+
+class WeightedPoisson(_FrequencyWeighted, sm.Poisson):
+    """Poisson regression where row i stands for ``freq_weights[i]`` rows."""
+
+    def __init__(self, endog, exog, freq_weights, **kwargs):
+        self.freq_weights = np.asarray(freq_weights, dtype=float)
+        super().__init__(endog, exog, **kwargs)
+        self._init_keys.append('freq_weights')
+
+    def loglikeobs(self, params):
+        return self.freq_weights * super().loglikeobs(params)
+
+    def loglike(self, params):
+        return np.sum(self.loglikeobs(params))
+
+    def score_obs(self, params):
+        return self.freq_weights[:, None] * super().score_obs(params)
+
+    def score(self, params):
+        mu = self.predict(params)
+        return np.dot(self.freq_weights * (self.endog - mu), self.exog)
+
+    def hessian(self, params):
+        mu = self.predict(params)
+        return -np.dot(self.freq_weights * mu * self.exog.T, self.exog)
+
+    def _get_start_params_null(self):
+        return _weighted_null_start(self)[:1]
+
+
+class WeightedNegativeBinomial(_FrequencyWeighted, sm.NegativeBinomial):
+    """NB2 regression where row i stands for ``freq_weights[i]`` rows."""
+
+    def __init__(self, endog, exog, freq_weights, loglike_method='nb2',
+                 **kwargs):
+        if loglike_method != 'nb2':
+            raise ValueError("WeightedNegativeBinomial supports only 'nb2'")
+        self.freq_weights = np.asarray(freq_weights, dtype=float)
+        super().__init__(endog, exog, loglike_method='nb2', **kwargs)
+        self._init_keys.append('freq_weights')
+
+    def _initialize(self):
+        super()._initialize()
+        self.loglikeobs = self._ll_nb2_weighted
+        self.score = self._score_nb2_weighted
+        self.hessian = self._hessian_nb2_weighted
+
+    def _get_start_params_null(self):
+        return _weighted_null_start(self)
+
+    def _alpha(self, params):
+        # During fit with a gradient-only optimizer the last parameter is
+        # log(alpha); see NegativeBinomial.fit.
+        return np.exp(params[-1]) if self._transparams else params[-1]
+
+    def _ll_nb2_weighted(self, params):
+        return self.freq_weights * self._ll_nb2(params)
+
+    def _score_nb2_weighted(self, params):
+        alpha = self._alpha(params)
+        a1 = 1 / alpha
+        w = self.freq_weights
+        y = self.endog
+        mu = self.predict(params[:-1])
+
+        dparams = np.dot(w * a1 * (y - mu) / (mu + a1), self.exog)
+        dalpha = -(alpha ** -2) * np.sum(
+            w * (digamma(y + a1) - digamma(a1) + np.log(a1) - np.log(a1 + mu)
+                 - (y - mu) / (a1 + mu)))
+        if self._transparams:
+            return np.r_[dparams, dalpha * alpha]
+        return np.r_[dparams, dalpha]
+
+    def _hessian_nb2_weighted(self, params):
+        # Same terms as NegativeBinomial._hessian_nb2, each summed with weights
+        alpha = self._alpha(params)
+        a1 = 1 / alpha
+        w = self.freq_weights
+        exog = self.exog
+        y = self.endog
+        mu = self.predict(params[:-1])
+        prob = a1 / (a1 + mu)
+        dgpart = digamma(a1 + y) - digamma(a1)
+
+        dim = exog.shape[1]
+        hess_arr = np.empty((dim + 1, dim + 1))
+        const_arr = a1 * mu * (a1 + y) / (mu + a1) ** 2
+        hess_arr[:-1, :-1] = -np.dot(w * const_arr * exog.T, exog)
+
+        dldpda = -np.dot(w * mu * (y - mu) * a1 ** 2 / (mu + a1) ** 2, exog)
+        hess_arr[-1, :-1] = dldpda
+        hess_arr[:-1, -1] = dldpda
+
+        da1 = -(alpha ** -2)
+        da2 = 2 * alpha ** -3
+        dalpha = da1 * (dgpart + np.log(prob) - (y - mu) / (a1 + mu))
+        dada = (da2 * dalpha / da1
+                + da1 ** 2 * (polygamma(1, a1 + y) - polygamma(1, a1)
+                              + 1 / a1 - 1 / (a1 + mu)
+                              + (y - mu) / (mu + a1) ** 2))
+        hess_arr[-1, -1] = np.sum(w * dada)
+        return hess_arr
+
+
+def _weighted_null_start(model):
+    """Weighted version of NegativeBinomial._get_start_params_null."""
+    w = model.freq_weights
+    exposure = np.exp(getattr(model, 'offset', 0) + getattr(model, 'exposure', 0))
+    const = np.sum(w * model.endog / exposure) / w.sum()
+    mu = const * exposure
+    resid = model.endog - mu
+    alpha = np.sum(w * (resid ** 2 / mu - 1) / mu) / (w.sum() - 1)
+    return np.array([np.log(const), alpha])
@@ -0,0 +1,46 @@
+"""Shared fixtures: synthetic datasets written once per test session."""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import synthetic  # noqa: E402
+
+
+def pytest_addoption(parser):
+    parser.addoption('--runslow', action='store_true',
+                     help="also run the tests marked slow (large synthetic datasets)")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "slow: large synthetic datasets; run with --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--runslow'):
+        return
+    skip = pytest.mark.skip(reason="slow; run with --runslow")
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='session')
+def synthetic_csv(tmp_path_factory):
+    """Return a function writing (once) the synthetic CSV for a scale and seed."""
+    base = tmp_path_factory.mktemp('data')
+    written = {}
+
+    def make(scale, seed=0):
+        path = str(base / f'synthetic-x{scale}-seed{seed}.csv')
+        if path not in written:
+            synthetic.write_csv(path, scale=scale, seed=seed)
+            written[path] = True
+        return path
+
+    return make
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from team30 import bootstrap, data
+
+
+@pytest.fixture(scope='module')
+def dyads(synthetic_csv):
+    df = data.clean(pd.read_csv(synthetic_csv(0.2)))
+    return df[['redCards', 'skinTone', 'games', 'playerShort', 'refNum']].dropna()
+
+
+@pytest.fixture(scope='module')
+def cdata(dyads):
+    return bootstrap.build_cluster_data(dyads, cluster='playerShort', cluster2='refNum')
+
+
+@pytest.fixture(scope='module')
+def groups(dyads):
+    return np.column_stack([pd.factorize(dyads['playerShort'])[0],
+                            pd.factorize(dyads['refNum'])[0]])
+
+
+def _statsmodels_cov(dyads, groups):
+    model = sm.Poisson(dyads['redCards'].to_numpy(dtype=float),
+                       sm.add_constant(dyads[bootstrap.COVARIATES].to_numpy(dtype=float)))
+    return model.fit(method='newton', tol=1e-12, disp=0, cov_type='cluster',
+                     cov_kwds={'groups': groups})
+
+
+def test_fit_poisson_matches_statsmodels(dyads, groups, cdata):
+    ref = _statsmodels_cov(dyads, groups[:, 0])
+    np.testing.assert_allclose(bootstrap.fit_poisson(cdata), ref.params, rtol=1e-9)
+
+
+def test_one_way_cov_matches_statsmodels(dyads, groups, cdata):
+    ref = _statsmodels_cov(dyads, groups[:, 0])
+    np.testing.assert_allclose(bootstrap.cluster_robust_cov(cdata, ref.params),
+                               ref.cov_params(), rtol=1e-9)
+
+
+def test_two_way_cov_matches_statsmodels(dyads, groups, cdata):
+    ref = _statsmodels_cov(dyads, groups)
+    np.testing.assert_allclose(bootstrap.cluster_robust_cov(cdata, ref.params, two_way=True),
+                               ref.cov_params(), rtol=1e-9)
+
+
+@pytest.mark.parametrize('two_way', [False, True])
+def test_bootstrap_depends_only_on_seed(cdata, two_way):
+    kwargs = dict(n_boot=120, two_way=two_way, batch_size=50)
+    serial = bootstrap.cluster_bootstrap(cdata, seed=7, n_jobs=1, **kwargs)
+    pooled = bootstrap.cluster_bootstrap(cdata, seed=7, n_jobs=2, **kwargs)
+    np.testing.assert_array_equal(serial['replicates'], pooled['replicates'])
+    pd.testing.assert_frame_equal(serial['summary'], pooled['summary'])
+    assert serial['n_converged'] == 120
+
+    other = bootstrap.cluster_bootstrap(cdata, seed=8, n_jobs=1, **kwargs)
+    assert not np.array_equal(serial['replicates'], other['replicates'])
+
+
+def test_unconverged_replicates_are_excluded(cdata, monkeypatch):
+    newton = bootstrap.poisson_newton_batch
+
+    def first_fails(*args, **kwargs):
+        beta, converged = newton(*args, **kwargs)
+        converged = converged.copy()
+        converged[0] = False
+        return beta, converged
+
+    monkeypatch.setattr(bootstrap, 'poisson_newton_batch', first_fails)
+    boot = bootstrap.cluster_bootstrap(cdata, n_boot=100, seed=0, n_jobs=1, batch_size=50)
+    assert boot['n_converged'] == 98
+    failed = np.isnan(boot['replicates']).all(axis=1)
+    assert np.flatnonzero(failed).tolist() == [0, 50]
+    kept = boot['replicates'][~failed]
+    np.testing.assert_allclose(boot['summary']['boot_se'], kept.std(axis=0, ddof=1))
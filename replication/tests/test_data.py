@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from team30 import data
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'npz'])
+def test_cached_counts_match_csv(synthetic_csv, tmp_path, monkeypatch, fmt):
+    if fmt == 'parquet':
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(data, 'cache_format', lambda: fmt)
+    path = synthetic_csv(0.05)
+    expected = data.clean(pd.read_csv(path))
+    data.load_cleaned(path, cache_dir=str(tmp_path))
+    cached, meta = data.load_cleaned(path, ['games', 'redCards', 'yellowCards'],
+                                     cache_dir=str(tmp_path))
+    assert meta['source'] == 'cache'
+    for col in cached.columns:
+        assert cached[col].dtype.itemsize >= 4
+        np.testing.assert_array_equal(cached[col], expected[col])
+    np.testing.assert_array_equal(np.log(cached['games']), np.log(expected['games']))
+    assert np.log(cached['games']).dtype == np.float64
+
+
+def test_to_columnar_keeps_wide_integers():
+    df = pd.DataFrame({'games': np.array([1, 2], dtype=np.int64),
+                       'big': np.array([0, 2**40], dtype=np.int64)})
+    out = data.to_columnar(df)
+    assert out['games'].dtype == np.int32
+    assert out['big'].dtype == np.int64
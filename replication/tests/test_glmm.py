@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+
+from team30 import glmm, glmsolver
+
+BETA = np.array([-1.5, 0.3, 0.1])
+
+
+def simulate(n_players, n_refs, n, sd_player, sd_ref, beta=BETA, seed=0):
+    """Crossed random-intercept Poisson dyads with known parameters."""
+    rng = np.random.default_rng(seed)
+    player = rng.integers(0, n_players, n)
+    ref = rng.integers(0, n_refs, n)
+    skin = rng.choice([0, 0.25, 0.5, 0.75, 1], n_players)[player]
+    games = rng.integers(1, 6, n)
+    eta = (beta[0] + beta[1] * skin + beta[2] * games
+           + rng.normal(0, sd_player, n_players)[player]
+           + rng.normal(0, sd_ref, n_refs)[ref])
+    return pd.DataFrame({'redCards': rng.poisson(np.exp(eta)), 'skinTone': skin,
+                         'games': games, 'playerShort': player, 'refNum': ref})
+
+
+@pytest.mark.parametrize('beta, sd_tol', [
+    # About one event per dyad: beta and both s.d.s are recovered
+    (BETA, 0.1),
+    # Rare events, as red cards: mean-field VB shrinks the s.d.s somewhat
+    (np.array([-4.5, 0.3, 0.1]), 0.2),
+])
+def test_fit_recovers_simulated_parameters(beta, sd_tol):
+    sd = {'playerShort': 0.8, 'refNum': 0.6}
+    df = simulate(300, 200, 30_000, sd['playerShort'], sd['refNum'], beta)
+    result = glmm.fit(glmm.build_design(df))
+
+    assert result['converged']
+    table = result['table']
+    # Every fixed effect within three of its standard errors of the truth
+    z = (table['coef'].to_numpy() - beta) / table['std err'].to_numpy()
+    assert np.all(np.abs(z) < 3), z
+    for group, true_sd in sd.items():
+        assert result['sd'][group] == pytest.approx(true_sd, rel=sd_tol)
+
+
+def test_fit_without_group_variance_is_the_pooled_poisson():
+    design = glmm.build_design(simulate(300, 200, 30_000, 0, 0))
+    result = glmm.fit(design)
+    pooled = glmsolver.fit('poisson', design['y'], design['X'])
+
+    assert (result['sd'] < 0.1).all()
+    table = result['table']
+    # The s.d.s that remain only move the estimates by a fraction of their error
+    assert np.all(np.abs(table['coef'].to_numpy() - pooled.params) < 0.1 * pooled.bse)
+    np.testing.assert_allclose(table['std err'], pooled.bse, rtol=0.1)
+
+
+def test_fixed_effect_cov_matches_dense_schur_complement():
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({'redCards': rng.poisson(0.3, n),
+                       'skinTone': rng.choice([0, 0.25, 0.5, 0.75, 1], n),
+                       'games': rng.integers(1, 10, n),
+                       'playerShort': rng.integers(0, 40, n),
+                       'refNum': rng.integers(0, 25, n)})
+    design = glmm.build_design(df)
+    e = rng.uniform(0.1, 2, n)
+    variances = [0.3, 0.7]
+
+    X = design['X']
+    Z = sp.hstack(design['Z']).toarray()
+    D = np.diag(np.concatenate([np.full(Zb.shape[1], 1 / v)
+                                for Zb, v in zip(design['Z'], variances)]))
+    XtWZ = X.T @ (e[:, None] * Z)
+    schur = X.T @ (e[:, None] * X) - XtWZ @ np.linalg.solve(Z.T @ (e[:, None] * Z) + D,
+                                                           XtWZ.T)
+    np.testing.assert_allclose(glmm.fixed_effect_cov(design, e, variances),
+                               np.linalg.inv(schur), rtol=1e-7)
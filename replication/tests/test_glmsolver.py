@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+from statsmodels.discrete.count_model import ZeroInflatedPoisson
+from statsmodels.tools.numdiff import approx_hess
+
+from team30 import glmsolver
+
+N = 3_000
+
+
+@pytest.fixture(scope='module')
+def counts():
+    """Overdispersed, zero-inflated counts with a games exposure."""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({'const': 1.0,
+                      'skinTone': rng.choice([0, 0.25, 0.5, 0.75, 1], N),
+                      'height': rng.normal(0, 1, N)})
+    games = rng.integers(1, 12, N).astype(float)
+    mu = games * np.exp(X.to_numpy() @ [-1.5, 0.3, -0.2]) * rng.gamma(2, 0.5, N)
+    y = rng.poisson(mu) * (rng.random(N) > 0.15)
+    return y.astype(float), X, games
+
+
+def _statsmodels(family, y, X, **kwargs):
+    if family == 'poisson':
+        return sm.Poisson(y, X, **kwargs).fit(method='newton', tol=1e-12, disp=0)
+    if family == 'negbin':
+        return sm.NegativeBinomial(y, X, loglike_method='nb2', **kwargs).fit(
+            method='newton', tol=1e-12, maxiter=200, disp=0)
+    return ZeroInflatedPoisson(y, X, **kwargs).fit(
+        method='newton', tol=1e-12, maxiter=200, disp=0)
+
+
+@pytest.mark.parametrize('family', glmsolver.FAMILIES)
+@pytest.mark.parametrize('scale', ['none', 'offset', 'exposure'])
+def test_matches_statsmodels(counts, family, scale):
+    y, X, games = counts
+    kwargs = {'none': {}, 'offset': {'offset': np.log(games)},
+              'exposure': {'exposure': games}}[scale]
+    ref = _statsmodels(family, y, X, **kwargs)
+    ours = glmsolver.fit(family, y, X, **kwargs)
+
+    assert ours.converged
+    assert ours.names == list(ref.params.index)
+    np.testing.assert_allclose(ours.params, ref.params, rtol=1e-6, atol=1e-7)
+    assert ours.llf == pytest.approx(ref.llf, rel=1e-10)
+    assert ours.nobs == N
+    if family == 'zip':
+        # statsmodels' analytic ZIP Hessian is approximate; check against a
+        # numerical one instead
+        hess = approx_hess(ours.params, ref.model.loglike)
+        np.testing.assert_allclose(ours.bse, np.sqrt(np.diag(np.linalg.inv(-hess))),
+                                   rtol=1e-4)
+    else:
+        np.testing.assert_allclose(ours.bse, ref.bse, rtol=1e-6)
+
+
+@pytest.mark.parametrize('family', glmsolver.FAMILIES)
+def test_frequency_weights_match_repeated_rows(counts, family):
+    y, X, games = counts
+    rng = np.random.default_rng(1)
+    weights = rng.integers(1, 4, N)
+    repeated = np.repeat(np.arange(N), weights)
+    expanded = glmsolver.fit(family, y[repeated], X.iloc[repeated],
+                             exposure=games[repeated])
+    weighted = glmsolver.fit(family, y, X, exposure=games, weights=weights)
+
+    np.testing.assert_allclose(weighted.params, expanded.params, rtol=1e-8, atol=1e-10)
+    np.testing.assert_allclose(weighted.bse, expanded.bse, rtol=1e-8)
+    assert weighted.llf == pytest.approx(expanded.llf, rel=1e-12)
+    assert weighted.nobs == expanded.nobs == weights.sum()
+
+
+@pytest.mark.parametrize('family', glmsolver.FAMILIES)
+def test_batch_matches_single_fits(counts, family):
+    y, X, games = counts
+    rng = np.random.default_rng(2)
+    # Bootstrap-style replicates: one weight vector per fit
+    weights = rng.multinomial(N, np.full(N, 1 / N), size=4)
+    batch = glmsolver.fit(family, y, X, exposure=games, weights=weights)
+    assert batch.params.shape == (4, len(batch.names))
+
+    for b in range(len(weights)):
+        single = glmsolver.fit(family, y, X, exposure=games, weights=weights[b])
+        np.testing.assert_allclose(batch.params[b], single.params, rtol=1e-8, atol=1e-10)
+        np.testing.assert_allclose(batch.bse[b], single.bse, rtol=1e-8)
+        assert batch.llf[b] == pytest.approx(single.llf, rel=1e-12)
+        assert batch.converged[b] == single.converged
+
+
+def test_batch_of_outcomes_matches_single_fits(counts):
+    y, X, games = counts
+    rng = np.random.default_rng(3)
+    Y = np.stack([y, rng.permutation(y), rng.poisson(games * 0.1)])
+    batch = glmsolver.fit('poisson', Y, X, exposure=games)
+    for b, yb in enumerate(Y):
+        single = glmsolver.fit('poisson', yb, X, exposure=games)
+        np.testing.assert_allclose(batch.params[b], single.params, rtol=1e-8, atol=1e-10)
+        assert batch.llf[b] == pytest.approx(single.llf, rel=1e-12)
@@ -0,0 +1,136 @@
+"""The group index against pandas groupby and boolean masks on the cleaned data."""
+
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.run import load_pipeline
+from team30 import data, groupindex
+from team30.summary import summarize
+
+pipeline = load_pipeline()
+
+SCALE = 0.2
+
+
+@pytest.fixture(scope='module')
+def df(synthetic_csv, tmp_path_factory):
+    frame, _ = data.load_cleaned(synthetic_csv(SCALE), columns=pipeline.ANALYSIS_COLUMNS,
+                                 cache_dir=str(tmp_path_factory.mktemp('cache')))
+    return frame
+
+
+@pytest.fixture(scope='module')
+def index(df):
+    return groupindex.GroupIndex(df)
+
+
+def expected_totals(rows):
+    return {'n': len(rows), 'red': int(rows['redCards'].sum()),
+            'games': int(rows['games'].sum()), 'any_red': int((rows['redCards'] > 0).sum())}
+
+
+def assert_totals(totals, rows):
+    expected = expected_totals(rows)
+    assert {k: totals[k] for k in groupindex.TOTALS} == expected
+    assert totals['mean'] == pytest.approx(expected['red'] / expected['n'])
+    assert totals['any_rate'] == pytest.approx(expected['any_red'] / expected['n'])
+    assert totals['per_game'] == pytest.approx(expected['red'] / expected['games'])
+
+
+def quartiles(df, column='meanIAT'):
+    return pd.qcut(df[column], 4, labels=False) + 1
+
+
+@pytest.mark.parametrize('dimension', ['playerShort', 'refNum', 'refCountry', 'leagueCountry',
+                                       'position', 'skinToneCategory', 'darkSkin', 'meanIAT'])
+def test_table_matches_groupby(df, index, dimension):
+    keys = quartiles(df) if dimension == 'meanIAT' else df[dimension]
+    t = df.assign(any_red=df['redCards'] > 0)
+    expected = t.groupby(keys, observed=True).agg(
+        n=('redCards', 'size'), red=('redCards', 'sum'), games=('games', 'sum'),
+        any_red=('any_red', 'sum'))
+    table = index.table(dimension)
+    np.testing.assert_array_equal(np.asarray(table.index), np.asarray(expected.index))
+    for column in groupindex.TOTALS:
+        np.testing.assert_array_equal(table[column].to_numpy(), expected[column].to_numpy())
+    np.testing.assert_allclose(table['per_game'], expected['red'] / expected['games'])
+
+
+def test_missing_values_are_in_no_group(df, index):
+    assert df['position'].isna().any()
+    assert index.table('position')['n'].sum() == df['position'].notna().sum()
+    assert (index.codes['position'][df['position'].isna().to_numpy()] == -1).all()
+
+
+@pytest.mark.parametrize('selection', [
+    {'leagueCountry': 'England'},
+    {'position': ['Goalkeeper', 'Center Back']},
+    {'darkSkin': 1, 'meanIAT': 4},
+    {'leagueCountry': ['Spain', 'France'], 'position': 'Goalkeeper', 'darkSkin': 0},
+    {'skinToneCategory': 'Very Dark', 'refCountry': 'first five'},
+])
+def test_select_and_totals_match_masks(df, index, selection):
+    if selection.get('refCountry') == 'first five':
+        selection = dict(selection, refCountry=list(index.levels['refCountry'][:5]))
+    mask = np.ones(len(df), dtype=bool)
+    for dimension, values in selection.items():
+        column = quartiles(df) if dimension == 'meanIAT' else df[dimension]
+        mask &= column.isin(np.atleast_1d(values)).to_numpy()
+    rows = index.select(selection)
+    np.testing.assert_array_equal(rows, np.flatnonzero(mask))
+    assert_totals(index.totals(selection), df[mask])
+
+
+def test_totals_of_everything(df, index):
+    assert_totals(index.totals(), df)
+    np.testing.assert_array_equal(index.select({}), np.arange(len(df)))
+
+
+def test_group_rows(df, index):
+    player = df['playerShort'].iloc[0]
+    np.testing.assert_array_equal(index.group_rows('playerShort', player),
+                                  np.flatnonzero(df['playerShort'] == player))
+
+
+def test_compare_matches_masks(df, index):
+    dark = (df['darkSkin'] == 1) & (df['leagueCountry'] == 'Germany')
+    light = (df['darkSkin'] == 0) & (df['leagueCountry'] == 'Germany')
+    result = index.compare({'darkSkin': 1, 'leagueCountry': 'Germany'},
+                           {'darkSkin': 0, 'leagueCountry': 'Germany'})
+    assert_totals(result['group'], df[dark])
+    assert_totals(result['reference'], df[light])
+    g, r = expected_totals(df[dark]), expected_totals(df[light])
+    ratio = (g['red'] / g['games']) / (r['red'] / r['games'])
+    assert result['rate_ratio'] == pytest.approx(ratio)
+    assert result['mean_ratio'] == pytest.approx((g['red'] / g['n']) / (r['red'] / r['n']))
+    se = np.sqrt(1 / g['red'] + 1 / r['red'])
+    assert result['rate_ratio_low'] == pytest.approx(ratio * np.exp(-1.959964 * se))
+    assert result['rate_ratio_high'] == pytest.approx(ratio * np.exp(1.959964 * se))
+
+    # Without a reference: every dyad outside the selection
+    result = index.compare({'darkSkin': 1, 'leagueCountry': 'Germany'})
+    assert_totals(result['reference'], df[~dark])
+
+
+def test_unknown_group_or_dimension(index):
+    with pytest.raises(KeyError):
+        index.totals({'leagueCountry': 'Narnia'})
+    with pytest.raises(KeyError):
+        index.select({'height': 180})
+
+
+def test_eda_reads_the_same_figures_from_the_index(df, index):
+    summary = summarize(df)
+    plain, indexed = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(plain):
+        pipeline.exploratory_analysis(summary)
+    with contextlib.redirect_stdout(indexed):
+        pipeline.exploratory_analysis(summary, index=index)
+    plain, indexed = plain.getvalue(), indexed.getvalue()
+    assert indexed.startswith(plain)
+    assert "7. RED CARDS BY SUBGROUP" in indexed[len(plain):]
+    assert "7. RED CARDS BY SUBGROUP" not in plain
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from team30 import incremental, streaming
+
+CHUNK_SIZE = 5_000
+
+
+@pytest.fixture(scope='module')
+def split(synthetic_csv):
+    """The dyads split so that the second part brings new players and referees."""
+    raw = pd.read_csv(synthetic_csv(0.2))
+    players = raw['playerShort'].unique()
+    refs = raw['refNum'].unique()
+    later = (raw['playerShort'].isin(players[-len(players) // 5:])
+             | raw['refNum'].isin(refs[-len(refs) // 5:]))
+    return raw[~later], raw[later]
+
+
+@pytest.fixture(scope='module')
+def full_scan(split, tmp_path_factory):
+    path = tmp_path_factory.mktemp('full') / 'all.csv'
+    pd.concat(split).to_csv(path, index=False)
+    return streaming.scan(str(path), chunk_size=CHUNK_SIZE, cache_dir=None)
+
+
+def _assert_matches_scan(state, full_scan):
+    summ, patterns, meta = full_scan
+    pd.testing.assert_frame_equal(state.table, summ.table, check_dtype=False,
+                                  check_exact=True)
+    pd.testing.assert_frame_equal(state.patterns, patterns, check_dtype=False,
+                                  check_exact=True)
+    assert len(state.players) == summ.n_players
+    assert state.n == summ.n == meta['clean_shape'][0]
+    ours = state.summary()
+    np.testing.assert_array_equal(ours.contingency(), summ.contingency())
+    assert ours.mann_whitney() == summ.mann_whitney()
+    pd.testing.assert_frame_equal(ours.category_stats(), summ.category_stats(),
+                                  check_dtype=False, check_exact=True)
+
+
+def test_split_has_new_players_and_referees(split):
+    base, batch = split
+    assert not batch['playerShort'].isin(base['playerShort']).all()
+    assert not batch['refNum'].isin(base['refNum']).all()
+    assert batch['playerShort'].isin(base['playerShort']).any()
+
+
+def test_ingest_new_file_matches_full_scan(split, full_scan, tmp_path):
+    base, batch = split
+    base.to_csv(tmp_path / 'base.csv', index=False)
+    batch.to_csv(tmp_path / 'batch.csv', index=False)
+    state_dir = str(tmp_path / 'state')
+
+    incremental.ingest([str(tmp_path / 'base.csv')], state_dir, chunk_size=CHUNK_SIZE)
+    state, added = incremental.ingest([str(tmp_path / 'base.csv'),
+                                       str(tmp_path / 'batch.csv')],
+                                      state_dir, chunk_size=CHUNK_SIZE)
+    assert [record['rows'] for record in added] == [len(batch)]
+    _assert_matches_scan(state, full_scan)
+    _assert_matches_scan(incremental.load_state(state_dir), full_scan)
+
+
+def test_ingest_appended_rows_matches_full_scan(split, full_scan, tmp_path):
+    base, batch = split
+    path = tmp_path / 'dyads.csv'
+    base.to_csv(path, index=False)
+    state_dir = str(tmp_path / 'state')
+
+    incremental.ingest([str(path)], state_dir, chunk_size=CHUNK_SIZE)
+    size = path.stat().st_size
+    batch.to_csv(path, mode='a', header=False, index=False)
+    state, added = incremental.ingest([str(path)], state_dir, chunk_size=CHUNK_SIZE)
+
+    assert len(added) == 1
+    assert added[0]['offset'] == size
+    assert added[0]['rows'] == len(batch)
+    _assert_matches_scan(state, full_scan)
+
+    # Nothing new: a further ingest reads nothing and leaves the state alone
+    state, added = incremental.ingest([str(path)], state_dir, chunk_size=CHUNK_SIZE)
+    assert added == []
+    _assert_matches_scan(state, full_scan)
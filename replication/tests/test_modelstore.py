@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tools import add_constant
+
+from team30 import compressed, data, modelstore
+
+
+@pytest.fixture(scope='module')
+def patterns(synthetic_csv):
+    df = data.clean(pd.read_csv(synthetic_csv(0.2)))
+    return compressed.compress_patterns(df, ['skinTone', 'games'])
+
+
+def _design(patterns):
+    return patterns['redCards'], add_constant(patterns[['skinTone', 'games']]), patterns['count']
+
+
+def test_fingerprint_covers_every_input(patterns):
+    y, X, w = _design(patterns)
+    names = list(X.columns)
+    base = modelstore.data_fingerprint(y, X, w, names)
+    assert modelstore.data_fingerprint(y.copy(), X.copy(), w.copy(), names) == base
+    changed = [
+        modelstore.data_fingerprint(y + 1, X, w, names),
+        modelstore.data_fingerprint(y, X.assign(games=X['games'] + 1), w, names),
+        modelstore.data_fingerprint(y, X, w + 1, names),
+        modelstore.data_fingerprint(y, X, None, names),
+        modelstore.data_fingerprint(y, X, w, ['const', 'skin', 'games']),
+    ]
+    assert len(set(changed + [base])) == len(changed) + 1
+
+    key = modelstore.spec_key(base, 'poisson', {'method': 'newton'})
+    assert modelstore.spec_key(base, 'poisson', {'method': 'newton'}) == key
+    assert modelstore.spec_key(base, 'negbin', {'method': 'newton'}) != key
+    assert modelstore.spec_key(base, 'poisson', {'method': 'bfgs'}) != key
+    assert modelstore.spec_key(changed[0], 'poisson', {'method': 'newton'}) != key
+
+
+@pytest.mark.parametrize('family', ['poisson', 'negbin'])
+def test_hit_returns_the_fitted_results(patterns, tmp_path, family):
+    store = modelstore.ModelStore(str(tmp_path))
+    y, X, w = _design(patterns)
+
+    fresh = modelstore.fit_cached(family, y, X, w, store=store)
+    assert not getattr(fresh, 'cached', False)
+    n_entries = len(store.entries())
+    assert n_entries >= 1
+
+    cached = modelstore.fit_cached(family, y, X, w, store=store)
+    assert cached.cached
+    assert len(store.entries()) == n_entries
+    for name in ('params', 'bse', 'tvalues', 'pvalues'):
+        pd.testing.assert_series_equal(getattr(cached, name), getattr(fresh, name),
+                                       check_names=False)
+    pd.testing.assert_frame_equal(cached.cov_params(), fresh.cov_params())
+    np.testing.assert_array_equal(cached.conf_int(), fresh.conf_int())
+    for name in ('llf', 'llnull', 'nobs', 'df_model', 'df_resid', 'prsquared',
+                 'llr_pvalue'):
+        assert getattr(cached, name) == getattr(fresh, name)
+
+    summary = cached.summary()
+    assert '(model cache)' in summary.tables[0].as_text()
+    assert summary.tables[1].as_text() == fresh.summary().tables[1].as_text()
+
+    # Other data or other fit options miss
+    other = modelstore.fit_cached(family, y, X, w * 2, store=store)
+    assert not getattr(other, 'cached', False)
+    other = modelstore.fit_cached(family, y, X, w, store=store, maxiter=50)
+    assert not getattr(other, 'cached', False)
+
+
+def test_eviction_removes_least_recently_used(patterns, tmp_path):
+    fields = modelstore._result_fields(
+        modelstore.fit_cached('poisson', *_design(patterns)), 'poisson')
+    probe = modelstore.ModelStore(str(tmp_path / 'probe'))
+    probe.put('probe', fields)
+    size = probe.entries()[0][1]
+
+    store = modelstore.ModelStore(str(tmp_path / 'store'), max_bytes=3 * size)
+    for i, key in enumerate(['a', 'b', 'c']):
+        store.put(key, fields)
+        os.utime(store._path(key), (1_000_000 + i, 1_000_000 + i))
+    assert len(store.entries()) == 3
+
+    # Reading 'a' makes it the most recently used; 'b' is now the oldest
+    assert store.get('a') is not None
+    store.put('d', fields)
+    kept = {os.path.basename(path)[:-4] for path, _, _ in store.entries()}
+    assert kept == {'a', 'c', 'd'}
+    assert sum(size for _, size, _ in store.entries()) <= store.max_bytes
+    assert store.get('b') is None
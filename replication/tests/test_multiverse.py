@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.formula.api as smf
+
+from team30 import data, multiverse
+
+GRID = {
+    'outcome': ['redCards', 'anyRedCard'],
+    'covariates': ['games', 'games_position'],
+    'skin_coding': ['mean', 'mean>0.5'],
+    'exclusion': ['none', 'min_games_2'],
+    'family': ['poisson', 'negbin', 'logit', 'ols'],
+}
+
+
+@pytest.fixture(scope='module')
+def cleaned(synthetic_csv):
+    df, _ = data.load_cleaned(synthetic_csv(0.2), cache_dir=None)
+    return df[multiverse.required_columns(GRID)]
+
+
+@pytest.fixture(scope='module')
+def results(cleaned):
+    return multiverse.run_multiverse(cleaned, GRID, n_jobs=1)
+
+
+def _by_spec(table):
+    keys = list(multiverse.DESIGN_KEYS) + ['family']
+    return table.drop(columns='seconds').sort_values(keys).reset_index(drop=True)
+
+
+def test_every_spec_fitted(results):
+    assert len(results) == len(multiverse.expand_grid(GRID))
+    assert results['error'].isna().all()
+    assert results['converged'].all()
+
+
+@pytest.mark.parametrize('family', ['poisson', 'negbin'])
+def test_spec_matches_direct_statsmodels_fit(cleaned, results, family):
+    frame = cleaned[cleaned['games'] >= 2].copy()
+    frame['skin'] = frame['skinTone']
+    formula = 'redCards ~ skin + games + C(position)'
+    model = (smf.poisson(formula, frame) if family == 'poisson'
+             else smf.negativebinomial(formula, frame))
+    direct = model.fit(method='newton', maxiter=100, disp=0)
+
+    row = results[(results['outcome'] == 'redCards')
+                  & (results['covariates'] == 'games_position')
+                  & (results['skin_coding'] == 'mean')
+                  & (results['exclusion'] == 'min_games_2')
+                  & (results['family'] == family)].iloc[0]
+    assert row['n_obs'] == direct.nobs
+    assert row['estimate'] == pytest.approx(direct.params['skin'], rel=1e-5)
+    assert row['std_err'] == pytest.approx(direct.bse['skin'], rel=1e-5)
+    assert row['p_value'] == pytest.approx(direct.pvalues['skin'], rel=1e-4)
+
+
+def test_results_do_not_depend_on_workers(cleaned, results):
+    parallel_results = multiverse.run_multiverse(cleaned, GRID, n_jobs=2)
+    pd.testing.assert_frame_equal(_by_spec(parallel_results), _by_spec(results))
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+from scipy import stats
+
+from team30 import data, permutation
+
+
+@pytest.fixture(scope='module')
+def dyads(synthetic_csv):
+    df = data.clean(pd.read_csv(synthetic_csv(0.2)))
+    return df[['playerShort', 'skinTone', 'games', 'redCards']].dropna()
+
+
+@pytest.fixture(scope='module')
+def observed(dyads):
+    sums = permutation.player_sums(dyads)
+    return {name: value[0] for name, value
+            in permutation.statistics(sums, sums['skin']).items()}
+
+
+def test_chi2_matches_chi2_contingency(dyads, observed):
+    table = pd.crosstab(dyads['skinTone'] > 0.5, dyads['redCards'] > 0)
+    chi2, _, _, _ = stats.chi2_contingency(table)
+    assert observed['chi2'] == pytest.approx(chi2, rel=1e-10)
+
+
+def test_score_matches_statsmodels_score_test(dyads, observed):
+    null = sm.Poisson(dyads['redCards'], sm.add_constant(dyads[['games']])).fit(
+        method='newton', tol=1e-12, disp=0)
+    test = null.score_test(exog_extra=dyads[['skinTone']])
+    assert observed['score'] == pytest.approx(float(test.statistic[0]), rel=1e-8)
+
+
+def test_rate_ratio(dyads, observed):
+    dark = dyads['skinTone'] > 0.5
+    rates = dyads.groupby(dark)[['redCards', 'games']].sum()
+    rates = rates['redCards'] / rates['games']
+    assert observed['rate_ratio'] == pytest.approx(rates[True] / rates[False], rel=1e-12)
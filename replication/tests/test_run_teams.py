@@ -0,0 +1,213 @@
+"""run_teams.py on a fake team: parsing, cache keys and runs that fail or time out."""
+
+import os
+import textwrap
+import time
+
+import pytest
+
+from benchmarks.run import REPLICATION, load_module
+
+run_teams = load_module('run_teams', os.path.join(os.path.dirname(REPLICATION), 'run_teams.py'))
+
+DOCKERFILE = """\
+FROM python:3.11-slim
+# Comments and continuation lines are skipped or joined
+WORKDIR /app
+COPY requirements.txt ./
+RUN pip install \\
+    -r requirements.txt
+COPY main.py helper.py ./
+COPY lib ./lib
+ENV TEAM_DATA=/data/data.csv MODE=fast
+CMD ["python", "main.py"]
+"""
+
+MAKEFILE = """\
+all:
+\tdocker build -t repro-fake .
+\tdocker run -v ../data.csv:/data/data.csv -v .:/app repro-fake  # run it
+"""
+
+MAIN = """\
+import os
+import sys
+
+import helper
+
+with open(os.environ['TEAM_DATA']) as f:
+    rows = f.read().splitlines()
+print(f"rows: {len(rows)}")
+with open('out.txt', 'w') as f:
+    f.write(helper.summary(rows))
+sys.exit(int(os.environ.get('FAKE_EXIT', '0')))
+"""
+
+
+class FakeExecutor(run_teams.LocalExecutor):
+    """The local executor with a settable interpreter fingerprint."""
+
+    def __init__(self, version='1'):
+        super().__init__()
+        self.version = version
+
+    def fingerprint(self, team):
+        return {'python': self.version}
+
+
+@pytest.fixture
+def team(tmp_path):
+    directory = tmp_path / 'fake'
+    (directory / 'lib').mkdir(parents=True)
+    (directory / 'Dockerfile').write_text(DOCKERFILE)
+    (directory / 'Makefile').write_text(MAKEFILE)
+    (directory / 'requirements.txt').write_text("pandas\n")
+    (directory / 'main.py').write_text(MAIN)
+    (directory / 'helper.py').write_text("def summary(rows):\n    return rows[0]\n")
+    (directory / 'lib' / 'util.py').write_text("X = 1\n")
+    (tmp_path / 'data.csv').write_text("a,b\n1,2\n")
+    return run_teams.load_team('fake', str(directory))
+
+
+@pytest.fixture
+def data_path(team):
+    return os.path.join(os.path.dirname(team.directory), 'data.csv')
+
+
+def test_parse_dockerfile(team):
+    spec = run_teams.parse_dockerfile(os.path.join(team.directory, 'Dockerfile'))
+    assert spec['workdir'] == '/app'
+    assert spec['copies'] == [('requirements.txt', '/app/requirements.txt'),
+                              ('main.py', '/app/main.py'), ('helper.py', '/app/helper.py'),
+                              ('lib', '/app/lib')]
+    assert spec['env'] == {'TEAM_DATA': '/data/data.csv', 'MODE': 'fast'}
+    assert spec['command'] == ['python', 'main.py']
+
+
+def test_parse_dockerfile_shell_command(tmp_path):
+    path = tmp_path / 'Dockerfile'
+    path.write_text("FROM r-base\nWORKDIR /analysis\nWORKDIR out\nCMD Rscript run.R > log\n")
+    spec = run_teams.parse_dockerfile(str(path))
+    assert spec['workdir'] == '/analysis/out'
+    assert spec['command'] == ['/bin/sh', '-c', 'Rscript run.R > log']
+
+
+def test_parse_makefile(team):
+    mounts = run_teams.parse_makefile(os.path.join(team.directory, 'Makefile'))
+    assert mounts == [('../data.csv', '/data/data.csv'), ('.', '/app')]
+
+
+def test_load_team(team, data_path):
+    assert team.command == ['python', 'main.py']
+    assert team.workdir == '/app'
+    assert team.mounts == [(os.path.abspath(data_path), '/data/data.csv'),
+                           (team.directory, '/app')]
+
+
+def test_cache_key_invalidation(team, data_path):
+    executor = FakeExecutor()
+    key = run_teams.cache_key(team, executor, data_path)
+    assert run_teams.cache_key(team, executor, data_path) == key
+
+    # Files left by earlier runs are not inputs
+    with open(os.path.join(team.directory, 'results.txt'), 'w') as f:
+        f.write("old output\n")
+    assert run_teams.cache_key(team, executor, data_path) == key
+
+    keys = {key}
+    for path, text in [('helper.py', "def summary(rows):\n    return rows[-1]\n"),
+                       ('lib/util.py', "X = 2\n"),
+                       ('Makefile', MAKEFILE + "\n# edited\n")]:
+        with open(os.path.join(team.directory, path), 'w') as f:
+            f.write(text)
+        keys.add(run_teams.cache_key(team, executor, data_path))
+    with open(data_path, 'a') as f:
+        f.write("3,4\n")
+    keys.add(run_teams.cache_key(team, executor, data_path))
+    keys.add(run_teams.cache_key(team, FakeExecutor(version='2'), data_path))
+    assert len(keys) == 6
+
+
+def test_local_fingerprint_includes_packages(team):
+    fingerprint = run_teams.LocalExecutor().fingerprint(team)
+    assert fingerprint['packages'] is not None
+    assert run_teams._listing('/usr/bin/python3.11')[0] == '/usr/bin/python3.11'
+    assert run_teams._listing('/bin/sh') is None
+
+
+def test_successful_run_is_cached(team, data_path, tmp_path):
+    run_dir = str(tmp_path / 'runs')
+    record = run_teams.run_team(team, FakeExecutor(), data_path, run_dir=run_dir)
+    assert record['status'] == 'ok' and not record['cached']
+    with open(record['results']) as f:
+        assert f.read() == "rows: 2\n"
+    assert [os.path.basename(p) for p in record['outputs']] == ['out.txt']
+    with open(record['outputs'][0]) as f:
+        assert f.read() == "a,b"
+
+    again = run_teams.run_team(team, FakeExecutor(), data_path, run_dir=run_dir)
+    assert again['cached'] and again['key'] == record['key']
+    assert again['results'] == record['results']
+
+    forced = run_teams.run_team(team, FakeExecutor(), data_path, run_dir=run_dir, force=True)
+    assert not forced['cached'] and forced['status'] == 'ok'
+
+
+def test_failed_run_is_kept_apart_and_rerun(team, data_path, tmp_path, monkeypatch):
+    run_dir = str(tmp_path / 'runs')
+    monkeypatch.setenv('FAKE_EXIT', '3')
+    record = run_teams.run_team(team, FakeExecutor(), data_path, run_dir=run_dir)
+    assert record['status'] == 'failed' and record['returncode'] == 3
+    assert os.path.dirname(os.path.dirname(record['results'])) == os.path.join(run_dir,
+                                                                               'failed')
+    assert not os.path.exists(os.path.join(run_dir, 'cache', 'fake', record['key']))
+
+    # Never reused: the same key runs again
+    monkeypatch.setenv('FAKE_EXIT', '0')
+    again = run_teams.run_team(team, FakeExecutor(), data_path, run_dir=run_dir)
+    assert again['key'] == record['key']
+    assert again['status'] == 'ok' and not again['cached']
+
+
+def test_missing_program_fails(team, data_path, tmp_path):
+    team.command = ['no-such-program-here']
+    record = run_teams.run_team(team, FakeExecutor(), data_path, run_dir=str(tmp_path / 'runs'))
+    assert record['status'] == 'failed' and record['returncode'] is None
+
+
+def _alive(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Killed but not yet reaped by init counts as gone
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason="reads /proc")
+def test_timeout_kills_the_process_group(team, data_path, tmp_path):
+    # The child starts a grandchild that holds on to the output pipe
+    with open(os.path.join(team.directory, 'main.py'), 'w') as f:
+        f.write(textwrap.dedent("""\
+            import subprocess
+            import sys
+            import time
+
+            child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+            with open('grandchild.pid', 'w') as f:
+                f.write(str(child.pid))
+            print("started", flush=True)
+            time.sleep(60)
+            """))
+    start = time.perf_counter()
+    record = run_teams.run_team(team, FakeExecutor(), data_path,
+                                run_dir=str(tmp_path / 'runs'), timeout=2)
+    assert time.perf_counter() - start < 30
+    assert record['status'] == 'timeout'
+    pid_file, = [p for p in record['outputs'] if p.endswith('grandchild.pid')]
+    with open(pid_file) as f:
+        pid = int(f.read())
+    deadline = time.monotonic() + 5
+    while _alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not _alive(pid)
@@ -0,0 +1,141 @@
+"""The stage scheduler: dependencies, errors, output order, and the pipeline run concurrently."""
+
+import contextlib
+import io
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import ROOT
+from team30 import scheduler
+
+SCALE = 0.1
+
+
+class Log:
+    """Start and end times of tasks, for checking what overlapped."""
+
+    def __init__(self):
+        self.times = {}
+        self.lock = threading.Lock()
+
+    def task(self, name, seconds=0.0, value=None):
+        def run(*inputs):
+            start = time.perf_counter()
+            time.sleep(seconds)
+            with self.lock:
+                self.times[name] = (start, time.perf_counter())
+            return (name, inputs) if value is None else value
+        return run
+
+
+def test_dependencies_run_first_and_receive_results():
+    log = Log()
+    graph = scheduler.Scheduler()
+    a = graph.add('a', log.task('a', 0.3, value=('x', 'y')))
+    b = graph.add('b', log.task('b', 0.3))
+    c = graph.add('c', log.task('c'), a[1], b)
+    graph.add('d', log.task('d'), c)
+    results = graph.run()
+
+    assert results['c'] == ('c', ('y', ('b', ())))
+    assert results['d'] == ('d', (results['c'],))
+    times = log.times
+    assert times['c'][0] >= max(times['a'][1], times['b'][1])
+    assert times['d'][0] >= times['c'][1]
+    # a and b do not depend on each other and overlap
+    assert times['b'][0] < times['a'][1] and times['a'][0] < times['b'][1]
+
+
+def test_max_workers_one_runs_in_turn():
+    log = Log()
+    graph = scheduler.Scheduler(max_workers=1)
+    for name in 'abc':
+        graph.add(name, log.task(name, 0.05))
+    graph.run()
+    spans = sorted(log.times.values())
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(spans, spans[1:]))
+
+
+def test_unknown_and_duplicate_tasks():
+    graph = scheduler.Scheduler()
+    graph.add('a', print)
+    with pytest.raises(ValueError, match='Duplicate'):
+        graph.add('a', print)
+    with pytest.raises(ValueError, match='unknown'):
+        graph.add('b', print, scheduler.Result('missing'))
+
+
+def test_output_is_printed_in_task_order():
+    def slow():
+        time.sleep(0.3)
+        print("slow 1")
+        print("slow 2")
+
+    def fast():
+        print("fast")
+
+    graph = scheduler.Scheduler()
+    graph.add('slow', slow)
+    graph.add('fast', fast)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        graph.run()
+    assert out.getvalue() == "slow 1\nslow 2\nfast\n"
+
+
+def test_error_stops_dependents_and_is_raised():
+    log = Log()
+
+    def fail():
+        print("failing")
+        raise KeyError('boom')
+
+    graph = scheduler.Scheduler()
+    failed = graph.add('fail', fail)
+    graph.add('independent', log.task('independent', 0.3))
+    graph.add('dependent', log.task('dependent'), failed)
+    graph.add('after', log.task('after'), scheduler.Result('dependent'))
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out), pytest.raises(KeyError, match='boom'):
+        graph.run()
+
+    # The running task is waited for; the ones depending on the failure never start
+    assert set(log.times) == {'independent'}
+    assert out.getvalue() == "failing\n"
+
+
+def test_process_task():
+    graph = scheduler.Scheduler()
+    graph.add('pid', os.getpid, process=True)
+    assert graph.run()['pid'] != os.getpid()
+
+
+def _run_pipeline(path, tmp_path, *args):
+    # As a script, so that the plots' process can import it
+    command = [sys.executable, os.path.join(ROOT, 'team-30.py'), '--data', path,
+               '--boot', '200', '--perm', '200', '--jobs', '2', '--no-model-cache',
+               '--no-tracemalloc', '--metrics', str(tmp_path / 'metrics.jsonl'), *args]
+    # The figure and the data cache go to the working directory
+    out = subprocess.run(command, cwd=tmp_path, check=True, capture_output=True,
+                         text=True).stdout
+    # Everything but the timings, which are printed last, and the time of the fits
+    out = out.split("\nStage timings")[0]
+    return re.sub(r'\w{3}, \d{2} \w{3} \d{4}|\d{2}:\d{2}:\d{2}', '-', out)
+
+
+def test_concurrent_run_prints_what_the_sequential_run_does(synthetic_csv, tmp_path):
+    path = synthetic_csv(SCALE)
+    _run_pipeline(path, tmp_path, '--stages', 'load')  # caches the data for both runs
+
+    sequential = _run_pipeline(path, tmp_path, '--sequential')
+    concurrent = _run_pipeline(path, tmp_path)
+    for section in ("EXPLORATORY DATA ANALYSIS", "CLUSTER-ROBUST INFERENCE",
+                    "PLAYER-LEVEL PERMUTATION TEST", "All outputs generated successfully!"):
+        assert section in sequential
+    assert concurrent == sequential
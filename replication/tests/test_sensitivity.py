@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from team30 import data, sensitivity
+
+
+@pytest.fixture(scope='module')
+def dyads(synthetic_csv):
+    return pd.read_csv(synthetic_csv(0.2), usecols=sensitivity.COLUMNS)
+
+
+def _brute_force(df, coding, threshold):
+    """The light/dark comparison at one threshold from boolean masks."""
+    values = sensitivity.coding_values(df, coding)
+    rated = df[~np.isnan(values)]
+    dark = values[~np.isnan(values)] > threshold
+    table = pd.crosstab(dark, rated['redCards'] > 0)
+    chi2, p, _, _ = stats.chi2_contingency(table)
+    light_part, dark_part = rated[~dark], rated[dark]
+    return {
+        'n_light': len(light_part), 'n_dark': len(dark_part),
+        'mean_light': light_part['redCards'].mean(),
+        'mean_dark': dark_part['redCards'].mean(),
+        'rate_ratio': (dark_part['redCards'].sum() / dark_part['games'].sum())
+                      / (light_part['redCards'].sum() / light_part['games'].sum()),
+        'chi2': chi2, 'chi2_p': p,
+    }
+
+
+@pytest.mark.parametrize('coding', sensitivity.CODINGS)
+def test_sweep_matches_per_threshold_recomputation(dyads, coding):
+    table = sensitivity.threshold_sweep(sensitivity.level_table(dyads, coding))
+    values = sensitivity.coding_values(dyads, coding)
+    levels = np.unique(values[~np.isnan(values)])
+    np.testing.assert_array_equal(table.index, levels[:-1])
+
+    for threshold, row in table.iterrows():
+        expected = _brute_force(dyads, coding, threshold)
+        for name, value in expected.items():
+            assert row[name] == pytest.approx(value, rel=1e-10), (threshold, name)
+
+
+def test_default_threshold_matches_clean(dyads):
+    cleaned = data.clean(dyads.copy())
+    row = sensitivity.threshold_sweep(sensitivity.level_table(dyads, 'mean')).loc[
+        data.CLEANING_PARAMS['dark_threshold']]
+    assert row['n_dark'] == cleaned['darkSkin'].sum()
+    assert row['n_light'] == (cleaned['darkSkin'] == 0).sum()
+
+
+def test_binned_matches_pd_cut(dyads):
+    cleaned = data.clean(dyads.copy())
+    totals = sensitivity.binned(sensitivity.level_table(dyads, 'mean'))
+    grouped = cleaned.groupby('skinToneCategory', observed=False).agg(
+        n=('games', 'size'), red=('redCards', 'sum'), games=('games', 'sum'))
+    for name in ('n', 'red', 'games'):
+        np.testing.assert_array_equal(totals[name], grouped[name])
@@ -0,0 +1,118 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from team30 import compressed, data, streaming, summary
+
+from conftest import ROOT
+
+# Multiples of the real dataset. Every chunk size below splits the default
+# one; the slow tests go to ten times the real size.
+SCALE = 3
+LARGE_SCALE = 10
+
+CHUNK_SIZE = 50_000
+
+# Largest growth of the scan's peak memory, in MB, from the real size to
+# SCALE (LARGE_SCALE for the slow test); loading the frame grows by far more
+FLAT_MB = 15
+LOAD_GROWTH_MB = 100
+
+# VmHWM rather than ru_maxrss: the latter keeps the high-water mark of the
+# forking test process across exec
+PEAK_SCRIPT = """
+import sys
+from team30 import data, streaming
+if sys.argv[1] == 'scan':
+    streaming.scan(sys.argv[2], chunk_size=int(sys.argv[3]), cache_dir=None)
+else:
+    data.load_cleaned(sys.argv[2], cache_dir=None)
+with open('/proc/self/status') as f:
+    print(next(line.split()[1] for line in f if line.startswith('VmHWM:')))
+"""
+
+linux_only = pytest.mark.skipif(not os.path.exists('/proc/self/status'),
+                                reason="needs /proc/self/status (Linux)")
+
+
+def _peak_mb(mode, path, chunk_size=CHUNK_SIZE):
+    """Peak resident memory of a fresh interpreter that scans or loads ``path``."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, '-c', PEAK_SCRIPT, mode, path, str(chunk_size)],
+                         env=env, capture_output=True, text=True, check=True)
+    return int(out.stdout.split()[-1]) / 1024
+
+
+def _in_memory(path):
+    df, meta = data.load_cleaned(path, cache_dir=None)
+    patterns = compressed.compress_patterns(df, streaming.MODEL_COVARIATES)
+    return summary.summarize(df), patterns, meta
+
+
+@pytest.fixture(scope='module')
+def large_csv(synthetic_csv):
+    return synthetic_csv(SCALE, seed=1)
+
+
+@pytest.fixture(scope='module')
+def in_memory(large_csv):
+    return _in_memory(large_csv)
+
+
+def _assert_same(streamed, expected):
+    summ, patterns, meta = streamed
+    exp_summ, exp_patterns, exp_meta = expected
+    assert meta['chunks'] > 1
+    assert meta['initial_shape'] == exp_meta['initial_shape']
+    assert meta['clean_shape'] == exp_meta['clean_shape']
+
+    pd.testing.assert_frame_equal(summ.table, exp_summ.table, check_dtype=False,
+                                  check_exact=True)
+    pd.testing.assert_frame_equal(patterns, exp_patterns, check_dtype=False,
+                                  check_exact=True)
+    assert summ.n_players == exp_summ.n_players
+    assert summ.n == exp_summ.n
+    np.testing.assert_array_equal(summ.contingency(), exp_summ.contingency())
+    assert summ.mann_whitney() == exp_summ.mann_whitney()
+    pd.testing.assert_frame_equal(summ.category_stats(), exp_summ.category_stats(),
+                                  check_dtype=False, check_exact=True)
+
+
+@pytest.mark.parametrize('chunk_size', [100_000, 257_321])
+def test_scan_csv_matches_in_memory(large_csv, in_memory, chunk_size):
+    streamed = streaming.scan(large_csv, chunk_size=chunk_size, cache_dir=None)
+    assert streamed[2]['source'] == 'csv'
+    _assert_same(streamed, in_memory)
+
+
+def test_scan_parquet_cache_matches_in_memory(large_csv, in_memory, tmp_path,
+                                              monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(data, 'cache_format', lambda: 'parquet')
+    data.load_cleaned(large_csv, cache_dir=str(tmp_path))
+    streamed = streaming.scan(large_csv, chunk_size=100_000, cache_dir=str(tmp_path))
+    assert streamed[2]['source'] == 'cache'
+    _assert_same(streamed, in_memory)
+
+
+@linux_only
+def test_scan_peak_memory_is_flat(synthetic_csv, large_csv):
+    small = synthetic_csv(1, seed=1)
+    scan_growth = _peak_mb('scan', large_csv) - _peak_mb('scan', small)
+    load_growth = _peak_mb('load', large_csv) - _peak_mb('load', small)
+    assert scan_growth < FLAT_MB
+    # The measurement does see memory that grows with the data
+    assert load_growth > LOAD_GROWTH_MB
+
+
+@linux_only
+@pytest.mark.slow
+def test_scan_at_large_scale(synthetic_csv):
+    small, large = synthetic_csv(1, seed=1), synthetic_csv(LARGE_SCALE, seed=1)
+    assert _peak_mb('scan', large) - _peak_mb('scan', small) < FLAT_MB
+    _assert_same(streaming.scan(large, chunk_size=100_000, cache_dir=None),
+                 _in_memory(large))
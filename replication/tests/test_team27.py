@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+from patsy import dmatrices
+
+from benchmarks.run import TEAM27_MODELS, TEAM27_PORT, load_module
+
+team27 = load_module('team27', TEAM27_PORT)
+
+
+@pytest.fixture(scope='module')
+def df(synthetic_csv):
+    return team27.load(synthetic_csv(0.2))
+
+
+@pytest.fixture(scope='module')
+def patsy_designs(df):
+    """The dmatrices designs of 27.py, by question."""
+    designs = {}
+    for question, (dropna, formula) in TEAM27_MODELS.items():
+        frame = df if dropna is None else df.dropna(subset=[dropna])
+        designs[question] = dmatrices(formula, data=frame, return_type='dataframe')
+    return designs
+
+
+@pytest.mark.parametrize('question', list(team27.QUESTIONS))
+def test_question_design_matches_dmatrices(df, patsy_designs, question):
+    y_ref, X_ref = patsy_designs[question]
+    y, X, mask = team27.question_design(team27.build_design(df), question)
+
+    assert list(X.columns) == list(X_ref.columns)
+    np.testing.assert_array_equal(np.flatnonzero(mask), X_ref.index)
+    np.testing.assert_array_equal(X.to_numpy(), X_ref.to_numpy())
+    np.testing.assert_array_equal(y.to_numpy(), y_ref['redCards'].to_numpy())
+
+
+def test_fitted_coefficients_match_dmatrices_fits(df, patsy_designs):
+    options = dict(method='newton', tol=1e-12, maxiter=100, disp=0)
+    results = team27.fit_questions(df, **options)
+    for question, (y_ref, X_ref) in patsy_designs.items():
+        reference = sm.Poisson(y_ref, X_ref).fit(**options)
+        pd.testing.assert_series_equal(results[question].params, reference.params,
+                                       rtol=1e-10)
+        pd.testing.assert_series_equal(results[question].bse, reference.bse, rtol=1e-10)
+        assert results[question].nobs == reference.nobs
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tools import add_constant
+
+from team30 import compressed, data, modelstore
+
+
+@pytest.fixture(scope='module')
+def dyads(synthetic_csv):
+    df = data.clean(pd.read_csv(synthetic_csv(0.2)))
+    return df[['redCards', 'skinTone', 'games']].dropna()
+
+
+@pytest.mark.parametrize('family', ['poisson', 'negbin'])
+def test_compressed_fit_matches_full(dyads, family):
+    covariates = ['skinTone', 'games']
+    full = modelstore.fit_cached(family, dyads['redCards'],
+                                 add_constant(dyads[covariates]),
+                                 method='newton', maxiter=100, disp=0)
+
+    patterns = compressed.compress_patterns(dyads, covariates)
+    assert len(patterns) < len(dyads)
+    packed = modelstore.fit_cached(family, patterns['redCards'],
+                                   add_constant(patterns[covariates]),
+                                   patterns['count'],
+                                   method='newton', maxiter=100, disp=0)
+
+    np.testing.assert_allclose(packed.params, full.params, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(packed.bse, full.bse, rtol=1e-6)
+    assert packed.llf == pytest.approx(full.llf, rel=1e-10)
+    assert packed.llnull == pytest.approx(full.llnull, rel=1e-8)
+    assert packed.nobs == full.nobs == len(dyads)
+    assert packed.df_resid == full.df_resid
+    assert packed.bic == pytest.approx(full.bic, rel=1e-10)
@@ -0,0 +1,18 @@
+import multiprocessing
+import os
+
+import pytest
+
+from benchmarks import workers
+from team30 import colstore, data
+
+pytestmark = pytest.mark.skipif(not os.path.exists('/proc/self/smaps_rollup'),
+                                reason="needs /proc/self/smaps_rollup (Linux)")
+
+
+def test_shared_columns_keep_worker_memory_flat(synthetic_csv):
+    df, _ = data.load_cleaned(synthetic_csv(1), columns=colstore.DEFAULT_COLUMNS,
+                              cache_dir=None)
+    df = data.to_columnar(df)
+    table, data_mb = workers.run(df, [2], multiprocessing.get_context('spawn'))
+    assert workers.check(table, data_mb) == []
@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+"""
+Run the teams' analyses in parallel, reusing the results of unchanged runs.
+
+    python run_teams.py                          # every team, local processes
+    python run_teams.py 7 27 30 --jobs 3 --cpus 6
+    python run_teams.py --executor docker --data dataset/data/CrowdstormingDataJuly1st.csv
+    python run_teams.py --list
+
+Teams are the directories under dataset/code plus replication/ (team 30).
+Each team's Makefile and Dockerfile say how make would run it: the image's
+working directory, the files it COPYs in, its ENV and CMD, and the
+``docker run -v`` mounts. The runner rebuilds that layout in a scratch
+directory, with the data file linked in wherever a mount puts it, and runs
+the command there:
+
+* LocalExecutor (the default) runs it as a host process, using the
+  interpreters on the PATH, from the image's working directory inside the
+  scratch directory. ENV values that are absolute paths are remapped into the
+  scratch directory too, so team 30 finds the data through TEAM30_DATA.
+* DockerExecutor builds the image and runs it with the scratch directory's
+  files and the data mounted where the Makefile mounts them.
+
+Up to ``--jobs`` teams run at once. ``--cpus`` is the total CPU budget, split
+evenly between them: it caps BLAS/OpenMP threads locally and is passed as
+``docker run --cpus``. Output lines are printed as they arrive, prefixed with
+the team, and also written to the run's results.txt.
+
+A successful run is stored under ``--run-dir`` (.team-runs) with its
+results.txt and the files it wrote, keyed by a hash of the team's Dockerfile,
+Makefile and copied sources, the data, the command and the executor's
+interpreter with its installed packages, or image. A later run with the same key is not rerun; it returns
+the stored results.txt and outputs. Failed runs are kept under failed/ for
+inspection and never reused. ``--force`` reruns regardless.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.join(ROOT, 'dataset', 'code')
+REPLICATION_DIR = os.path.join(ROOT, 'replication')
+DEFAULT_DATA = os.path.join(ROOT, 'dataset', 'data', 'CrowdstormingDataJuly1st.csv')
+DEFAULT_RUN_DIR = os.path.join(ROOT, '.team-runs')
+
+# Bump when the cache layout or what goes into a key changes
+CACHE_VERSION = 1
+
+# Script files run when a team has no Dockerfile CMD
+SCRIPT_COMMANDS = {'.r': ['Rscript'], '.py': ['python']}
+
+# Commands listing the packages installed for an interpreter, by program name
+PACKAGE_LISTINGS = {
+    'python': ['-c', "import importlib.metadata as m; print('\\n'.join(sorted("
+                     "f\"{d.metadata['Name']}=={d.version}\" for d in m.distributions())))"],
+    'Rscript': ['-e', 'ip <- installed.packages(); '
+                      'writeLines(sort(paste(ip[, "Package"], ip[, "Version"], sep = "==")))'],
+}
+
+# Threading variables of the numerical libraries the analyses use
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+
+# Caches a run leaves behind; neither inputs nor outputs
+CACHE_NAMES = {'__pycache__', '.team30-cache'}
+
+# Written by earlier runs or tooling, never part of a team's inputs
+IGNORED_NAMES = CACHE_NAMES | {'results.txt', 'output.txt'}
+
+
+class Team:
+    """How one team's analysis is run, as read from its directory."""
+
+    def __init__(self, name, directory, command, workdir='/analysis', copies=(),
+                 mounts=(), env=None):
+        self.name = name
+        self.directory = directory
+        self.command = list(command)
+        self.workdir = workdir
+        # (source relative to the team directory, destination in the image)
+        self.copies = list(copies)
+        # (host source, destination in the image); data files and directories
+        self.mounts = list(mounts)
+        self.env = dict(env or {})
+
+    def __repr__(self):
+        return f"Team({self.name!r}, {shlex.join(self.command)!r})"
+
+
+def parse_dockerfile(path):
+    """WORKDIR, COPY sources and destinations, ENV and CMD of a Dockerfile."""
+    spec = {'workdir': '/', 'copies': [], 'env': {}, 'command': None}
+    with open(path) as f:
+        lines = f.read().replace('\\\n', ' ').splitlines()
+    for line in lines:
+        parts = line.strip().split(None, 1)
+        if len(parts) < 2 or parts[0].startswith('#'):
+            continue
+        instruction, args = parts[0].upper(), parts[1]
+        if instruction == 'WORKDIR':
+            spec['workdir'] = os.path.join(spec['workdir'], args.strip())
+        elif instruction == 'COPY':
+            *sources, destination = shlex.split(args)
+            if not os.path.isabs(destination):
+                destination = os.path.join(spec['workdir'], destination)
+            for source in sources:
+                target = destination
+                if destination.endswith('/') or len(sources) > 1:
+                    target = os.path.join(destination, os.path.basename(source))
+                spec['copies'].append((source, os.path.normpath(target)))
+        elif instruction == 'ENV':
+            for item in shlex.split(args):
+                key, _, value = item.partition('=')
+                spec['env'][key] = value
+        elif instruction == 'CMD':
+            spec['command'] = (json.loads(args) if args.startswith('[')
+                               else ['/bin/sh', '-c', args])
+    return spec
+
+
+def parse_makefile(path):
+    """``docker run -v`` mounts of a team Makefile, as (source, destination)."""
+    mounts = []
+    with open(path) as f:
+        for line in f:
+            words = shlex.split(line, comments=True)
+            if words[:2] != ['docker', 'run']:
+                continue
+            for i, word in enumerate(words):
+                if word in ('-v', '--volume') and i + 1 < len(words):
+                    source, destination = words[i + 1].split(':')[:2]
+                    mounts.append((source, destination))
+    return mounts
+
+
+def load_team(name, directory):
+    """The Team in ``directory``, or None if it has nothing to run."""
+    dockerfile = os.path.join(directory, 'Dockerfile')
+    makefile = os.path.join(directory, 'Makefile')
+    spec = (parse_dockerfile(dockerfile) if os.path.exists(dockerfile)
+            else {'workdir': '/analysis', 'copies': [], 'env': {}, 'command': None})
+    if spec['command'] is None:
+        # No image: run the team's script from its own directory listing
+        scripts = sorted(f for f in os.listdir(directory)
+                         if os.path.splitext(f)[1].lower() in SCRIPT_COMMANDS)
+        if not scripts:
+            return None
+        script = scripts[0]
+        spec['command'] = SCRIPT_COMMANDS[os.path.splitext(script)[1].lower()] + [script]
+        spec['copies'] = spec['copies'] or [(script, os.path.join(spec['workdir'], script))]
+
+    mounts = []
+    if os.path.exists(makefile):
+        for source, destination in parse_makefile(makefile):
+            if not os.path.isabs(destination):
+                destination = os.path.join(spec['workdir'], destination)
+            mounts.append((os.path.normpath(os.path.join(directory, source)), destination))
+    return Team(name, directory, spec['command'], spec['workdir'], spec['copies'],
+                mounts, spec['env'])
+
+
+def discover(code_dir=CODE_DIR, replication_dir=REPLICATION_DIR):
+    """Every team under ``code_dir`` plus team 30, in numeric order."""
+    teams = []
+    for name in os.listdir(code_dir):
+        directory = os.path.join(code_dir, name)
+        if os.path.isdir(directory):
+            team = load_team(name, directory)
+            if team is not None:
+                teams.append(team)
+    if replication_dir is not None and os.path.isdir(replication_dir):
+        teams.append(load_team('30', replication_dir))
+    return sorted(teams, key=lambda t: (not t.name.isdigit(), int(t.name) if t.name.isdigit()
+                                        else 0, t.name))
+
+
+_DIGESTS = {}
+_DIGESTS_LOCK = threading.Lock()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file; computed once per process while it is unchanged."""
+    stat = os.stat(path)
+    memo = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    with _DIGESTS_LOCK:
+        if memo in _DIGESTS:
+            return _DIGESTS[memo]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        _DIGESTS[memo] = digest.hexdigest()
+        return _DIGESTS[memo]
+
+
+def _walk(path):
+    """Files under ``path`` (or ``path`` itself), skipping IGNORED_NAMES, sorted."""
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for directory, subdirs, files in os.walk(path):
+        subdirs[:] = sorted(d for d in subdirs if d not in IGNORED_NAMES)
+        found.extend(os.path.join(directory, f) for f in sorted(files)
+                      if f not in IGNORED_NAMES)
+    return found
+
+
+def _data_mount(source):
+    """Whether a mount source is the data file (as opposed to a directory)."""
+    return not os.path.isdir(source) and source.endswith('.csv')
+
+
+def input_files(team):
+    """Files that define a team's run: its build files, copied sources and mounted directories."""
+    files = [os.path.join(team.directory, name) for name in ('Dockerfile', 'Makefile')]
+    files += [os.path.join(team.directory, source) for source, _ in team.copies]
+    files += [source for source, _ in team.mounts if not _data_mount(source)]
+    return sorted({f for path in files if os.path.exists(path) for f in _walk(path)})
+
+
+def cache_key(team, executor, data_path):
+    """Key of a run of ``team`` by ``executor`` on ``data_path``."""
+    digest = hashlib.sha256()
+    spec = {'version': CACHE_VERSION, 'command': team.command, 'workdir': team.workdir,
+            'env': team.env, 'mounts': [d for _, d in team.mounts],
+            'executor': executor.fingerprint(team)}
+    digest.update(json.dumps(spec, sort_keys=True).encode())
+    for path in input_files(team):
+        digest.update(os.path.relpath(path, team.directory).encode())
+        digest.update(file_digest(path).encode())
+    if any(_data_mount(source) for source, _ in team.mounts):
+        digest.update(file_digest(data_path).encode())
+    return digest.hexdigest()[:16]
+
+
+def _inside(root, container_path):
+    """Host path of ``container_path`` in a scratch directory standing for /."""
+    return os.path.join(root, os.path.relpath(container_path, '/'))
+
+
+def _snapshot(root):
+    """(size, mtime) of every regular file under ``root`` that is not a link."""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            if not os.path.islink(path):
+                stat = os.stat(path)
+                files[path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def prepare(team, root, data_path):
+    """
+    Lay out ``team``'s image under ``root`` (standing for /): its COPY
+    sources, the mounted directories' contents and the data file, linked
+    where each mount puts it.
+    """
+    os.makedirs(_inside(root, team.workdir), exist_ok=True)
+    for source, destination in team.copies:
+        source = os.path.join(team.directory, source)
+        if not os.path.exists(source):
+            continue  # COPY of a path the repository does not have
+        target = _inside(root, destination)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.isdir(source):
+            shutil.copytree(source, target, dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns(*IGNORED_NAMES))
+        else:
+            shutil.copy2(source, target)
+    for source, destination in team.mounts:
+        target = _inside(root, destination)
+        if _data_mount(source):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.lexists(target):
+                os.remove(target)
+            os.symlink(os.path.abspath(data_path), target)
+        elif os.path.isdir(source):
+            shutil.copytree(source, target, dirs_exist_ok=True, symlinks=True,
+                            ignore=shutil.ignore_patterns(*IGNORED_NAMES))
+        else:
+            os.makedirs(target, exist_ok=True)
+
+
+def thread_env(cpus):
+    return {name: str(cpus) for name in THREAD_VARIABLES}
+
+
+def kill_group(process):
+    """Kill ``process`` and whatever it started; it leads its own session."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _listing(program):
+    """The PACKAGE_LISTINGS command for ``program`` (python3.11 is python), or None."""
+    name = os.path.basename(program)
+    for prefix, arguments in PACKAGE_LISTINGS.items():
+        if name == prefix or re.fullmatch(re.escape(prefix) + r'[0-9.]*', name):
+            return [program] + arguments
+    return None
+
+
+class LocalExecutor:
+    """Runs a team's command as a host process inside its scratch layout."""
+
+    name = 'local'
+
+    def __init__(self):
+        self._packages = {}
+        self._lock = threading.Lock()
+
+    def packages(self, program):
+        """
+        Digest of the packages installed for ``program`` (PACKAGE_LISTINGS),
+        listed once per executor; None for programs without a listing.
+        """
+        command = _listing(program)
+        if command is None:
+            return None
+        with self._lock:
+            if program not in self._packages:
+                out = subprocess.run(command, check=True, capture_output=True,
+                                     stdin=subprocess.DEVNULL, timeout=120)
+                self._packages[program] = hashlib.sha256(out.stdout).hexdigest()
+            return self._packages[program]
+
+    def fingerprint(self, team):
+        program = shutil.which(team.command[0])
+        if program is None:
+            return {'program': team.command[0]}
+        stat = os.stat(program)
+        return {'program': os.path.realpath(program), 'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns, 'packages': self.packages(program)}
+
+    def start(self, team, root, data_path, cpus):
+        env = dict(os.environ, **thread_env(cpus))
+        for key, value in team.env.items():
+            env[key] = _inside(root, value) if os.path.isabs(value) else value
+        return subprocess.Popen(team.command, cwd=_inside(root, team.workdir), env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                stdin=subprocess.DEVNULL, start_new_session=True)
+
+
+class DockerExecutor:
+    """Builds each team's image and runs it with the scratch layout mounted."""
+
+    name = 'docker'
+
+    def __init__(self, docker='docker'):
+        self.docker = docker
+        self._images = {}
+        self._lock = threading.Lock()
+
+    def image(self, team):
+        """Build the team's image (docker's layer cache makes this cheap) and return its id."""
+        with self._lock:
+            if team.name not in self._images:
+                tag = f"repro-{team.name}"
+                subprocess.run([self.docker, 'build', '-q', '-t', tag, team.directory],
+                               check=True, stdout=subprocess.DEVNULL)
+                out = subprocess.run([self.docker, 'image', 'inspect', '-f', '{{.Id}}', tag],
+                                     check=True, capture_output=True, text=True)
+                self._images[team.name] = (tag, out.stdout.strip())
+            return self._images[team.name]
+
+    def fingerprint(self, team):
+        return {'image': self.image(team)[1]}
+
+    def start(self, team, root, data_path, cpus):
+        tag, _ = self.image(team)
+        command = [self.docker, 'run', '--rm', '--cpus', str(cpus)]
+        for name, value in thread_env(cpus).items():
+            command += ['-e', f"{name}={value}"]
+        for source, destination in team.mounts:
+            host = (os.path.abspath(data_path) if _data_mount(source)
+                    else _inside(root, destination))
+            command += ['-v', f"{host}:{destination}"]
+        return subprocess.Popen(command + [tag], stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                start_new_session=True)
+
+
+EXECUTORS = {'local': LocalExecutor, 'docker': DockerExecutor}
+
+
+def _cached(directory):
+    """The record of a successful run stored in ``directory``, or None."""
+    try:
+        with open(os.path.join(directory, 'run.json')) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get('status') != 'ok':
+        return None
+    record['results'] = os.path.join(directory, 'results.txt')
+    record['outputs'] = [os.path.join(directory, 'outputs', p) for p in record['outputs']]
+    return record
+
+
+def run_team(team, executor, data_path, run_dir=DEFAULT_RUN_DIR, cpus=1, timeout=None,
+             force=False, echo=None):
+    """
+    Run ``team`` unless a successful run with the same key is stored.
+
+    Returns a record with the team, ``status`` ('ok', 'failed' or
+    'timeout'), ``cached``, the key, the exit code, seconds, the path of its
+    results.txt and of its output files. ``echo(team, line)`` is called
+    for every output line as it arrives. The command runs in a session of
+    its own, and a timeout kills the whole process group, so that children
+    it started neither survive it nor keep its output open.
+    """
+    start = time.perf_counter()
+    base = {'team': team.name, 'executor': executor.name}
+    try:
+        key = cache_key(team, executor, data_path)
+    except (OSError, subprocess.SubprocessError) as exc:
+        return dict(base, status='failed', cached=False, error=str(exc),
+                    seconds=time.perf_counter() - start)
+    directory = os.path.join(run_dir, 'cache', team.name, key)
+    if not force:
+        record = _cached(directory)
+        if record is not None:
+            return dict(record, cached=True)
+
+    os.makedirs(run_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f"{team.name}-", dir=run_dir)
+    root = os.path.join(staging, 'root')
+    record = dict(base, key=key, command=team.command, cached=False, outputs=[])
+    try:
+        prepare(team, root, data_path)
+        before = _snapshot(root)
+        with open(os.path.join(staging, 'results.txt'), 'wb') as log:
+            try:
+                process = executor.start(team, root, data_path, cpus)
+            except OSError as exc:
+                log.write(f"{exc}\n".encode())
+                record.update(status='failed', returncode=None, error=str(exc))
+            else:
+                timed_out = threading.Event()
+
+                def expire():
+                    timed_out.set()
+                    kill_group(process)
+
+                timer = None
+                if timeout is not None:
+                    timer = threading.Timer(timeout, expire)
+                    timer.start()
+                try:
+                    for line in process.stdout:
+                        log.write(line)
+                        log.flush()
+                        if echo is not None:
+                            echo(team, line.decode(errors='replace').rstrip('\n'))
+                    returncode = process.wait()
+                except BaseException:
+                    kill_group(process)
+                    process.wait()
+                    raise
+                finally:
+                    if timer is not None:
+                        timer.cancel()
+                timed_out = timed_out.is_set()
+                record.update(returncode=returncode,
+                              status='timeout' if timed_out else
+                              'ok' if returncode == 0 else 'failed')
+
+        # Files the run created or changed, relative to the working directory
+        workdir = _inside(root, team.workdir)
+        for path, stat in sorted(_snapshot(root).items()):
+            if before.get(path) != stat and not CACHE_NAMES & set(path.split(os.sep)):
+                relative = os.path.relpath(path, workdir)
+                if relative.startswith('..'):
+                    relative = os.path.relpath(path, root)
+                target = os.path.join(staging, 'outputs', relative)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+                record['outputs'].append(relative)
+        record['seconds'] = time.perf_counter() - start
+        record['finished'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        with open(os.path.join(staging, 'run.json'), 'w') as f:
+            json.dump(record, f, indent=2)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    # Successful runs become the cache entry; failed ones are kept apart
+    target = (directory if record['status'] == 'ok'
+              else os.path.join(run_dir, 'failed', f"{team.name}-{key}"))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    record['results'] = os.path.join(target, 'results.txt')
+    record['outputs'] = [os.path.join(target, 'outputs', p) for p in record['outputs']]
+    return record
+
+
+def run_teams(teams, executor, data_path, jobs=None, cpus=None, run_dir=DEFAULT_RUN_DIR,
+              timeout=None, force=False, echo=None):
+    """
+    Run ``teams`` on up to ``jobs`` at a time, sharing ``cpus`` between them.
+
+    Yields each team's record (see run_team) as it finishes.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    jobs = max(1, min(jobs or cpus, len(teams), cpus))
+    per_team = max(1, cpus // jobs)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_team, team, executor, data_path, run_dir, per_team,
+                               timeout, force, echo) for team in teams]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('teams', nargs='*', help="team numbers (default: all)")
+    parser.add_argument('--data', default=DEFAULT_DATA)
+    parser.add_argument('--executor', choices=sorted(EXECUTORS), default='local')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="teams run at once (default: as many as CPUs)")
+    parser.add_argument('--cpus', type=int, default=None,
+                        help="CPUs shared by the running teams (default: all)")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="seconds before a team's run is killed")
+    parser.add_argument('--run-dir', default=DEFAULT_RUN_DIR)
+    parser.add_argument('--force', action='store_true', help="rerun cached teams")
+    parser.add_argument('--quiet', action='store_true', help="do not stream output")
+    parser.add_argument('--list', action='store_true', help="list the teams and exit")
+    args = parser.parse_args()
+
+    teams = discover()
+    if args.teams:
+        unknown = set(args.teams) - {t.name for t in teams}
+        if unknown:
+            parser.error(f"unknown teams: {', '.join(sorted(unknown))}")
+        teams = [t for t in teams if t.name in args.teams]
+    if args.list:
+        for team in teams:
+            mounts = ', '.join(d for _, d in team.mounts) or '-'
+            print(f"{team.name:>4}  {shlex.join(team.command):<28} mounts: {mounts}")
+        return
+    if not os.path.exists(args.data):
+        parser.error(f"data file not found: {args.data}")
+
+    lock = threading.Lock()
+
+    def echo(team, line):
+        with lock:
+            print(f"[{team.name}] {line}", flush=True)
+
+    executor = EXECUTORS[args.executor]()
+    records = []
+    for record in run_teams(teams, executor, args.data, jobs=args.jobs, cpus=args.cpus,
+                            run_dir=args.run_dir, timeout=args.timeout, force=args.force,
+                            echo=None if args.quiet else echo):
+        records.append(record)
+        with lock:
+            state = 'cached' if record['cached'] else record['status']
+            print(f"== team {record['team']}: {state} ({record.get('seconds', 0):.1f}s) "
+                  f"{record.get('results', '')}", flush=True)
+
+    print("\nTeam  Status   Seconds  Outputs")
+    for record in sorted(records, key=lambda r: int(r['team']) if r['team'].isdigit() else 0):
+        state = 'cached' if record['cached'] else record['status']
+        print(f"{record['team']:>4}  {state:<8} {record.get('seconds', 0):7.1f}  "
+              f"{len(record.get('outputs', []))}")
+    sys.exit(0 if all(r['status'] == 'ok' for r in records) else 1)
+
+
+if __name__ == '__main__':
+    main()